@@ -1,28 +1,206 @@
-from flask import Flask, redirect, url_for, session
+from flask import Flask, Response, abort, g, redirect, request, url_for, session
+from flask import before_render_template, template_rendered
 from datetime import timedelta
+import gc
+import hmac
+import time
 
-from routes.auth_routes import auth_blueprint
-from routes.admin_routes import admin_blueprint
-from routes.payroll_routes import payroll_blueprint
+from config import Config
+from utils import metrics, profiling
 
-app = Flask(__name__)
-app.secret_key = "supersecretkey123"
+APP_STARTUP = "payroll_app_startup_seconds"
 
-# Session config
-app.permanent_session_lifetime = timedelta(minutes=45)
-app.config["SESSION_COOKIE_HTTPONLY"] = True
-app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
 
-# Blueprints
-app.register_blueprint(auth_blueprint)
-app.register_blueprint(admin_blueprint)
-app.register_blueprint(payroll_blueprint)
+# -------------------------
+# APP FACTORY
+# -------------------------
+# gunicorn "app:create_app()" builds the app once in the master; `app:app`
+# and `from app import app` still work and get a default app built on first
+# access. Blueprints (and through them the datastore) are imported inside
+# the factory, and the export code (ReportLab, PIL, qrcode) only on the first
+# export, see utils/exporters.
+#
+# With config.WARM_UP the factory also does the first request's work (load
+# the datastore, build its indexes and aggregates, compile the templates).
+# Under gunicorn.conf.py the app is preloaded: that work happens once in the
+# master and the forked workers share the result copy-on-write, so their
+# first request runs at steady-state speed. before_fork()/post_fork() are
+# the gunicorn hooks.
+def create_app(config=Config):
+    started = time.perf_counter()
+
+    from routes.auth_routes import auth_blueprint
+    from routes.admin_routes import admin_blueprint
+    from routes.payroll_routes import payroll_blueprint
+    from utils.jobs import start_workers
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    if config.TRUSTED_PROXIES:
+        # remote_addr (login throttling) is the client, not the proxy
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.TRUSTED_PROXIES,
+                                x_proto=config.TRUSTED_PROXIES)
+
+    # Session config
+    app.permanent_session_lifetime = timedelta(minutes=45)
+    app.config["SESSION_COOKIE_HTTPONLY"] = True
+    app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
+
+    # Blueprints
+    app.register_blueprint(auth_blueprint)
+    app.register_blueprint(admin_blueprint)
+    app.register_blueprint(payroll_blueprint)
+
+    _register_instrumentation(app, config)
+
+    @app.route("/")
+    def home():
+        if session.get("admin"):
+            return redirect(url_for("admin.dashboard"))
+        return redirect(url_for("auth.login"))
+
+    if config.WARM_UP:
+        warm_up(app)
+
+    if config.PRELOAD:
+        # threads do not survive fork(): each worker starts its own job
+        # workers in post_fork(). Freezing moves the warm heap out of the
+        # collector's reach, so GC passes don't dirty the shared pages.
+        gc.freeze()
+    else:
+        # Background job worker (payslips, backups, exports)
+        start_workers()
+
+    metrics.observe(APP_STARTUP, time.perf_counter() - started)
+    return app
+
+
+def warm_up(app):
+    """Load the datastore and compile every template before serving."""
+    from utils import datastore
+
+    datastore.warm_up()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    with app.test_request_context():
+        # builds the URL map's matcher
+        url_for("auth.login")
+
+
+# -------------------------
+# FORK HOOKS (gunicorn.conf.py)
+# -------------------------
+def before_fork():
+    """In the master, before each worker is forked."""
+    from utils import datastore
+    datastore.before_fork()
+
+
+def post_fork():
+    """
+    In each new worker: fresh datastore locks and connections (the warm
+    cache itself is kept), metrics counted from zero, and this worker's
+    background job threads.
+    """
+    from utils import datastore
+    from utils.jobs import start_workers
+
+    datastore.after_fork()
+    metrics.reset()
+    start_workers()
+
+
+# -------------------------
+# INSTRUMENTATION
+# -------------------------
+# Every request is timed into a latency histogram labelled by endpoint
+# (unmatched URLs share one label) and exposed at /metrics together with the
+# datastore, storage and PDF metrics. Streamed responses are timed up to
+# the first byte. With Config.PROFILE_ENABLED, a request sent with the
+# X-Profile header is also profiled (see utils/profiling.py). Profiling and
+# /metrics are only for a logged-in super_admin or a caller presenting
+# Config.INSTRUMENTATION_TOKEN; anyone else's X-Profile header is ignored.
+def _register_instrumentation(app, config):
+    from utils.auth import has_permission
+
+    def _instrumentation_allowed():
+        token = config.INSTRUMENTATION_TOKEN
+        auth = request.headers.get("Authorization", "")
+        if token and auth.startswith("Bearer ") and hmac.compare_digest(
+                auth[len("Bearer "):].encode(), token.encode()):
+            return True
+        return has_permission("super_admin")
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+        g.profile = None
+        mode = request.headers.get(config.PROFILE_HEADER)
+        if mode and config.PROFILE_ENABLED and _instrumentation_allowed():
+            g.profile = profiling.start(mode)
+
+    @app.after_request
+    def _record_timing(response):
+        start = g.pop("request_start", None)
+        if start is None:
+            return response
+
+        profile = g.pop("profile", None)
+        if profile is not None:
+            path = profiling.stop(profile, request.endpoint)
+            response.headers["X-Profile-Output"] = path
+
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or "unmatched"
+        metrics.observe("payroll_http_request_duration_seconds", elapsed,
+                        endpoint=endpoint, method=request.method)
+        metrics.inc("payroll_http_requests_total", endpoint=endpoint,
+                    method=request.method, status=response.status_code)
+        response.headers["Server-Timing"] = f"app;dur={elapsed * 1000:.1f}"
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        # the request failed before after_request; still release the profiler
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profiling.stop(profile, request.endpoint)
+
+    def _template_started(sender, template, context, **extra):
+        g.setdefault("template_starts", []).append(time.perf_counter())
+
+    def _template_finished(sender, template, context, **extra):
+        starts = g.get("template_starts")
+        if starts:
+            metrics.observe("payroll_template_render_duration_seconds",
+                            time.perf_counter() - starts.pop(), template=template.name)
+
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_finished, app, weak=False)
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        if not config.METRICS_ENABLED:
+            abort(404)
+        if not (config.METRICS_PUBLIC or _instrumentation_allowed()):
+            abort(403)
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    # `app` is built on first access, so importing this module stays cheap
+    global _default_app
+    if name == "app":
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-@app.route("/")
-def home():
-    if session.get("admin"):
-        return redirect(url_for("admin.dashboard"))
-    return redirect(url_for("auth.login"))
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,125 @@
+import argparse
+import sys
+from datetime import datetime
+
+from utils import backups
+from utils.datastore import create_backup, restore_backup
+
+
+def cmd_list(args):
+    for b in backups.index_backups():
+        counts = ", ".join(f"{t}={n}" for t, n in (b["counts"] or {}).items())
+        checksum = (b["checksum"] or "?")[:16]
+        print(f"{b['id']:<24} {b['kind']:<9} {checksum}  {counts}")
+
+
+def cmd_verify(args):
+    ids = [b["id"] for b in backups.list_snapshots()] if args.all else [args.snapshot]
+    if not ids or ids == [None]:
+        print("Give a backup id or --all.")
+        return 1
+
+    failed = 0
+    for snapshot_id in ids:
+        report = backups.verify_snapshot(snapshot_id)
+        status = "OK " if report["ok"] else "BAD"
+        print(f"{status} {report['id']}")
+        for error in report["errors"]:
+            print(f"    {error}")
+        failed += not report["ok"]
+    return 1 if failed else 0
+
+
+def cmd_diff(args):
+    diff = backups.diff_snapshots(args.old, args.new)
+    print(f"{'table':<12}{'before':>8}{'after':>8}{'added':>8}{'removed':>9}{'changed':>9}")
+    for table, d in diff.items():
+        print(f"{table:<12}{d['before']:>8}{d['after']:>8}{d['added']:>8}{d['removed']:>9}{d['changed']:>9}")
+
+
+def cmd_export(args):
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for part in backups.iter_snapshot_json(args.snapshot):
+            out.write(part)
+    finally:
+        if args.output:
+            out.close()
+
+
+def cmd_create(args):
+    snapshot_id = create_backup(prune=not args.no_prune)
+    print(f"Backup created: {snapshot_id}" if snapshot_id else "Nothing to back up.")
+
+
+def cmd_prune(args):
+    removed, swept = backups.prune(args.keep_last, args.keep_daily)
+    print(f"Removed {removed} snapshot(s) and {swept} unused chunk(s).")
+
+
+def cmd_restore(args):
+    if args.at:
+        snapshot = backups.snapshot_at(datetime.fromisoformat(args.at))
+        if snapshot is None:
+            print("No backup exists at or before that time.")
+            return 1
+        snapshot_id = snapshot["id"]
+    else:
+        snapshot_id = args.snapshot
+
+    if not snapshot_id:
+        print("Give a backup id or --at TIME.")
+        return 1
+
+    try:
+        safety = restore_backup(snapshot_id, verify=not args.no_verify)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"Restored backup {snapshot_id}.")
+    if safety:
+        print(f"Previous state saved as {safety}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CodeNest Payroll backups")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="list backups with checksums").set_defaults(func=cmd_list)
+
+    p = sub.add_parser("verify", help="check a backup's chunks, checksums and counts")
+    p.add_argument("snapshot", nargs="?")
+    p.add_argument("--all", action="store_true", help="verify every backup")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("diff", help="record-count diff between two backups")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.set_defaults(func=cmd_diff)
+
+    p = sub.add_parser("export", help="write a backup out as one JSON document")
+    p.add_argument("snapshot")
+    p.add_argument("-o", "--output", help="file to write (default: stdout)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("create", help="take an incremental backup now")
+    p.add_argument("--no-prune", action="store_true", help="skip the retention policy")
+    p.set_defaults(func=cmd_create)
+
+    p = sub.add_parser("prune", help="apply the retention policy")
+    p.add_argument("--keep-last", type=int, default=None)
+    p.add_argument("--keep-daily", type=int, default=None)
+    p.set_defaults(func=cmd_prune)
+
+    p = sub.add_parser("restore", help="restore a backup over the live data")
+    p.add_argument("snapshot", nargs="?", help="backup id (see `list`)")
+    p.add_argument("--at", help="restore the newest backup at or before this ISO time")
+    p.add_argument("--no-verify", action="store_true", help="skip verification first")
+    p.set_defaults(func=cmd_restore)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
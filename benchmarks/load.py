@@ -0,0 +1,418 @@
+# benchmarks/load.py
+"""
+Concurrency stress test against a real server.
+
+    python benchmarks/load.py --workers 4 --users 16 --duration 60
+    python benchmarks/load.py --server werkzeug     # no gunicorn installed
+
+Starts `app:create_app()` under gunicorn with --workers processes, in a temporary
+directory seeded with synthetic data, and drives mixed traffic from
+--users client threads (each with its own session): logins, dashboard and
+history loads, process-payroll POSTs and CSV exports. Several users pay
+the same unpaid employees on purpose, so double payments show up. After
+the mixed traffic, --burst-processes client processes wait on a barrier
+and POST payroll for the same employee at the same moment (through both
+the payroll and the admin route), --burst-rounds times, so a
+check-then-insert race between server workers or threads is hit head on.
+
+When the run ends the server is stopped and the data is checked: the
+snapshot and journal must parse, payroll ids must be unique, no employee
+may be paid twice in a month, and every POST that reported success must
+have its record. Throughput, p50/p99 latency and the checks are printed
+and written as JSON (--output). Exit status is 1 if any check fails.
+"""
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from http.cookiejar import CookieJar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USERNAME = "loadtest"
+PASSWORD = "loadtest-password"
+
+# operation -> weight in the traffic mix
+MIX = {
+    "dashboard": 40,
+    "history": 15,
+    "process_payroll": 25,
+    "export_csv": 10,
+    "login": 10,
+}
+
+
+# -------------------------
+# WORKSPACE + SERVER
+# -------------------------
+def prepare_workspace(records, months):
+    from benchmarks.synthetic import make_document, shape_for
+    from utils.credentials import hash_password
+
+    employees, months = shape_for(records, months)
+    doc = make_document(employees, months)
+    doc["admins"] = [{"username": USERNAME, "password": hash_password(PASSWORD), "role": "super_admin"}]
+
+    workdir = tempfile.mkdtemp(prefix="payroll_load_")
+    os.makedirs(os.path.join(workdir, "data"))
+    with open(os.path.join(workdir, "data", "admins.json"), "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=4)
+    return workdir, doc
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, workdir, port):
+    if args.server == "gunicorn":
+        # the repo's config: preloaded, warmed app forked into the workers
+        cmd = [sys.executable, "-m", "gunicorn", "app:create_app()",
+               "--config", os.path.join(ROOT, "gunicorn.conf.py"),
+               "--workers", str(args.workers), "--threads", str(args.threads),
+               "--bind", f"127.0.0.1:{port}", "--chdir", workdir, "--pythonpath", ROOT,
+               "--timeout", "120"]
+    else:
+        code = ("import sys; sys.path.insert(0, {!r}); from app import app; "
+                "app.run(host='127.0.0.1', port={}, threaded=True)").format(ROOT, port)
+        cmd = [sys.executable, "-c", code]
+
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=log, stderr=subprocess.STDOUT,
+                            start_new_session=True)
+
+    url = f"http://127.0.0.1:{port}/auth/login"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Server exited early; see {log.name}")
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return proc
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    stop_server(proc)
+    raise SystemExit(f"Server did not start within 30s; see {log.name}")
+
+
+def stop_server(proc):
+    if proc.poll() is None:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+# -------------------------
+# CLIENT
+# -------------------------
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.paid = []   # employee ids whose POST reported success
+
+    def record(self, op, seconds, status):
+        with self.lock:
+            self.latencies[op].append(seconds)
+            self.statuses[op][status] += 1
+
+
+class User:
+    def __init__(self, base, stats, unpaid, rng):
+        self.base = base
+        self.stats = stats
+        self.unpaid = unpaid
+        self.rng = rng
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def request(self, op, path, form=None):
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        start = time.perf_counter()
+        try:
+            with self.opener.open(self.base + path, data=data, timeout=120) as r:
+                body = r.read()
+                status = r.status
+        except urllib.error.HTTPError as e:
+            body, status = e.read(), e.code
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            with self.stats.lock:
+                self.stats.errors[f"{op}: {e}"] += 1
+            return None
+        self.stats.record(op, time.perf_counter() - start, status)
+        return body
+
+    def login(self):
+        body = self.request("login", "/auth/login", {"username": USERNAME, "password": PASSWORD})
+        return body is not None and b"Invalid username" not in body
+
+    def pay(self, op, emp_id, admin_route=False):
+        """POST payroll for emp_id; True if the app reported it saved."""
+        if admin_route:
+            body = self.request(op, "/admin/payroll/process",
+                                {"employee_id": emp_id, "days_worked": 20})
+            return body is not None and b"Payroll processed successfully" in body
+        body = self.request(op, "/payroll/process",
+                            {"employee": emp_id, "days_worked": self.rng.randint(15, 30), "rate": 12})
+        return body is not None and b"Payroll saved" in body
+
+    def step(self):
+        op = self.rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        if op == "login":
+            self.login()
+        elif op == "dashboard":
+            self.request(op, "/admin/dashboard")
+        elif op == "history":
+            self.request(op, "/admin/payroll/history")
+        elif op == "export_csv":
+            self.request(op, "/admin/payroll/export/csv")
+        else:
+            emp_id = self.rng.choice(self.unpaid)
+            if self.pay(op, emp_id):
+                with self.stats.lock:
+                    self.stats.paid.append(emp_id)
+
+
+def drive(base, args, doc):
+    stats = Stats()
+    # a small pool of unpaid employees, so concurrent users collide on them
+    unpaid = [e["id"] for e in doc["employees"] if e["id"] % 2 == 0][:args.contended]
+    deadline = time.monotonic() + args.duration
+
+    def run(i):
+        user = User(base, stats, unpaid, random.Random(i))
+        if not user.login():
+            with stats.lock:
+                stats.errors["initial login failed"] += 1
+            return
+        while time.monotonic() < deadline:
+            user.step()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(args.users)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return stats, time.monotonic() - started
+
+
+def _burst_client(base, index, emp_ids, barrier, results):
+    stats = Stats()
+    user = User(base, stats, emp_ids, random.Random(index))
+    paid = []
+    if user.login():
+        for emp_id in emp_ids:
+            barrier.wait()
+            # half the clients use the admin route, so both paths race
+            if user.pay("burst_payroll", emp_id, admin_route=index % 2 == 1):
+                paid.append(emp_id)
+    else:
+        # keep the barrier's party count intact for the others
+        for _ in emp_ids:
+            barrier.wait()
+    results.put((paid, dict(stats.latencies), dict(stats.statuses), dict(stats.errors)))
+
+
+def burst(base, args, stats, emp_ids):
+    """Overlapping payroll POSTs for the same employees from several processes."""
+    if args.burst_processes < 2 or not emp_ids:
+        return
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(args.burst_processes)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_burst_client, args=(base, i, emp_ids, barrier, results))
+             for i in range(args.burst_processes)]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    for paid, latencies, statuses, errors in collected:
+        stats.paid.extend(paid)
+        for op, values in latencies.items():
+            stats.latencies[op].extend(values)
+        for op, counts in statuses.items():
+            stats.statuses[op].update(counts)
+        stats.errors.update(errors)
+
+
+# -------------------------
+# INTEGRITY
+# -------------------------
+def check_integrity(workdir, doc, paid):
+    checks = {}
+
+    try:
+        with open(os.path.join(workdir, "data", "admins.json"), encoding="utf-8") as f:
+            json.load(f)
+        checks["snapshot_parses"] = True
+    except (OSError, ValueError):
+        checks["snapshot_parses"] = False
+
+    bad_lines = 0
+    journal_file = os.path.join(workdir, "data", "admins.journal")
+    if os.path.exists(journal_file):
+        with open(journal_file, "rb") as f:
+            for line in f:
+                try:
+                    json.loads(line)
+                except ValueError:
+                    bad_lines += 1
+    checks["journal_bad_lines"] = bad_lines
+
+    from utils.storage import segments
+    checks["segment_errors"] = len(segments.verify(os.path.join(workdir, "data", "payroll")))
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from utils import datastore as ds
+        ds.invalidate_cache()
+        records = ds.load_payroll_records()
+        employees = ds.load_employees()
+    finally:
+        os.chdir(cwd)
+
+    ids = Counter(str(r.get("id")) for r in records)
+    months = Counter((str(r.get("employee_id")), str(r.get("date", ""))[:7]) for r in records)
+    this_month = date.today().isoformat()[:7]
+    stored = {emp for emp, month in months if month == this_month}
+
+    checks["payroll_before"] = len(doc["payroll"])
+    checks["payroll_after"] = len(records)
+    checks["successful_posts"] = len(paid)
+    checks["duplicate_ids"] = sum(n - 1 for n in ids.values() if n > 1)
+    checks["double_payments"] = sum(n - 1 for n in months.values() if n > 1)
+    checks["lost_records"] = sum(1 for emp in paid if str(emp) not in stored)
+    checks["unexpected_records"] = len(records) - len(doc["payroll"]) - len(paid)
+    checks["employees_changed"] = len(employees) != len(doc["employees"])
+
+    checks["ok"] = (checks["snapshot_parses"] and not bad_lines and not checks["segment_errors"]
+                    and not checks["duplicate_ids"]
+                    and not checks["double_payments"] and not checks["lost_records"]
+                    and not checks["unexpected_records"] and not checks["employees_changed"])
+    return checks
+
+
+# -------------------------
+# REPORT
+# -------------------------
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def summarize(stats, elapsed):
+    ops = {}
+    total = 0
+    for op, values in sorted(stats.latencies.items()):
+        values.sort()
+        total += len(values)
+        ops[op] = {
+            "requests": len(values),
+            "per_second": len(values) / elapsed,
+            "p50": _percentile(values, 0.50),
+            "p99": _percentile(values, 0.99),
+            "max": values[-1],
+            "statuses": {str(k): v for k, v in stats.statuses[op].items()},
+        }
+    return {"requests": total, "per_second": total / elapsed, "elapsed": elapsed,
+            "operations": ops, "errors": dict(stats.errors)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CodeNest Payroll load test")
+    parser.add_argument("--server", choices=("gunicorn", "werkzeug"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker")
+    parser.add_argument("--users", type=int, default=16, help="concurrent client sessions")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+    parser.add_argument("--records", type=int, default=10000, help="synthetic payroll records")
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--contended", type=int, default=50,
+                        help="unpaid employees the POSTs compete for")
+    parser.add_argument("--burst-processes", type=int, default=6,
+                        help="client processes POSTing payroll for one employee at once (0: off)")
+    parser.add_argument("--burst-rounds", type=int, default=5,
+                        help="employees the burst processes pay, one after another")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary directory")
+    parser.add_argument("-o", "--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.server == "gunicorn" and importlib.util.find_spec("gunicorn") is None:
+        raise SystemExit("gunicorn is not installed (pip install gunicorn); "
+                         "or run with --server werkzeug")
+
+    workdir, doc = prepare_workspace(args.records, args.months)
+    port = _free_port()
+    try:
+        proc = start_server(args, workdir, port)
+    except SystemExit:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    # employees outside the contended pool, so only the burst pays them
+    unpaid = [e["id"] for e in doc["employees"] if e["id"] % 2 == 0]
+    burst_ids = unpaid[args.contended:args.contended + args.burst_rounds]
+    try:
+        stats, elapsed = drive(f"http://127.0.0.1:{port}", args, doc)
+        burst(f"http://127.0.0.1:{port}", args, stats, burst_ids)
+    finally:
+        stop_server(proc)
+
+    report = summarize(stats, elapsed)
+    report["integrity"] = check_integrity(workdir, doc, stats.paid)
+    report["meta"] = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "server": args.server, "workers": args.workers, "threads": args.threads,
+        "users": args.users, "duration": args.duration, "records": len(doc["payroll"]),
+        "burst_processes": args.burst_processes, "burst_employees": burst_ids,
+        "workdir": workdir if args.keep else None,
+    }
+
+    server = f"gunicorn x{args.workers}" if args.server == "gunicorn" else "werkzeug, threaded"
+    print(f"{report['requests']} requests in {elapsed:.1f}s "
+          f"({report['per_second']:.1f}/s, {args.users} users, {server})")
+    print(f"  {'operation':<18}{'count':>8}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}  statuses")
+    for op, s in report["operations"].items():
+        print(f"  {op:<18}{s['requests']:>8}{s['per_second']:>9.1f}{s['p50'] * 1000:>10.1f}"
+              f"{s['p99'] * 1000:>10.1f}  {s['statuses']}")
+    for error, count in report["errors"].items():
+        print(f"  error x{count}: {error}")
+    print("integrity:", json.dumps(report["integrity"]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if report["integrity"]["ok"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,428 @@
+# benchmarks/run.py
+"""
+Benchmarks for the datastore, payroll computation, exports and routes.
+
+    python benchmarks/run.py run                       # 1k, 10k, 100k records
+    python benchmarks/run.py run --sizes 1000 --only read_json,route_dashboard
+    python benchmarks/run.py compare old.json new.json  # exit 1 on regressions
+    python benchmarks/run.py startup                   # worker boot time and RSS
+    python benchmarks/run.py startup --records 100000 --fork   # first request after fork
+
+Each size runs against its own synthetic dataset in a temporary directory
+(the live data/ is never touched). Results are written as JSON to
+benchmarks/results/<commit>_<time>.json so runs can be compared between
+commits; timings are seconds per call.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+sys.path.insert(0, ROOT)
+
+# background job workers would compete with the benchmarks for the CPU
+os.environ.setdefault("PAYROLL_JOB_WORKERS", "0")
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+# -------------------------
+# TIMING
+# -------------------------
+def measure(fn, setup=None, budget=2.0, min_runs=3, max_runs=200, inner=1):
+    """Call `fn` repeatedly (one warm-up call) and return per-call stats."""
+    if setup:
+        setup()
+    fn()
+
+    times = []
+    started = time.perf_counter()
+    while len(times) < min_runs or (len(times) < max_runs and time.perf_counter() - started < budget):
+        if setup:
+            setup()
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) / inner)
+
+    times.sort()
+    return {
+        "runs": len(times),
+        "min": times[0],
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "p95": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "max": times[-1],
+    }
+
+
+# -------------------------
+# WORKSPACE
+# -------------------------
+def prepare_workspace(records, months):
+    """
+    Fresh temp dir with a synthetic data/admins.json; becomes the cwd. The
+    document is then written through the store, so the benchmarks read the
+    engine's own layout (month segments, SQLite).
+    """
+    from benchmarks.synthetic import make_document, shape_for
+
+    employees, months = shape_for(records, months)
+    doc = make_document(employees, months)
+
+    workdir = tempfile.mkdtemp(prefix=f"payroll_bench_{records}_")
+    os.makedirs(os.path.join(workdir, "data"))
+    os.makedirs(os.path.join(workdir, "exports"))
+    with open(os.path.join(workdir, "data", "admins.json"), "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=4)
+    os.chdir(workdir)
+
+    from utils.datastore import write_json
+    write_json(doc)
+    return workdir, doc
+
+
+# -------------------------
+# BENCHMARKS
+# -------------------------
+def datastore_benchmarks(doc):
+    from utils import datastore as ds
+    from utils.payroll_calc import compute_payroll
+
+    today = date.today()
+    employees = doc["employees"]
+    ids = [e["id"] for e in employees[:200]]
+    months = [(today.year, today.month)]
+    sample = doc["payroll"][-1]
+    department = employees[0]["department"]
+    snapshot = ds.read_json()
+
+    def paid_checks():
+        for emp_id in ids:
+            ds.has_been_paid_this_month(emp_id)
+
+    def stream_csv():
+        for _ in ds.iter_payroll_csv(ds.iter_payroll_records()):
+            pass
+
+    return [
+        ("read_json_cold", dict(fn=ds.read_json, setup=ds.invalidate_cache)),
+        ("read_json", dict(fn=ds.read_json)),
+        ("write_json", dict(fn=lambda: ds.write_json(snapshot), max_runs=20)),
+        ("load_employees", dict(fn=ds.load_employees)),
+        ("load_payroll_records", dict(fn=ds.load_payroll_records)),
+        ("get_employee", dict(fn=lambda: ds.get_employee(ids[-1]))),
+        ("has_been_paid_this_month", dict(fn=paid_checks, inner=len(ids))),
+        ("paid_employee_ids", dict(fn=lambda: ds.paid_employee_ids(today.year, today.month))),
+        ("payroll_summary", dict(fn=lambda: ds.payroll_summary(months))),
+        ("payroll_history_page", dict(fn=lambda: ds.payroll_history_page(limit=50))),
+        ("payroll_history_page_department",
+         dict(fn=lambda: ds.payroll_history_page(limit=50, department=department))),
+        ("load_payroll_for_month", dict(fn=lambda: ds.load_payroll_for_month(today.year, today.month))),
+        # before the cache is loaded: one month segment + the journal
+        ("load_payroll_for_month_cold", dict(fn=lambda: ds.load_payroll_for_month(today.year, today.month),
+                                             setup=ds.invalidate_cache)),
+        ("has_been_paid_this_month_cold", dict(fn=lambda: ds.has_been_paid_this_month(ids[-1]),
+                                               setup=ds.invalidate_cache)),
+        ("export_payroll_csv", dict(fn=lambda: ds.export_payroll_csv(ds.load_payroll_records(),
+                                                                    "exports/bench.csv"))),
+        ("iter_payroll_csv", dict(fn=stream_csv)),
+        ("export_payroll_pdf", dict(fn=lambda: ds.export_payroll_pdf(sample, "exports/bench.pdf"))),
+        ("compute_payroll", dict(fn=lambda: compute_payroll(
+            [22] * len(employees), [None] * len(employees), [e["salary"] for e in employees]))),
+        ("save_payroll_record", dict(fn=lambda: ds.save_payroll_record(dict(sample)), max_runs=50)),
+    ]
+
+
+def route_benchmarks(doc):
+    from app import app
+
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin"] = "bench"
+        s["role"] = "super_admin"
+
+    def get(url):
+        def call():
+            r = client.get(url)
+            r.get_data()
+            assert r.status_code == 200, (url, r.status_code)
+        return call
+
+    # even ids are unpaid this month (see synthetic.py); each POST pays one
+    unpaid = iter([e["id"] for e in doc["employees"] if e["id"] % 2 == 0])
+
+    def process_payroll():
+        r = client.post("/payroll/process", data={"employee": next(unpaid), "days_worked": "20"})
+        assert r.status_code == 302, r.status_code
+
+    return [
+        ("route_dashboard", dict(fn=get("/admin/dashboard"))),
+        ("route_employees", dict(fn=get("/admin/employees"))),
+        ("route_payroll_history", dict(fn=get("/admin/payroll/history"))),
+        ("route_export_csv", dict(fn=get("/admin/payroll/export/csv"))),
+        ("route_process_payroll", dict(fn=process_payroll,
+                                       max_runs=max(1, doc["employees"][-1]["id"] // 2 - 1))),
+    ]
+
+
+# -------------------------
+# STARTUP
+# -------------------------
+# What a fresh worker pays before and on its first request: importing
+# app.py and building the app, timed in a new interpreter each run, plus
+# the resident memory after startup and which heavy optional modules got
+# imported along the way.
+# With --records the workspace holds synthetic data and the first and
+# second dashboard requests are timed too; --fork builds the app with
+# PAYROLL_PRELOAD=1 and serves those requests from a forked child, the way
+# gunicorn.conf.py runs the workers.
+HEAVY_MODULES = ("reportlab", "PIL", "qrcode", "numpy")
+
+STARTUP_SNIPPET = """
+import json, os, resource, sys, time
+requests, fork = json.loads(sys.argv[1])
+
+def rss_kb():
+    # current RSS; ru_maxrss would include the parent's peak on Linux
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+started = time.perf_counter()
+import app
+application = app.create_app()
+result = {
+    "app_startup": time.perf_counter() - started,
+    "rss_kb": rss_kb(),
+    "heavy": sorted(m for m in %r if m in sys.modules),
+}
+
+def first_requests():
+    client = application.test_client()
+    with client.session_transaction() as s:
+        s["admin"] = "bench"
+        s["role"] = "super_admin"
+    times = []
+    for _ in range(2):
+        t = time.perf_counter()
+        r = client.get("/admin/dashboard")
+        r.get_data()
+        assert r.status_code == 200, r.status_code
+        times.append(time.perf_counter() - t)
+    return times
+
+if requests:
+    if fork:
+        app.before_fork()
+        rfd, wfd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            app.post_fork()
+            os.write(wfd, json.dumps(first_requests()).encode())
+            os._exit(0)
+        os.close(wfd)
+        os.waitpid(pid, 0)
+        times = json.loads(os.read(rfd, 65536))
+    else:
+        times = first_requests()
+    result["first_request"], result["second_request"] = times
+print(json.dumps(result))
+""" % (HEAVY_MODULES,)
+
+
+def _stats(times):
+    times = sorted(times)
+    return {
+        "runs": len(times),
+        "min": times[0],
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "p95": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "max": times[-1],
+    }
+
+
+def measure_startup(runs, records=0, months=12, fork=False):
+    """
+    {name: stats} over `runs` fresh interpreters for app_startup and, with
+    `records`, first_request/second_request. app_startup also carries
+    rss_mb and heavy_modules.
+    """
+    workdir = tempfile.mkdtemp(prefix="payroll_bench_startup_")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    if fork:
+        env["PAYROLL_PRELOAD"] = "1"
+    samples = []
+    try:
+        if records:
+            from benchmarks.synthetic import make_document, shape_for
+
+            os.makedirs(os.path.join(workdir, "data"))
+            with open(os.path.join(workdir, "data", "admins.json"), "w", encoding="utf-8") as f:
+                json.dump(make_document(*shape_for(records, months)), f, indent=4)
+
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-c", STARTUP_SNIPPET, json.dumps([bool(records), fork])],
+                                 cwd=workdir, env=env, capture_output=True, text=True, check=True)
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {"app_startup": dict(_stats([s["app_startup"] for s in samples]),
+                                   rss_mb=statistics.median(s["rss_kb"] for s in samples) / 1024,
+                                   heavy_modules=samples[-1]["heavy"])}
+    for name in ("first_request", "second_request"):
+        if name in samples[-1]:
+            results[name] = _stats([s[name] for s in samples])
+    return results
+
+
+# -------------------------
+# COMMANDS
+# -------------------------
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _write_report(args, results, **meta):
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "storage_engine": os.environ.get("PAYROLL_STORAGE_ENGINE", "json"),
+            **meta,
+        },
+        "results": results,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+def cmd_run(args):
+    from utils import datastore as ds
+
+    only = set(args.only.split(",")) if args.only else None
+    results = []
+    cwd = os.getcwd()
+
+    for size in args.sizes:
+        workdir, doc = prepare_workspace(size, args.months)
+        ds.invalidate_cache()
+        try:
+            print(f"== {size} requested, {len(doc['payroll'])} payroll records, "
+                  f"{len(doc['employees'])} employees ({workdir})")
+
+            for name, spec in datastore_benchmarks(doc) + route_benchmarks(doc):
+                if only and name not in only:
+                    continue
+                spec.setdefault("budget", args.budget)
+                stats = measure(**spec)
+                results.append({"name": name, "size": size,
+                                "records": len(doc["payroll"]), **stats})
+                print(f"  {name:<34}{stats['median'] * 1000:>12.3f} ms  (runs={stats['runs']})")
+        finally:
+            os.chdir(cwd)
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    _write_report(args, results, sizes=args.sizes, months=args.months)
+
+
+def cmd_startup(args):
+    measured = measure_startup(args.runs, args.records, args.months, args.fork)
+    results = []
+    for name, stats in measured.items():
+        print(f"  {name:<34}{stats['median'] * 1000:>12.3f} ms  (runs={stats['runs']})")
+        results.append({"name": name, "size": args.records, "records": args.records, **stats})
+
+    startup = measured["app_startup"]
+    print(f"  {'RSS after startup':<34}{startup['rss_mb']:>12.1f} MB")
+    print(f"  {'heavy modules imported':<34}{', '.join(startup['heavy_modules']) or 'none':>12}")
+    _write_report(args, results, records=args.records, months=args.months, fork=args.fork,
+                  warm_up=os.environ.get("PAYROLL_WARM_UP", "1") == "1")
+
+
+def cmd_compare(args):
+    def load(path):
+        with open(path, encoding="utf-8") as f:
+            report = json.load(f)
+        return report["meta"], {(r["name"], r["size"]): r for r in report["results"]}
+
+    old_meta, old = load(args.old)
+    new_meta, new = load(args.new)
+    print(f"{old_meta['commit']} -> {new_meta['commit']} (median, threshold {args.threshold:.0%})")
+
+    regressions = 0
+    for key in sorted(old.keys() & new.keys(), key=lambda k: (k[1], k[0])):
+        before, after = old[key]["median"], new[key]["median"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"  {key[0]:<34}{key[1]:>8}{before * 1000:>12.3f}{after * 1000:>12.3f} ms"
+              f"{change:>+9.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CodeNest Payroll benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="run the benchmarks and write a JSON report")
+    p.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")],
+                   default=list(DEFAULT_SIZES), help="payroll record counts (default 1000,10000,100000)")
+    p.add_argument("--months", type=int, default=12, help="months of payroll history")
+    p.add_argument("--budget", type=float, default=2.0, help="seconds per benchmark")
+    p.add_argument("--only", help="comma-separated benchmark names")
+    p.add_argument("--keep", action="store_true", help="keep the temporary datasets")
+    p.add_argument("-o", "--output", help="report path (default: benchmarks/results/)")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("startup", help="time app import + create_app() in fresh interpreters")
+    p.add_argument("--runs", type=int, default=10, help="interpreters to start (default 10)")
+    p.add_argument("--records", type=int, default=0,
+                   help="seed this many payroll records and time the first requests")
+    p.add_argument("--months", type=int, default=12, help="months of payroll history")
+    p.add_argument("--fork", action="store_true",
+                   help="serve the first requests from a forked child (gunicorn preload)")
+    p.add_argument("-o", "--output", help="report path (default: benchmarks/results/)")
+    p.set_defaults(func=cmd_startup)
+
+    p = sub.add_parser("compare", help="compare two reports")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown (default 0.15)")
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
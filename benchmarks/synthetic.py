@@ -0,0 +1,78 @@
+# benchmarks/synthetic.py
+import random
+from datetime import date
+
+from utils.payroll_calc import compute_payroll
+
+# -------------------------
+# SYNTHETIC DATA
+# -------------------------
+# Deterministic documents in the data/admins.json shape: `employees`
+# employees paid once a month for `months` months ending with the current
+# month, so "paid this month" checks and the dashboard see realistic data.
+# The current month is only half paid (odd employee ids), like a payroll
+# run in progress, which leaves even ids free for process-payroll requests.
+
+DEPARTMENTS = ["Computer Science", "Finance", "Human Resources", "Operations",
+               "Sales", "Marketing", "Engineering", "Support"]
+FIRST = ["Ama", "Kofi", "Princeton", "Christina", "Esi", "Kwame", "Yaw", "Abena",
+         "Daniel", "Grace", "Samuel", "Ruth"]
+LAST = ["Mensah", "Brooks", "Zahnmie", "Owusu", "Boateng", "Asante", "Doe", "Smith"]
+
+
+def _months_back(count, today):
+    year, month = today.year, today.month
+    out = []
+    for _ in range(count):
+        out.append((year, month))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return out[::-1]
+
+
+def make_document(employees, months, seed=42, today=None):
+    """A full datastore document with about employees * months payroll records."""
+    rng = random.Random(seed)
+
+    staff = []
+    for i in range(1, employees + 1):
+        staff.append({
+            "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+            "department": rng.choice(DEPARTMENTS),
+            "salary": float(rng.randrange(150, 900)),
+            "id": i,
+        })
+
+    today = today or date.today()
+    payroll = []
+    next_id = 1
+    for year, month in _months_back(months, today):
+        current = (year, month) == (today.year, today.month)
+        paid = [e for e in staff if not (current and e["id"] % 2 == 0)]
+        days = [rng.randint(15, 30) for _ in paid]
+        cols = compute_payroll(days, [None] * len(paid), [e["salary"] for e in paid])
+
+        for i, emp in enumerate(paid):
+            day = rng.randint(1, today.day if current else 28)
+            payroll.append({
+                "employee_id": emp["id"],
+                "employee_name": emp["name"],
+                "days_worked": days[i],
+                "rate": float(cols["rate"][i]),
+                "gross_pay": float(cols["gross_pay"][i]),
+                "tax": float(cols["tax"][i]),
+                "net_pay": float(cols["net_pay"][i]),
+                "date": date(year, month, day).isoformat(),
+                "id": next_id,
+            })
+            next_id += 1
+
+    admins = [{"username": "bench", "password": "", "role": "super_admin"}]
+    return {"admins": admins, "employees": staff, "payroll": payroll}
+
+
+def shape_for(records, months=12):
+    """(employees, months) giving roughly `records` payroll records."""
+    months = max(1, min(months, records))
+    return max(1, records // months), months
@@ -6,3 +6,66 @@ class Config:
     MYSQL_USER = "root"
     MYSQL_PASSWORD = ""
     MYSQL_DB = "payroll_system"
+
+    # Datastore engine: "json" (snapshot + journal) or "sqlite"
+    STORAGE_ENGINE = os.environ.get("PAYROLL_STORAGE_ENGINE", "json")
+    DATA_FILE = "data/admins.json"
+    JOURNAL_FILE = "data/admins.journal"
+    JOURNAL_ENABLED = True
+    JOURNAL_COMPACT_BYTES = 1024 * 1024
+    # Payroll rows in one NDJSON segment per month + manifest (JSON engine);
+    # None keeps them inside DATA_FILE
+    PAYROLL_SEGMENTS_DIR = "data/payroll"
+    SQLITE_FILE = "data/payroll.db"
+
+    # Background jobs (payslips, backups, exports)
+    JOBS_DIR = "data/jobs"
+    JOB_MAX_ATTEMPTS = 3
+    JOB_WORKERS = int(os.environ.get("PAYROLL_JOB_WORKERS", "1"))
+
+    # Backups: content-addressed chunks + per-snapshot manifests
+    BACKUP_DIR = "backups"
+    BACKUP_CHUNK_ROWS = 256
+    BACKUP_KEEP_LAST = 20
+    BACKUP_KEEP_DAILY = 30
+
+    # Seconds between cross-worker checks of the admins/roles token
+    AUTH_RECHECK_SECONDS = 2
+
+    # Credentials: werkzeug hash method, KDF concurrency, login throttling.
+    # The default is werkzeug's own scrypt setting (about 150 ms and 32 MiB
+    # per hash); the cost is unchanged. What bounds login CPU is
+    # PASSWORD_HASH_CONCURRENCY and the credential cache. Lowering the cost
+    # via PAYROLL_PASSWORD_HASH trades brute-force resistance for speed;
+    # existing hashes are upgraded to the configured method on next login.
+    PASSWORD_HASH_METHOD = os.environ.get("PAYROLL_PASSWORD_HASH", "scrypt:32768:8:1")
+    PASSWORD_HASH_CONCURRENCY = 2
+    CREDENTIAL_CACHE_SECONDS = 15 * 60
+    LOGIN_MAX_ATTEMPTS = 5
+    LOGIN_WINDOW_SECONDS = 5 * 60
+    # Failed logins per client (all usernames) allowed per window, as a
+    # multiple of LOGIN_MAX_ATTEMPTS; 0 throttles per (username, client) only
+    LOGIN_CLIENT_LIMIT_FACTOR = int(os.environ.get("PAYROLL_LOGIN_CLIENT_LIMIT_FACTOR", "4"))
+
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted
+    # (werkzeug ProxyFix). Behind a proxy leave this at 0 and every request
+    # comes from the proxy's address, so all users share one login throttle.
+    TRUSTED_PROXIES = int(os.environ.get("PAYROLL_TRUSTED_PROXIES", "0"))
+
+    # Startup: create_app() loads the datastore and compiles templates up
+    # front; PRELOAD (set by gunicorn.conf.py) means the app is built in the
+    # gunicorn master and per-process setup waits for the post-fork hook
+    WARM_UP = os.environ.get("PAYROLL_WARM_UP", "1") == "1"
+    PRELOAD = os.environ.get("PAYROLL_PRELOAD") == "1"
+
+    # Instrumentation: /metrics endpoint, opt-in per-request profiling.
+    # Both are limited to a logged-in super_admin or a request carrying
+    # "Authorization: Bearer <INSTRUMENTATION_TOKEN>" (e.g. a Prometheus
+    # scraper); METRICS_PUBLIC opens /metrics to anyone who can reach it
+    # (only for deployments where that is an internal network)
+    METRICS_ENABLED = True
+    METRICS_PUBLIC = os.environ.get("PAYROLL_METRICS_PUBLIC") == "1"
+    INSTRUMENTATION_TOKEN = os.environ.get("PAYROLL_INSTRUMENTATION_TOKEN")
+    PROFILE_ENABLED = os.environ.get("PAYROLL_PROFILE") == "1"
+    PROFILE_HEADER = "X-Profile"
+    PROFILE_DIR = "profiles"
@@ -0,0 +1,18 @@
+# gunicorn.conf.py
+import os
+
+# Build and warm the app once in the master (see create_app() in app.py),
+# then fork the workers: they start with the parsed datastore, its indexes
+# and the compiled templates already in memory, shared copy-on-write.
+os.environ.setdefault("PAYROLL_PRELOAD", "1")
+preload_app = True
+
+
+def pre_fork(server, worker):
+    import app
+    app.before_fork()
+
+
+def post_fork(server, worker):
+    import app
+    app.post_fork()
@@ -1,44 +1,48 @@
-import json
-import hashlib
-import os
-
-DATA_FILE = "database.json"
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def init_admin():
-    admin_username = "admin"
-    admin_password = "admin123"
-    hashed_pw = hash_password(admin_password)
-
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, "r") as f:
-                data = json.load(f)
-        except:
-            data = {"admins": [], "employees": [], "payroll": []}
-    else:
-        data = {"admins": [], "employees": [], "payroll": []}
+import argparse
+import getpass
+import sys
+
+from utils.datastore import add_admin, get_admin_by_username
+
+# Creates the first admin account in the live datastore (the first admin of
+# an empty store becomes super_admin). There is no built-in password: it is
+# prompted for, so no well-known credential ever reaches the store.
+#
+#   python init_admin.py              # creates "admin"
+#   python init_admin.py alice
+
+MIN_PASSWORD_LENGTH = 8
+
 
+def init_admin(admin_username, admin_password):
     # check if admin already exists
-    for adm in data["admins"]:
-        if adm["username"] == admin_username:
-            print("Admin already exists.")
-            return
+    if get_admin_by_username(admin_username):
+        print("Admin already exists.")
+        return False
 
-    # create admin
-    data["admins"].append({
-        "username": admin_username,
-        "password": hashed_pw
-    })
+    # create admin (salted hash in the configured format, live datastore)
+    add_admin(admin_username, admin_password)
 
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    admin = get_admin_by_username(admin_username) or {}
+    print(f"Admin created successfully! Username: {admin_username}, role: {admin.get('role')}")
+    return True
+
+
+def _prompt_password():
+    password = getpass.getpass("Password: ")
+    if len(password) < MIN_PASSWORD_LENGTH:
+        sys.exit(f"Password must be at least {MIN_PASSWORD_LENGTH} characters.")
+    if getpass.getpass("Repeat password: ") != password:
+        sys.exit("Passwords do not match.")
+    return password
 
-    print("Admin created successfully!")
-    print("Username: admin")
-    print("Password: admin123")
 
 if __name__ == "__main__":
-    init_admin()
+    parser = argparse.ArgumentParser(description="Create the first admin account.")
+    parser.add_argument("username", nargs="?", default="admin")
+    args = parser.parse_args()
+
+    if get_admin_by_username(args.username):
+        print("Admin already exists.")
+    else:
+        init_admin(args.username, _prompt_password())
@@ -0,0 +1,101 @@
+import argparse
+import json
+
+from utils import backups
+from utils.datastore import create_backup, get_store, read_json, transaction, write_json
+from utils.storage.schema import SchemaError, normalize_document
+
+# One-shot rewrite of stored data into the canonical schema (see
+# utils/storage/schema.py): the live document (data/admins.json + journal,
+# or the SQLite database) and every backup. Safe to run more than once;
+# data that is already canonical is left alone. Payroll still kept inside
+# data/admins.json is moved into month segments (data/payroll/) on the way.
+# The safety snapshot taken before the live rewrite is labelled and never
+# rewritten by a later run.
+#
+#   python migrate_data.py --dry-run     # report what would change
+#   python migrate_data.py               # rewrite backups, then live data
+
+
+SAFETY_LABEL = "pre-migration"
+
+
+def _row_text(row):
+    return json.dumps(row, sort_keys=True, ensure_ascii=False)
+
+
+def changed_rows(before, after):
+    """{table: number of rows whose stored form changes}."""
+    out = {}
+    for table, rows in after.items():
+        if isinstance(rows, list):
+            old = before.get(table, [])
+            out[table] = sum(1 for a, b in zip(old, rows) if _row_text(a) != _row_text(b))
+    return out
+
+
+def migrate_backups(dry_run):
+    failed = 0
+    for snapshot_id, status in backups.rewrite_snapshots(normalize_document, dry_run=dry_run).items():
+        if status not in ("rewritten", "unchanged") and not status.startswith("kept"):
+            failed += 1
+            status = f"FAILED: {status}"
+        elif status == "rewritten" and dry_run:
+            status = "would be rewritten"
+        print(f"  backup {snapshot_id:<24} {status}")
+    return failed
+
+
+def migrate_live(dry_run, safety_backup):
+    with transaction():
+        before = read_json()
+        try:
+            after = normalize_document(before)
+        except SchemaError as e:
+            print(f"  live data: FAILED: {e}")
+            return 1
+
+        changes = changed_rows(before, after)
+        summary = ", ".join(f"{t}={n}" for t, n in changes.items())
+        split = getattr(get_store(), "legacy_layout", False)
+        if split:
+            summary += " and moved payroll into month segments"
+        if not any(changes.values()) and not split:
+            print("  live data: already canonical")
+            return 0
+        if dry_run:
+            print(f"  live data: would rewrite {summary}")
+            return 0
+
+        if safety_backup:
+            # labelled: later runs and pruning leave this copy as it is
+            safety = create_backup(prune=False, label=SAFETY_LABEL)
+            if safety:
+                print(f"  live data: previous state saved as backup {safety}")
+        write_json(after)
+        print(f"  live data: rewrote {summary}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rewrite CodeNest Payroll data into the canonical schema")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    parser.add_argument("--skip-backups", action="store_true", help="leave existing backups alone")
+    parser.add_argument("--no-safety-backup", action="store_true",
+                        help="do not snapshot the live data before rewriting it")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    if not args.skip_backups:
+        # backups first, so the safety snapshot below keeps the pre-migration state
+        failed += migrate_backups(args.dry_run)
+    failed += migrate_live(args.dry_run, not args.no_safety_backup)
+
+    if failed:
+        print(f"{failed} item(s) could not be migrated; fix the records listed above and run again.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,28 +1,44 @@
 # routes/admin_routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file
+import os
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, Response, stream_with_context
 from utils.datastore import (
-    read_json,
-    write_json,
     create_backup,
+    restore_backup,
     load_employees,
+    get_employee,
+    load_payroll_records,
+    load_payroll_for_employee,
+    load_payroll_for_month,
+    payroll_summary,
+    payroll_history_page,
+    load_admins,
     save_employee,
+    update_employee,
     delete_employee,
-    export_payroll_csv,
+    pay_once,
+    iter_payroll_records,
+    iter_payroll_csv,
+    gzip_chunks,
     export_payroll_pdf,
-    get_admin_by_username
 )
+from utils.payroll_calc import compute_one
+from utils.exporters import get_exporter
+from utils.jobs import enqueue, job_status
+from utils import backups
+from utils.auth import has_permission, permission_required, protect_blueprint
+from utils.storage.schema import SchemaError
 from datetime import datetime, date
 
 admin_blueprint = Blueprint("admin", __name__, url_prefix="/admin")
+protect_blueprint(admin_blueprint)
 
 # ------------------------------------------------
 # EMPLOYEE PROFILE VIEW
 # ------------------------------------------------
 @admin_blueprint.route("/employee/<int:id>")
 def employee_profile(id):
-    data = read_json()
-    emp = next((e for e in data.get("employees", []) if int(e.get("id", 0)) == int(id)), None)
-    payroll = [p for p in data.get("payroll", []) if int(p.get("employee_id", 0)) == int(id)]
+    emp = get_employee(id)
+    payroll = load_payroll_for_employee(id)
 
     return render_template("employee_profile.html", emp=emp, payroll=payroll)
 
@@ -30,49 +46,67 @@ def employee_profile(id):
 # ------------------------------------------------
 # PAYROLL HISTORY PAGE
 # ------------------------------------------------
-@admin_blueprint.route("/payroll/history")
-def payroll_history():
-    if "admin" not in session:
-        flash("Please login first.", "warning")
-        return redirect(url_for("auth.login"))
-
-    data = read_json()
-    records = sorted(
-        data.get("payroll", []),
-        key=lambda r: r.get("date", ""),
-        reverse=True
-    )
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
 
-    return render_template("payroll_history.html", records=records)
 
+def _history_query():
+    """Read paging/filter arguments shared by the history page and API."""
+    try:
+        limit = int(request.args.get("limit", HISTORY_PAGE_SIZE))
+    except ValueError:
+        limit = HISTORY_PAGE_SIZE
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
 
-# ------------------------------------------------
-# ROLE CHECK HELPERS
-# ------------------------------------------------
-def require_role(required):
-    if "admin" not in session:
-        return False
+    employee_id = request.args.get("employee_id") or None
+    try:
+        employee_id = int(employee_id) if employee_id else None
+    except ValueError:
+        employee_id = None
+
+    return {
+        "limit": limit,
+        "cursor": request.args.get("cursor") or None,
+        "date_from": (request.args.get("date_from") or "").strip() or None,
+        "date_to": (request.args.get("date_to") or "").strip() or None,
+        "employee_id": employee_id,
+        "department": (request.args.get("department") or "").strip() or None,
+    }
 
-    admin = get_admin_by_username(session["admin"])
-    if not admin:
-        return False
 
-    role = admin.get("role", "admin")
+@admin_blueprint.route("/payroll/history")
+def payroll_history():
+    query = _history_query()
+    page = payroll_history_page(**query)
 
-    if role == "super_admin":
-        return True
+    # keep the filters on the "next page" link
+    filters = {k: v for k, v in query.items() if k != "cursor" and v is not None}
+    if filters.get("limit") == HISTORY_PAGE_SIZE:
+        filters.pop("limit")
 
-    if required == "admin" and role in ["admin", "super_admin"]:
-        return True
+    return render_template(
+        "payroll_history.html",
+        records=page["records"],
+        next_cursor=page["next_cursor"],
+        filters=filters,
+        employees=load_employees(),
+    )
 
-    if required == "viewer" and role in ["viewer", "admin", "super_admin"]:
-        return True
 
-    return False
+@admin_blueprint.route("/api/payroll/history")
+def payroll_history_api():
+    page = payroll_history_page(**_history_query())
+    return jsonify(page)
 
 
+# ------------------------------------------------
+# ROLE CHECK HELPERS
+# ------------------------------------------------
+# Every admin route needs a logged-in admin (checked once per request by the
+# blueprint guard); routes that need more use @permission_required. Roles
+# are resolved once per session and cached, see utils/auth.py.
 def block_if_no(permission):
-    if not require_role(permission):
+    if not has_permission(permission):
         flash("You do not have permission to perform this action.", "danger")
         return redirect(url_for("admin.dashboard"))
     return None
@@ -81,85 +115,47 @@ def block_if_no(permission):
 # ------------------------------------------------
 # DASHBOARD
 # ------------------------------------------------
-def _to_float(v):
-    try:
-        return float(v)
-    except Exception:
-        return 0.0
-
-
 @admin_blueprint.route("/dashboard")
 def dashboard():
-    if "admin" not in session:
-        flash("Please login first.", "warning")
-        return redirect(url_for("auth.login"))
-
-    data = read_json()
-    employees = data.get("employees", [])
-    payroll_records = data.get("payroll", [])
-    admins = data.get("admins", [])
+    employees = load_employees()
+    admins = load_admins()
 
     total_employees = len(employees)
-    total_payroll_records = len(payroll_records)
     num_admins = len(admins)
 
     avg_salary = 0.0
     if total_employees:
-        avg_salary = sum(_to_float(e.get("salary", 0)) for e in employees) / total_employees
-
-    total_gross = sum(_to_float(r.get("gross_pay", 0)) for r in payroll_records)
-    total_net = sum(_to_float(r.get("net_pay", 0)) for r in payroll_records)
-    total_tax = sum(_to_float(r.get("tax", 0)) for r in payroll_records)
+        # salaries are floats in the cache (see normalize_salaries in utils/storage/base.py)
+        avg_salary = sum(e["salary"] for e in employees) / total_employees
 
+    # last six months, oldest first
     now = date.today()
-    total_paid_this_month = 0.0
-
-    for r in payroll_records:
-        try:
-            rd = datetime.fromisoformat(r.get("date")).date()
-        except Exception:
-            try:
-                rd = datetime.strptime(r.get("date", ""), "%Y-%m-%d").date()
-            except Exception:
-                rd = None
-
-        if rd and rd.year == now.year and rd.month == now.month:
-            total_paid_this_month += _to_float(r.get("net_pay", 0))
-
-    COMPANY_BUDGET = 2_000_000.0
-    budget_remaining = max(0.0, COMPANY_BUDGET - total_net)
-
-    recent_records = sorted(payroll_records, key=lambda r: r.get("date", ""), reverse=True)[:10]
-
-    labels = []
-    chart_values = []
-
+    months = []
     for i in range(5, -1, -1):
         y = now.year
         m = now.month - i
         while m <= 0:
             m += 12
             y -= 1
-        labels.append(f"{y}-{m:02d}")
+        months.append((y, m))
 
-        total_m = 0.0
-        for r in payroll_records:
-            try:
-                rd = datetime.fromisoformat(r.get("date")).date()
-            except Exception:
-                continue
+    # totals come from the maintained aggregates, not a scan of history
+    summary = payroll_summary(months)
+    total_payroll_records = summary["count"]
+    total_gross = summary["totals"]["gross"]
+    total_net = summary["totals"]["net"]
+    total_tax = summary["totals"]["tax"]
+    total_paid_this_month = summary["months"][(now.year, now.month)]["net"]
 
-            if rd.year == y and rd.month == m:
-                total_m += _to_float(r.get("net_pay", 0))
+    COMPANY_BUDGET = 2_000_000.0
+    budget_remaining = max(0.0, COMPANY_BUDGET - total_net)
 
-        chart_values.append(round(total_m, 2))
+    recent_records = summary["recent"]
 
-    tally = {}
-    for r in payroll_records:
-        name = r.get("employee_name", "Unknown")
-        tally[name] = tally.get(name, 0) + 1
+    labels = [f"{y}-{m:02d}" for y, m in months]
+    chart_values = [round(summary["months"][k]["net"], 2) for k in months]
 
-    top_emps = sorted(tally.items(), key=lambda x: x[1], reverse=True)[:5]
+    top_emps = summary["top_employees"]
 
     return render_template(
         "dashboard.html",
@@ -185,10 +181,6 @@ def dashboard():
 # ------------------------------------------------
 @admin_blueprint.route("/employees", methods=["GET", "POST"])
 def employees():
-    if "admin" not in session:
-        flash("Please login first.", "warning")
-        return redirect(url_for("auth.login"))
-
     if request.method == "POST":
         deny = block_if_no("admin")
         if deny:
@@ -206,7 +198,11 @@ def employees():
         if not name:
             flash("Please enter employee name.", "warning")
         else:
-            save_employee({"name": name, "department": dept, "salary": salary})
+            try:
+                save_employee({"name": name, "department": dept, "salary": salary})
+            except SchemaError as e:
+                flash(f"Invalid employee: {e}", "danger")
+                return redirect(url_for("admin.employees"))
             flash("Employee added.", "success")
             return redirect(url_for("admin.employees"))
 
@@ -218,11 +214,8 @@ def employees():
 # DELETE EMPLOYEE
 # ------------------------------------------------
 @admin_blueprint.route("/employee/delete/<int:emp_id>")
+@permission_required("admin")
 def delete_emp(emp_id):
-    deny = block_if_no("admin")
-    if deny:
-        return deny
-
     delete_employee(emp_id)
     flash("Employee deleted.", "info")
     return redirect(url_for("admin.employees"))
@@ -233,8 +226,7 @@ def delete_emp(emp_id):
 # ------------------------------------------------
 @admin_blueprint.route("/employee/<int:id>/edit", methods=["GET", "POST"])
 def edit_employee(id):
-    data = read_json()
-    emp = next((e for e in data.get("employees", []) if int(e.get("id", 0)) == int(id)), None)
+    emp = get_employee(id)
 
     if not emp:
         flash("Employee not found.", "danger")
@@ -248,7 +240,11 @@ def edit_employee(id):
         except:
             pass
 
-        write_json(data)
+        try:
+            update_employee(emp)
+        except SchemaError as e:
+            flash(f"Invalid employee: {e}", "danger")
+            return redirect(url_for("admin.edit_employee", id=id))
         flash("Employee updated successfully!", "success")
         return redirect(url_for("admin.employee_profile", id=id))
 
@@ -259,11 +255,8 @@ def edit_employee(id):
 # REGISTER ADMIN (ONLY SUPER ADMIN)
 # ------------------------------------------------
 @admin_blueprint.route("/register-admin", methods=["GET", "POST"])
+@permission_required("super_admin")
 def register_admin():
-    deny = block_if_no("super_admin")
-    if deny:
-        return deny
-
     if request.method == "POST":
         username = (request.form.get("username") or "").strip()
         password = (request.form.get("password") or "").strip()
@@ -273,10 +266,14 @@ def register_admin():
             flash("Please fill all fields.", "warning")
         else:
             from utils.datastore import add_admin
-            if add_admin(username, password, role):
-                flash("New admin added.", "success")
-                return redirect(url_for("admin.dashboard"))
+            try:
+                added = add_admin(username, password, role)
+            except ValueError as e:
+                flash(f"Invalid admin: {e}", "danger")
             else:
+                if added:
+                    flash("New admin added.", "success")
+                    return redirect(url_for("admin.dashboard"))
                 flash("Username exists.", "danger")
 
     return render_template("register_admin.html")
@@ -286,11 +283,8 @@ def register_admin():
 # DELETE ADMIN (SUPER ADMIN ONLY)
 # ------------------------------------------------
 @admin_blueprint.route("/admin/delete/<username>")
+@permission_required("super_admin")
 def delete_admin_route(username):
-    deny = block_if_no("super_admin")
-    if deny:
-        return deny
-
     from utils.datastore import delete_admin
     if delete_admin(username):
         flash("Admin deleted successfully.", "info")
@@ -304,44 +298,50 @@ def delete_admin_route(username):
 # ------------------------------------------------
 @admin_blueprint.route("/payroll/process", methods=["GET", "POST"])
 def process_payroll():
-    if "admin" not in session:
-        flash("Please login first.", "warning")
-        return redirect(url_for("auth.login"))
-
-    data = read_json()
-    employees = data.get("employees", [])
+    employees = load_employees()
 
     if request.method == "POST":
-        emp_id = int(request.form.get("employee_id"))
-        days_worked = float(request.form.get("days_worked", 0))
+        try:
+            emp_id = int(request.form.get("employee_id"))
+            days_worked = float(request.form.get("days_worked", 0))
+        except (TypeError, ValueError):
+            flash("Please choose an employee and enter the days worked.", "warning")
+            return redirect(url_for("admin.process_payroll"))
 
-        emp = next((e for e in employees if int(e["id"]) == emp_id), None)
+        emp = get_employee(emp_id)
         if not emp:
             flash("Employee not found.", "danger")
             return redirect(url_for("admin.process_payroll"))
 
-        salary = float(emp.get("salary", 0))
+        salary = emp["salary"]
 
         # NEW RULE:
         # net pay = (salary / 30 * days worked) - 5% tax
-        daily_rate = salary / 30
-        gross_pay = daily_rate * days_worked
-        tax = gross_pay * 0.05
-        net_pay = gross_pay - tax
+        try:
+            pay = compute_one(days_worked, salary=salary)
+        except ValueError as e:
+            flash(f"Invalid days worked: {e}", "danger")
+            return redirect(url_for("admin.process_payroll"))
 
         new_record = {
             "employee_id": emp_id,
             "employee_name": emp.get("name"),
             "days_worked": days_worked,
-            "daily_rate": round(daily_rate, 2),
-            "gross_pay": round(gross_pay, 2),
-            "tax": round(tax, 2),
-            "net_pay": round(net_pay, 2),
+            "rate": pay["rate"],
+            "gross_pay": pay["gross_pay"],
+            "tax": pay["tax"],
+            "net_pay": pay["net_pay"],
             "date": datetime.now().strftime("%Y-%m-%d")
         }
 
-        data.setdefault("payroll", []).append(new_record)
-        write_json(data)
+        try:
+            paid = pay_once(emp_id, new_record)
+        except SchemaError as e:
+            flash(f"Invalid payroll record: {e}", "danger")
+            return redirect(url_for("admin.process_payroll"))
+        if not paid:
+            flash("This employee has already been paid this month.", "warning")
+            return redirect(url_for("admin.payroll_history"))
 
         flash("Payroll processed successfully!", "success")
         return redirect(url_for("admin.payroll_history"))
@@ -352,29 +352,36 @@ def process_payroll():
 # EXPORT CSV
 # ------------------------------------------------
 @admin_blueprint.route("/payroll/export/csv")
+@permission_required("admin")
 def payroll_export_csv():
-    deny = block_if_no("admin")
-    if deny:
-        return deny
-
-    data = read_json()
-    records = data.get("payroll", [])
-
-    csv_path = export_payroll_csv(records)
-    return send_file(csv_path, as_attachment=True)
+    # same filters as the history page; rows are streamed, nothing hits disk
+    filters = _history_query()
+    filters.pop("cursor")
+    filters.pop("limit")
+
+    chunks = iter_payroll_csv(iter_payroll_records(**filters))
+    filename = "payroll.csv"
+    mimetype = "text/csv"
+
+    if request.args.get("gzip") in ("1", "true", "yes"):
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
 
 # ------------------------------------------------
 # EXPORT PDF
 # ------------------------------------------------
 @admin_blueprint.route("/payroll/export/pdf")
+@permission_required("admin")
 def payroll_export_pdf():
-    deny = block_if_no("admin")
-    if deny:
-        return deny
-
-    data = read_json()
-    records = data.get("payroll", [])
+    records = load_payroll_records()
 
     if len(records) == 0:
         flash("No payroll records available for PDF export.", "warning")
@@ -383,3 +390,189 @@ def payroll_export_pdf():
     last_record = records[-1]
     pdf_path = export_payroll_pdf(last_record)
     return send_file(pdf_path, as_attachment=True)
+
+
+# ------------------------------------------------
+# BULK PAYSLIPS (one PDF per record, zipped)
+# ------------------------------------------------
+@admin_blueprint.route("/payroll/payslips")
+@permission_required("admin")
+def payroll_payslips_bulk():
+    # ?month=YYYY-MM, defaults to the current month
+    try:
+        period = datetime.strptime(request.args.get("month") or "", "%Y-%m")
+    except ValueError:
+        period = datetime.utcnow()
+
+    records = load_payroll_for_month(period.year, period.month)
+    if not records:
+        flash(f"No payroll records for {period:%Y-%m}.", "warning")
+        return redirect(url_for("admin.payroll_history"))
+
+    result = get_exporter("payslip_zip")(records, label=f"{period:%Y-%m}")
+    if result["failed"]:
+        flash(f"{len(result['failed'])} payslip(s) failed to render.", "danger")
+    if not result["zip"]:
+        return redirect(url_for("admin.payroll_history"))
+
+    return send_file(result["zip"], as_attachment=True)
+
+
+# ------------------------------------------------
+# BACKGROUND JOBS
+# ------------------------------------------------
+def _job_response(job_id):
+    return jsonify({
+        "job_id": job_id,
+        "status_url": url_for("admin.job_status_api", job_id=job_id),
+    }), 202
+
+
+@admin_blueprint.route("/payroll/export/csv/job", methods=["POST"])
+@permission_required("admin")
+def payroll_export_csv_job():
+    filters = _history_query()
+    filters.pop("cursor")
+    filters.pop("limit")
+
+    job_id = enqueue("export_csv", {
+        "filters": filters,
+        "gzip": request.args.get("gzip") in ("1", "true", "yes"),
+    })
+    return _job_response(job_id)
+
+
+@admin_blueprint.route("/payroll/payslips/job", methods=["POST"])
+@permission_required("admin")
+def payroll_payslips_job():
+    try:
+        period = datetime.strptime(request.args.get("month") or "", "%Y-%m")
+    except ValueError:
+        period = datetime.utcnow()
+
+    job_id = enqueue("payslip_bundle", {"year": period.year, "month": period.month})
+    return _job_response(job_id)
+
+
+@admin_blueprint.route("/jobs/<job_id>")
+def job_status_api(job_id):
+    job = job_status(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    result = job.get("result") or {}
+    return jsonify({
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job.get("error"),
+        "result": result,
+        "download_url": (
+            url_for("admin.job_download", job_id=job["id"])
+            if job["status"] == "done" and result.get("path") else None
+        ),
+    })
+
+
+@admin_blueprint.route("/jobs/<job_id>/download")
+@permission_required("admin")
+def job_download(job_id):
+    job = job_status(job_id)
+    path = ((job or {}).get("result") or {}).get("path")
+    if not job or job["status"] != "done" or not path or not os.path.isfile(path):
+        flash("That file is not available.", "warning")
+        return redirect(url_for("admin.payroll_history"))
+
+    # only hand out files the jobs themselves wrote under exports/
+    exports = os.path.abspath("exports") + os.sep
+    if not os.path.abspath(path).startswith(exports):
+        flash("That file is not available.", "warning")
+        return redirect(url_for("admin.payroll_history"))
+
+    return send_file(os.path.abspath(path), as_attachment=True)
+
+
+# ------------------------------------------------
+# BACKUPS (SUPER ADMIN ONLY)
+# ------------------------------------------------
+@admin_blueprint.route("/backups")
+@permission_required("super_admin")
+def backups_page():
+    diff = None
+    diff_ids = None
+    old_id, new_id = request.args.get("old"), request.args.get("new")
+    if old_id and new_id:
+        try:
+            diff = backups.diff_snapshots(old_id, new_id)
+            diff_ids = (old_id, new_id)
+        except (OSError, ValueError) as e:
+            flash(f"Could not compare backups: {e}", "danger")
+
+    return render_template("backups.html", backups=backups.index_backups(),
+                           diff=diff, diff_ids=diff_ids)
+
+
+@admin_blueprint.route("/api/backups")
+@permission_required("super_admin")
+def backups_api():
+    return jsonify(backups.index_backups())
+
+
+@admin_blueprint.route("/backups/create", methods=["POST"])
+@permission_required("super_admin")
+def backups_create():
+    snapshot_id = create_backup()
+    if snapshot_id:
+        flash(f"Backup {snapshot_id} created.", "success")
+    else:
+        flash("Nothing to back up.", "info")
+    return redirect(url_for("admin.backups_page"))
+
+
+@admin_blueprint.route("/backups/<backup_id>/verify", methods=["POST"])
+@permission_required("super_admin")
+def backups_verify(backup_id):
+    try:
+        report = backups.verify_snapshot(backup_id)
+    except FileNotFoundError:
+        flash("Backup not found.", "warning")
+        return redirect(url_for("admin.backups_page"))
+
+    if report["ok"]:
+        flash(f"Backup {backup_id} verified OK.", "success")
+    else:
+        flash(f"Backup {backup_id} is damaged: " + "; ".join(report["errors"][:5]), "danger")
+    return redirect(url_for("admin.backups_page"))
+
+
+@admin_blueprint.route("/backups/<backup_id>/restore", methods=["POST"])
+@permission_required("super_admin")
+def backups_restore(backup_id):
+    try:
+        safety = restore_backup(backup_id)
+    except FileNotFoundError:
+        flash("Backup not found.", "warning")
+    except ValueError as e:
+        flash(str(e), "danger")
+    else:
+        msg = f"Backup {backup_id} restored."
+        if safety:
+            msg += f" The previous state was saved as {safety}."
+        flash(msg, "success")
+    return redirect(url_for("admin.backups_page"))
+
+
+@admin_blueprint.route("/backups/<backup_id>/download")
+@permission_required("super_admin")
+def backups_download(backup_id):
+    if backups.find_snapshot(backup_id) is None:
+        flash("Backup not found.", "warning")
+        return redirect(url_for("admin.backups_page"))
+
+    # streamed chunk by chunk; the snapshot is never assembled in memory
+    return Response(
+        stream_with_context(backups.iter_snapshot_json(backup_id)),
+        mimetype="application/json",
+        headers={"Content-Disposition": f"attachment; filename=backup_{backup_id}.json"},
+    )
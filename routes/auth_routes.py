@@ -1,6 +1,8 @@
-print("Loaded AUTH ROUTES from:", __file__)
+# routes/auth_routes.py
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from utils.datastore import read_json, add_admin, verify_admin, get_admin_by_username
+from utils.datastore import load_admins, add_admin, verify_admin, get_admin_by_username
+from utils.auth import login_session
+from utils.credentials import login_retry_after, record_login_failure, record_login_success
 from datetime import timedelta
 
 auth_blueprint = Blueprint("auth", __name__, url_prefix="/auth")
@@ -10,12 +12,12 @@ SESSION_TIMEOUT_MINUTES = 45
 
 @auth_blueprint.route("/login", methods=["GET", "POST"])
 def login():
-    data = read_json()  # Load admins from data/admins.json
+    admins = load_admins()  # Load admins from data/admins.json
 
     # -------------------------
     # FIRST-TIME SETUP (no admin saved)
     # -------------------------
-    if len(data.get("admins", [])) == 0:
+    if len(admins) == 0:
         flash("No admin found. Create your admin account now.", "info")
 
         if request.method == "POST":
@@ -27,8 +29,7 @@ def login():
             else:
                 # First admin = SUPER ADMIN
                 add_admin(username, password, role="super_admin")
-                session["admin"] = username
-                session["role"] = "super_admin"
+                login_session(username, "super_admin")
                 flash("Super Admin account created successfully!", "success")
                 return redirect(url_for("admin.dashboard"))
 
@@ -41,19 +42,28 @@ def login():
     if request.method == "POST":
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "").strip()
+        client = request.remote_addr or "unknown"
+
+        # throttled attempts are refused before any password hashing
+        wait = login_retry_after(username, client)
+        if wait:
+            flash(f"Too many failed logins. Try again in {wait} seconds.", "danger")
+            return render_template("login.html", setup_mode=False), 429
 
         if verify_admin(username, password):
+            record_login_success(username, client)
+
             # Load role
             admin = get_admin_by_username(username)
             role = admin.get("role", "admin")
 
-            session["admin"] = username
-            session["role"] = role
+            login_session(username, role)
 
             flash(f"Welcome back, {username}!", "success")
             return redirect(url_for("admin.dashboard"))
 
         else:
+            record_login_failure(username, client)
             flash("Invalid username or password.", "danger")
 
     return render_template("login.html", setup_mode=False)
@@ -1,24 +1,25 @@
 # routes/payroll_routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from utils.datastore import (
     load_employees,
-    save_payroll_record,
+    get_employee,
+    pay_once,
     load_payroll_records,
-    create_backup,
-    export_payroll_pdf,
     has_been_paid_this_month
 )
+from utils.batch import parse_batch_rows, run_payroll_batch
+from utils.jobs import enqueue
+from utils.auth import permission_required, protect_blueprint
+from utils.payroll_calc import compute_one
+from utils.storage.schema import SchemaError
 from datetime import datetime
 
 payroll_blueprint = Blueprint("payroll", __name__, url_prefix="/payroll")
+protect_blueprint(payroll_blueprint)
 
 
 @payroll_blueprint.route("/process", methods=["GET", "POST"])
 def process_payroll():
-    if "admin" not in session:
-        flash("Please login first.", "warning")
-        return redirect(url_for("auth.login"))
-
     employees = load_employees()
 
     if request.method == "POST":
@@ -35,7 +36,7 @@ def process_payroll():
         except:
             rate = 0.0
 
-        emp = next((e for e in employees if int(e.get("id", 0)) == emp_id), None)
+        emp = get_employee(emp_id)
         if not emp:
             flash("Employee not found.", "danger")
             return redirect(url_for("payroll.process_payroll"))
@@ -48,31 +49,81 @@ def process_payroll():
         # Liberia uses UTC (Africa/Monrovia is UTC+0). Use UTC to avoid pytz dependency.
         today_date = datetime.utcnow().date().isoformat()
 
-        gross = rate * days_worked
-        tax = gross * 0.05
-        net = gross - tax
+        try:
+            pay = compute_one(days_worked, rate=rate)
+        except ValueError as e:
+            flash(f"Invalid days worked or rate: {e}", "danger")
+            return redirect(url_for("payroll.process_payroll"))
 
         record = {
             "employee_id": emp_id,
             "employee_name": emp.get("name"),
             "days_worked": days_worked,
             "rate": rate,
-            "gross_pay": round(gross, 2),
-            "tax": round(tax, 2),
-            "net_pay": round(net, 2),
+            "gross_pay": pay["gross_pay"],
+            "tax": pay["tax"],
+            "net_pay": pay["net_pay"],
             "date": today_date
         }
 
-        save_payroll_record(record)
-
-        # Generate payslip PDF
         try:
-            export_payroll_pdf(record)
-            flash("Payslip generated successfully!", "success")
-        except Exception as e:
-            flash(f"PDF generation error: {e}", "danger")
+            paid = pay_once(emp_id, record)
+        except SchemaError as e:
+            flash(f"Invalid payroll record: {e}", "danger")
+            return redirect(url_for("payroll.process_payroll"))
+        if not paid:
+            # another request paid them since the check above
+            flash("This employee has already been paid this month.", "warning")
+            return redirect(url_for("admin.payroll_history"))
+
+        # payslip PDF and backup run in the background job worker
+        enqueue("payslip", {"record": record})
+        enqueue("backup", unique=True)
+        flash("Payroll saved. The payslip is being generated.", "success")
 
-        create_backup()
         return redirect(url_for("admin.payroll_history"))
 
     return render_template("process_payroll.html", employees=employees)
+
+
+# ------------------------------------------------
+# BATCH PAYROLL RUN (all employees in one pass)
+# ------------------------------------------------
+@payroll_blueprint.route("/batch", methods=["GET", "POST"])
+@permission_required("admin")
+def process_batch():
+    if request.method == "POST":
+        if request.is_json:
+            body = request.get_json(silent=True)
+            rows = body.get("rows", []) if isinstance(body, dict) else None
+            if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+                return jsonify({"error": "Expected {\"rows\": [{...}, ...]}"}), 400
+        else:
+            upload = request.files.get("csv_file")
+            text = upload.read().decode("utf-8-sig") if upload and upload.filename else ""
+            text = text or request.form.get("rows", "")
+            rows = parse_batch_rows(text)
+
+            # nothing listed: pay every employee for the default number of days
+            if not rows and request.form.get("default_days"):
+                rows = [
+                    {"employee_id": e.get("id"), "days_worked": request.form.get("default_days")}
+                    for e in load_employees()
+                ]
+
+        result = run_payroll_batch(rows)
+
+        if request.is_json:
+            return jsonify({
+                "processed": len(result["processed"]),
+                "skipped": [{"employee_id": e, "reason": r} for e, r in result["skipped"]],
+                "records": result["processed"],
+            })
+
+        flash(f"Batch payroll processed {len(result['processed'])} employee(s).", "success")
+        if result["skipped"]:
+            flash(f"Skipped {len(result['skipped'])} row(s): " + "; ".join(
+                f"{e} ({r})" for e, r in result["skipped"][:10]), "warning")
+        return redirect(url_for("admin.payroll_history"))
+
+    return render_template("process_batch.html", employees=load_employees())
@@ -0,0 +1,56 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.storage.json_store import JsonStore
+from utils.storage.sqlite_store import SqliteStore
+
+# Every test runs in its own temporary directory: the datastore, backups
+# and job queue all use paths relative to the working directory
+# (data/, backups/, data/jobs/, exports/).
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PAYROLL_WARM_UP", "0")
+
+    from utils import datastore
+    monkeypatch.setattr(datastore, "_store", None)
+    yield tmp_path
+    if datastore._store is not None:
+        datastore._store.close()
+
+
+def make_json_store(compact_bytes=1024 * 1024):
+    return JsonStore("data/admins.json", "data/admins.journal",
+                     compact_bytes=compact_bytes, segments_dir="data/payroll")
+
+
+def make_sqlite_store():
+    return SqliteStore("data/payroll.db")
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request):
+    s = make_json_store() if request.param == "json" else make_sqlite_store()
+    yield s
+    s.close()
+
+
+def employee(emp_id, salary=300.0, name=None, department="Ops"):
+    return {"name": name or f"Emp {emp_id}", "department": department,
+            "salary": salary, "id": emp_id}
+
+
+def payroll(rec_id, emp_id, when="2026-10-05", days=20, rate=10.0):
+    gross = round(days * rate, 2)
+    tax = round(gross * 0.05, 2)
+    return {"employee_id": emp_id, "employee_name": f"Emp {emp_id}", "days_worked": days,
+            "rate": rate, "gross_pay": gross, "tax": tax, "net_pay": round(gross - tax, 2),
+            "date": when, "id": rec_id}
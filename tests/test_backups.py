@@ -0,0 +1,97 @@
+# tests/test_backups.py
+import os
+
+import pytest
+
+from conftest import employee, payroll
+from utils import backups, datastore
+
+
+@pytest.fixture(autouse=True)
+def fresh_memo(monkeypatch):
+    monkeypatch.setattr(backups, "_memo", {})
+
+
+def _seed():
+    store = datastore.get_store()
+    store.commit_many([{"op": "insert", "table": "employees", "row": employee(i)} for i in (1, 2)])
+    store.commit_many([
+        {"op": "insert", "table": "payroll", "row": payroll(1, 1, "2026-09-30")},
+        {"op": "insert", "table": "payroll", "row": payroll(2, 2, "2026-10-01")},
+    ])
+    return store
+
+
+def test_empty_store_takes_no_snapshot():
+    assert datastore.create_backup() is False
+
+
+def test_snapshot_round_trip_and_verify():
+    _seed()
+    snapshot_id = datastore.create_backup()
+    report = backups.verify_snapshot(snapshot_id)
+    assert report["ok"], report["errors"]
+    assert report["counts"] == {"admins": 0, "employees": 2, "payroll": 2}
+
+    data = backups.load_snapshot(snapshot_id)
+    assert [e["id"] for e in data["employees"]] == [1, 2]
+    assert sorted(r["id"] for r in data["payroll"]) == [1, 2]
+
+
+def test_unchanged_chunks_are_not_written_again():
+    store = _seed()
+    first = backups.create_snapshot(store)
+    store.commit({"op": "insert", "table": "payroll", "row": payroll(3, 1, "2026-10-02")})
+    second = backups.create_snapshot(store)
+
+    assert first["new_chunks"] > 0
+    assert second["new_chunks"] == 1   # only October's payroll chunk changed
+    assert second["tables"]["employees"] == first["tables"]["employees"]
+
+
+def test_verify_reports_a_corrupt_chunk():
+    _seed()
+    snapshot_id = datastore.create_backup()
+    digest = backups.read_manifest(backups.find_snapshot(snapshot_id))["tables"]["employees"][0]
+    with open(backups.chunk_path(digest), "wb") as f:
+        f.write(b"garbage")
+
+    report = backups.verify_snapshot(snapshot_id)
+    assert not report["ok"]
+    assert any("employees" in e for e in report["errors"])
+    with pytest.raises(ValueError):
+        datastore.restore_backup(snapshot_id)
+
+
+def test_restore_brings_back_the_snapshot():
+    store = _seed()
+    snapshot_id = datastore.create_backup()
+    store.commit({"op": "delete", "table": "employees", "key": 2})
+    store.commit({"op": "insert", "table": "payroll", "row": payroll(3, 1, "2026-10-03")})
+
+    safety = datastore.restore_backup(snapshot_id)
+    assert safety and safety != snapshot_id
+    assert [e["id"] for e in datastore.load_employees()] == [1, 2]
+    assert sorted(r["id"] for r in datastore.load_payroll_records()) == [1, 2]
+    # the state before the restore is in the safety snapshot
+    assert len(backups.load_snapshot(safety)["payroll"]) == 3
+
+
+def test_prune_keeps_labelled_snapshots_and_sweeps_chunks():
+    store = _seed()
+    labelled = backups.create_snapshot(store, label="pre-migration")["id"]
+    for i in range(3, 6):
+        store.commit({"op": "insert", "table": "payroll", "row": payroll(i, 1, f"2026-0{i}-01")})
+        backups.create_snapshot(store)
+
+    removed, _ = backups.prune(keep_last=1, keep_daily=0)
+    remaining = [b["id"] for b in backups.list_snapshots()]
+    assert removed == 2
+    assert labelled in remaining and len(remaining) == 2
+    for snapshot_id in remaining:
+        assert backups.verify_snapshot(snapshot_id)["ok"]
+
+    live = {d for b in backups.list_snapshots()
+            for digests in backups.read_manifest(b)["tables"].values() for d in digests}
+    on_disk = {name[:-2] for _, _, names in os.walk(backups.CHUNK_DIR) for name in names}
+    assert on_disk == live
@@ -0,0 +1,124 @@
+# tests/test_jobs.py
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from utils import jobs
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    """Register a job kind whose behaviour the test sets; returns its call log."""
+    calls = []
+
+    def register(fn):
+        def run(args, job):
+            calls.append(job["attempts"])
+            return fn(args, job)
+        monkeypatch.setitem(jobs.HANDLERS, "test", run)
+        return calls
+    return register
+
+
+def _state(job_id):
+    return jobs.job_status(job_id)["status"]
+
+
+def test_success_lands_in_done(handler):
+    handler(lambda args, job: {"echo": args["x"]})
+    job_id = jobs.enqueue("test", {"x": 1})
+    assert jobs.run_pending() == 1
+    job = jobs.job_status(job_id)
+    assert job["status"] == "done" and job["result"] == {"echo": 1}
+    assert jobs._list("running") == []
+
+
+def test_unique_reuses_a_queued_job():
+    first = jobs.enqueue("backup", unique=True)
+    assert jobs.enqueue("backup", unique=True) == first
+    assert jobs.enqueue("backup") != first
+
+
+def test_failure_retries_with_backoff_then_fails(handler):
+    def boom(args, job):
+        raise RuntimeError("nope")
+    calls = handler(boom)
+    job_id = jobs.enqueue("test", max_attempts=2)
+
+    jobs.run_pending()
+    job = jobs.job_status(job_id)
+    assert job["status"] == "queued"
+    assert job["not_before"] > time.time()   # backing off
+    assert jobs.run_pending() == 0            # not due yet
+
+    job["not_before"] = 0
+    jobs._write("queued", job)
+    jobs.run_pending()
+    job = jobs.job_status(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "RuntimeError: nope"
+    assert calls == [1, 2]
+
+
+def test_unknown_kind_fails_without_retry():
+    job_id = jobs.enqueue("no-such-kind")
+    jobs.run_pending()
+    assert _state(job_id) == "failed"
+
+
+def test_stale_running_job_is_requeued():
+    job_id = jobs.enqueue("test")
+    job = jobs._claim()
+    assert job["id"] == job_id and _state(job_id) == "running"
+
+    jobs.recover_stale(lease=3600)
+    assert _state(job_id) == "running"
+    job["updated"] = time.time() - 7200
+    with open(jobs._path("running", job_id), "w") as f:
+        json.dump(job, f)
+    jobs.recover_stale(lease=3600)
+    assert _state(job_id) == "queued"
+
+
+def test_heartbeat_keeps_a_long_job_leased(handler, monkeypatch):
+    monkeypatch.setattr(jobs, "HEARTBEAT_INTERVAL", 0.05)
+    release = threading.Event()
+    calls = handler(lambda args, job: release.wait(5) and "ok")
+
+    job_id = jobs.enqueue("test")
+    job = jobs._claim()
+    worker = threading.Thread(target=jobs.run_job, args=(job,))
+    worker.start()
+    try:
+        for _ in range(6):
+            time.sleep(0.1)
+            jobs.recover_stale(lease=0.3)
+            assert _state(job_id) == "running"
+    finally:
+        release.set()
+        worker.join()
+
+    assert _state(job_id) == "done"
+    assert calls == [1]
+    assert jobs._list("running") == []
+
+
+def test_pruning_removes_job_output_under_exports_only(handler):
+    os.makedirs("exports/jobs")
+    inside, outside = "exports/jobs/out.csv", "keep.txt"
+    for path in (inside, outside):
+        open(path, "w").close()
+
+    handler(lambda args, job: {"path": args["path"]})
+    ids = [jobs.enqueue("test", {"path": inside}), jobs.enqueue("test", {"path": outside})]
+    jobs.run_pending()
+
+    jobs.recover_stale(keep_finished=3600)
+    assert os.path.exists(inside)
+    jobs.recover_stale(keep_finished=-1)
+    assert not os.path.exists(inside)
+    assert os.path.exists(outside)
+    assert all(jobs.job_status(i) is None for i in ids)
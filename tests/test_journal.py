@@ -0,0 +1,97 @@
+# tests/test_journal.py
+import os
+
+from conftest import employee, make_json_store, payroll
+from utils.storage import journal
+
+
+def _doc():
+    return {"admins": [], "employees": [employee(1), employee(2)], "payroll": []}
+
+
+def test_apply_insert_update_delete():
+    data = _doc()
+    positions = journal.RowPositions(data)
+
+    assert journal.apply(data, {"op": "insert", "table": "employees", "row": employee(3)}, positions) == []
+    old = journal.apply(data, {"op": "update", "table": "employees",
+                               "row": employee(2, salary=999.0)}, positions)
+    assert old == [employee(2)]
+    assert data["employees"][1]["salary"] == 999.0
+
+    removed = journal.apply(data, {"op": "delete", "table": "employees", "key": 1}, positions)
+    assert removed == [employee(1)]
+    assert [e["id"] for e in data["employees"]] == [2, 3]
+    # positions follow the delete
+    assert ("employees", 3) in positions and ("employees", 1) not in positions
+
+
+def test_apply_misses_return_none():
+    data = _doc()
+    positions = journal.RowPositions(data)
+    assert journal.apply(data, {"op": "update", "table": "employees", "row": employee(9)}, positions) is None
+    assert journal.apply(data, {"op": "delete", "table": "employees", "key": 9}, positions) is None
+    assert len(data["employees"]) == 2
+
+
+def test_replay_treats_inserts_as_upserts():
+    data = _doc()
+    ops = [
+        {"op": "insert", "table": "employees", "row": employee(2, salary=50.0)},
+        {"op": "insert", "table": "employees", "row": employee(3)},
+        {"op": "delete", "table": "employees", "key": "1"},
+    ]
+    journal.replay(data, ops)
+    assert [(e["id"], e["salary"]) for e in data["employees"]] == [(2, 50.0), (3, 300.0)]
+
+
+def test_string_and_int_keys_match():
+    data = {"employees": [employee(7)]}
+    positions = journal.RowPositions(data)
+    assert ("employees", "7") in positions
+    assert journal.apply(data, {"op": "delete", "table": "employees", "key": "7"}, positions)
+    assert data["employees"] == []
+
+
+def test_append_and_read_back_skip_a_torn_tail():
+    os.makedirs("data")
+    path = "data/test.journal"
+    ops = [{"op": "insert", "table": "employees", "row": employee(i)} for i in (1, 2)]
+    end = journal.append(path, ops)
+    with open(path, "ab") as f:
+        f.write(b'{"op": "insert", "tab')   # a writer died mid-line
+
+    read, offset = journal.read_from(path)
+    assert read == ops
+    assert offset == end
+
+
+def test_json_store_compaction_folds_the_journal():
+    store = make_json_store()
+    store.commit_many([{"op": "insert", "table": "employees", "row": employee(i)} for i in (1, 2, 3)])
+    store.commit_many([{"op": "insert", "table": "payroll", "row": payroll(i, i)} for i in (1, 2)])
+    store.commit({"op": "delete", "table": "employees", "key": 3})
+    before = store.document()
+    assert os.path.getsize("data/admins.journal") > 0
+
+    assert store.compact()
+    assert not os.path.exists("data/admins.journal") or os.path.getsize("data/admins.journal") == 0
+
+    fresh = make_json_store()
+    doc = fresh.document()
+    assert [e["id"] for e in doc["employees"]] == [e["id"] for e in before["employees"]] == [1, 2]
+    assert sorted(r["id"] for r in doc["payroll"]) == [1, 2]
+
+
+def test_json_store_catches_up_with_another_writer():
+    reader = make_json_store()
+    writer = make_json_store()
+    writer.commit({"op": "insert", "table": "employees", "row": employee(1)})
+    assert [e["id"] for e in reader.document()["employees"]] == [1]
+    generation = reader.generation
+
+    writer.commit({"op": "insert", "table": "employees", "row": employee(2)})
+    writer.commit({"op": "update", "table": "employees", "row": employee(1, salary=10.0)})
+    doc = reader.document()
+    assert reader.generation == generation + 1   # caught up, no reload
+    assert [(e["id"], e["salary"]) for e in doc["employees"]] == [(1, 10.0), (2, 300.0)]
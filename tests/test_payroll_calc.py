@@ -0,0 +1,83 @@
+# tests/test_payroll_calc.py
+import pytest
+
+from utils import payroll_calc
+from utils.payroll_calc import compute_one, compute_payroll
+
+
+def test_salary_based_pay():
+    assert compute_one(20, salary=300) == {"rate": 10.0, "gross_pay": 200.0, "tax": 10.0, "net_pay": 190.0}
+
+
+def test_explicit_rate_wins_over_salary():
+    assert compute_one(10, rate=12.5, salary=9000)["gross_pay"] == 125.0
+
+
+def test_gross_is_tax_plus_net_to_the_cent():
+    for days in (1, 7.5, 13, 22.25, 31):
+        for salary in (199.99, 333.33, 1234.56):
+            pay = compute_one(days, salary=salary)
+            assert round(pay["tax"] + pay["net_pay"], 2) == pay["gross_pay"]
+
+
+def test_half_up_rounding():
+    # 0.5 cents of tax rounds up, not to even
+    assert compute_one(1, rate=0.1)["tax"] == 0.01
+    assert compute_one(1, salary=1)["rate"] == 0.03
+
+
+def test_zero_days_and_missing_salary():
+    assert compute_one(0, salary=300)["net_pay"] == 0.0
+    assert compute_one(5)["gross_pay"] == 0.0
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"days_worked": float("nan"), "salary": 300},
+    {"days_worked": float("inf"), "salary": 300},
+    {"days_worked": "inf", "salary": 300},
+    {"days_worked": -1, "salary": 300},
+    {"days_worked": 5, "rate": float("inf")},
+    {"days_worked": 5, "rate": "nan"},
+    {"days_worked": 5, "rate": -2},
+    {"days_worked": 5, "salary": float("inf")},
+    {"days_worked": 5, "salary": -300},
+])
+def test_compute_one_rejects_non_finite_and_negative(kwargs):
+    with pytest.raises(ValueError):
+        compute_one(**kwargs)
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_columnar_matches_compute_one(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(payroll_calc, "_np", False)
+
+    days = [20, 7.5, 0, 31, 13]
+    rates = [None, 12.5, None, float("nan"), 0.1]
+    salaries = [300, 0, 500, 1234.56, 0]
+    cols = compute_payroll(days, rates, salaries)
+
+    for i, (d, r, s) in enumerate(zip(days, rates, salaries)):
+        one = compute_one(d, rate=None if r != r else r, salary=s)
+        for field in ("rate", "gross_pay", "tax", "net_pay"):
+            assert float(cols[field][i]) == one[field]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+@pytest.mark.parametrize("days, rates, salaries", [
+    ([float("nan")], [None], [300]),
+    ([float("inf")], [None], [300]),
+    ([-1], [None], [300]),
+    ([5], [float("inf")], [0]),
+    ([5], [-1.0], [0]),
+    ([5], [None], [float("inf")]),
+])
+def test_columnar_rejects_bad_input(monkeypatch, use_numpy, days, rates, salaries):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(payroll_calc, "_np", False)
+    with pytest.raises(ValueError):
+        compute_payroll(days, rates, salaries)
@@ -0,0 +1,107 @@
+# tests/test_routes.py
+import threading
+from datetime import datetime
+
+import pytest
+
+from config import Config
+from conftest import employee
+from utils import datastore
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(Config, "WARM_UP", False)
+    monkeypatch.setattr(Config, "JOB_WORKERS", 0)
+    from app import create_app
+    app = create_app(Config)
+    app.config["TESTING"] = True
+
+    datastore.add_admin("boss", "boss-password", "super_admin")
+    datastore.add_admin("viewer", "viewer-password", "viewer")
+    datastore.get_store().commit_many(
+        [{"op": "insert", "table": "employees", "row": employee(i)} for i in (1, 2)])
+    return app
+
+
+def login(app, username):
+    client = app.test_client()
+    r = client.post("/auth/login", data={"username": username, "password": f"{username}-password"})
+    assert r.status_code == 302
+    return client
+
+
+def _flashes(client):
+    with client.session_transaction() as s:
+        return [message for _, message in s.get("_flashes", [])]
+
+
+def _paid(emp_id):
+    return list(datastore.load_payroll_for_employee(emp_id))
+
+
+def test_pay_once_refuses_a_second_payment():
+    datastore.get_store().commit({"op": "insert", "table": "employees", "row": employee(1)})
+    record = {"employee_id": 1, "employee_name": "Emp 1", "days_worked": 20, "rate": 10.0,
+              "gross_pay": 200.0, "tax": 10.0, "net_pay": 190.0,
+              "date": datetime.utcnow().date().isoformat()}
+
+    assert datastore.pay_once(1, dict(record))
+    assert not datastore.pay_once(1, dict(record))
+    assert len(_paid(1)) == 1
+
+
+def test_concurrent_posts_pay_once(app):
+    clients = [login(app, "boss") for _ in range(6)]
+    barrier = threading.Barrier(len(clients))
+
+    def post(i, client):
+        barrier.wait()
+        if i % 2:
+            client.post("/admin/payroll/process", data={"employee_id": "1", "days_worked": "20"})
+        else:
+            client.post("/payroll/process", data={"employee": "1", "days_worked": "20", "rate": "10"})
+
+    threads = [threading.Thread(target=post, args=(i, c)) for i, c in enumerate(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(_paid(1)) == 1
+
+
+@pytest.mark.parametrize("path, form", [
+    ("/admin/payroll/process", {"employee_id": "1", "days_worked": "nan"}),
+    ("/admin/payroll/process", {"employee_id": "1", "days_worked": "inf"}),
+    ("/admin/payroll/process", {"employee_id": "1", "days_worked": "-3"}),
+    ("/payroll/process", {"employee": "1", "days_worked": "20", "rate": "inf"}),
+    ("/payroll/process", {"employee": "1", "days_worked": "20", "rate": "nan"}),
+])
+def test_non_finite_input_is_flashed_not_a_500(app, path, form):
+    client = login(app, "boss")
+    r = client.post(path, data=form)
+    assert r.status_code == 302
+    assert any(m.startswith("Invalid") for m in _flashes(client))
+    assert _paid(1) == []
+
+
+def test_batch_requires_admin_and_a_rows_list(app):
+    viewer = login(app, "viewer")
+    assert viewer.post("/payroll/batch", json={"rows": []}).status_code == 403
+
+    boss = login(app, "boss")
+    assert boss.post("/payroll/batch", json=[1, 2]).status_code == 400
+    r = boss.post("/payroll/batch", json={"rows": [
+        {"employee_id": 1, "days_worked": 20},
+        {"employee_id": 2, "days_worked": "nan"},
+        {"employee_id": 1, "days_worked": 5},
+    ]})
+    body = r.get_json()
+    assert body["processed"] == 1
+    assert {s["employee_id"] for s in body["skipped"]} == {"1", "2"}
+
+
+def test_metrics_need_super_admin(app):
+    assert app.test_client().get("/metrics").status_code == 403
+    assert login(app, "viewer").get("/metrics").status_code == 403
+    assert login(app, "boss").get("/metrics").status_code == 200
@@ -0,0 +1,102 @@
+# tests/test_schema.py
+import pytest
+
+from conftest import payroll
+from utils.storage.schema import (
+    SchemaError,
+    clean_amount,
+    clean_date,
+    clean_days,
+    clean_id,
+    normalize_document,
+    normalize_employee,
+    normalize_op,
+    normalize_payroll,
+)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("$1,200", 1200.0), ("500 USD", 500.0), ("L$500", 500.0), (12.345, 12.35), (7, 7),
+])
+def test_clean_amount_accepts_legacy_formats(value, expected):
+    assert clean_amount(value) == expected
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", float("nan"), "abc", True])
+def test_clean_amount_rejects(value):
+    with pytest.raises(SchemaError):
+        clean_amount(value, "gross_pay")
+
+
+def test_clean_amount_default_only_for_missing():
+    assert clean_amount("", default=0.0) == 0.0
+    with pytest.raises(SchemaError):
+        clean_amount(None)
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", -1, "x"])
+def test_clean_days_rejects(value):
+    with pytest.raises(SchemaError):
+        clean_days(value)
+
+
+def test_clean_days_keeps_whole_days_as_int():
+    assert clean_days("20") == 20 and type(clean_days("20")) is int
+    assert clean_days(7.5) == 7.5
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2026-10-05", "2026-10-05"), ("2026-10-05T13:45:00Z", "2026-10-05"),
+])
+def test_clean_date(value, expected):
+    assert clean_date(value) == expected
+
+
+def test_clean_date_and_id_reject_garbage():
+    with pytest.raises(SchemaError):
+        clean_date("yesterday")
+    with pytest.raises(SchemaError):
+        clean_id("1.5")
+    assert clean_id("12") == 12
+
+
+def test_normalize_payroll_fills_rate_and_keeps_extras():
+    row = dict(payroll(1, "4", days=10), days_worked="10")
+    row.pop("rate")
+    row["note"] = "bonus"
+    out = normalize_payroll(row)
+    assert out["employee_id"] == 4
+    assert out["rate"] == 10.0          # gross / days
+    assert out["days_worked"] == 10
+    assert out["note"] == "bonus"
+
+
+def test_normalize_payroll_reads_legacy_daily_rate():
+    row = payroll(1, 4)
+    row.pop("rate")
+    row["daily_rate"] = "12.5"
+    assert normalize_payroll(row)["rate"] == 12.5
+
+
+def test_normalize_employee_defaults_salary():
+    assert normalize_employee({"name": " Ann ", "id": "3"}) == {
+        "name": "Ann", "department": "", "salary": 0.0, "id": 3}
+
+
+def test_normalize_op_canonicalizes_keys():
+    assert normalize_op({"op": "delete", "table": "payroll", "key": "7"})["key"] == 7
+    assert normalize_op({"op": "delete", "table": "admins", "key": " bob "})["key"] == "bob"
+
+
+def test_normalize_document_reports_every_bad_row():
+    doc = {
+        "admins": [{"username": "a", "password": "x", "role": "wizard"}],
+        "employees": [{"id": "x"}],
+        "payroll": [dict(payroll(1, 1), days_worked="nan"), payroll(2, 1), "junk"],
+    }
+    with pytest.raises(SchemaError) as e:
+        normalize_document(doc)
+    message = str(e.value)
+    for part in ("admins[0]", "employees[0]", "payroll[0]", "payroll[2]"):
+        assert part in message
+    assert "payroll[1]" not in message
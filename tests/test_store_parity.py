@@ -0,0 +1,85 @@
+# tests/test_store_parity.py
+import pytest
+
+from conftest import employee, make_json_store, make_sqlite_store, payroll
+from utils.storage.records import plain_row
+from utils.storage.schema import SchemaError
+
+OPS = [
+    [{"op": "insert", "table": "admins", "row": {"username": "root", "password": "x", "role": "super_admin"}}],
+    [{"op": "insert", "table": "employees", "row": employee(i, salary=100.0 * i)} for i in (1, 2, 3)],
+    [{"op": "insert", "table": "payroll", "row": payroll(1, 1, "2026-09-30")},
+     {"op": "insert", "table": "payroll", "row": payroll(2, 2, "2026-10-01")},
+     {"op": "insert", "table": "payroll", "row": payroll(3, 3, "2026-10-31", days=7.5)}],
+    [{"op": "update", "table": "employees", "row": employee(2, salary="$1,250.50")}],
+    [{"op": "update", "table": "payroll", "row": payroll(3, 3, "2026-10-31", days=8)}],
+    [{"op": "delete", "table": "employees", "key": 3}],
+    [{"op": "delete", "table": "payroll", "key": "1"}],
+]
+
+
+def _apply_all(store):
+    for batch in OPS:
+        store.commit_many(batch)
+
+
+def _plain(doc):
+    return {table: [plain_row(r) for r in rows] for table, rows in doc.items() if isinstance(rows, list)}
+
+
+def test_json_and_sqlite_hold_the_same_document():
+    json_store, sqlite_store = make_json_store(), make_sqlite_store()
+    _apply_all(json_store)
+    _apply_all(sqlite_store)
+
+    expected = _plain(json_store.document())
+    assert _plain(sqlite_store.document()) == expected
+    assert expected["employees"][1]["salary"] == 1250.5
+    assert [r["id"] for r in expected["payroll"]] == [2, 3]
+
+    # and the same again when read back cold
+    assert _plain(make_json_store().document()) == expected
+    assert _plain(make_sqlite_store().document()) == expected
+
+
+def test_queries(store):
+    _apply_all(store)
+    assert store.next_id("employees") == 4
+    assert store.next_id("payroll") == 4
+    assert store.get_employee(2)["salary"] == 1250.5
+    assert store.get_employee(3) is None
+    assert sorted(r["id"] for r in store.payroll_for_month(2026, 10)) == [2, 3]
+    assert store.payroll_for_month(2026, 9) == []
+    assert store.paid_employee_ids(2026, 10) == {"2", "3"}
+    assert store.paid_in_month(2, 2026, 10)
+    assert not store.paid_in_month(1, 2026, 10)
+
+
+def test_second_instance_sees_writes(store):
+    other = make_json_store() if store.name == "json" else make_sqlite_store()
+    store.commit({"op": "insert", "table": "employees", "row": employee(1)})
+    assert other.get_employee(1) is not None
+
+    store.commit({"op": "insert", "table": "employees", "row": employee(2)})
+    store.commit({"op": "delete", "table": "employees", "key": 1})
+    assert [e["id"] for e in other.document()["employees"]] == [2]
+    other.close()
+
+
+def test_bad_row_is_rejected_before_writing(store):
+    store.commit({"op": "insert", "table": "employees", "row": employee(1)})
+    with pytest.raises(SchemaError):
+        store.commit_many([
+            {"op": "insert", "table": "employees", "row": employee(2)},
+            {"op": "insert", "table": "payroll", "row": payroll(1, 1, when="not a date")},
+        ])
+    assert [e["id"] for e in store.document()["employees"]] == [1]
+
+
+def test_replace_rewrites_everything(store):
+    _apply_all(store)
+    store.replace({"admins": [], "employees": [employee(9)], "payroll": [payroll(5, 9)]})
+    doc = _plain(store.document())
+    assert [e["id"] for e in doc["employees"]] == [9]
+    assert [r["id"] for r in doc["payroll"]] == [5]
+    assert store.next_id("payroll") == 6
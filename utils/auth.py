@@ -0,0 +1,118 @@
+# utils/auth.py
+import time
+from functools import wraps
+
+from flask import flash, jsonify, redirect, request, session, url_for
+
+from config import Config
+from utils.datastore import admin_auth_token, get_admin_by_username
+
+# -------------------------
+# AUTHORIZATION
+# -------------------------
+# A session's role is resolved once and cached in the session together with
+# the admins token (see AdminIndex). While the token still matches, checks
+# are a dict lookup and never touch the datastore. Adding or deleting an
+# admin, or changing a role, changes the token, so every session re-resolves
+# its role on its next request. Writes made by this worker change the token
+# immediately; writes by other workers are picked up by the store's stamp
+# check, done at most every AUTH_RECHECK_SECONDS.
+
+ROLE_LEVELS = {"viewer": 1, "admin": 2, "super_admin": 3}
+
+_last_sync = 0.0
+
+
+def role_allows(role, required):
+    if role == "super_admin":
+        return True
+    return ROLE_LEVELS.get(role, 0) >= ROLE_LEVELS.get(required, 99)
+
+
+def current_token():
+    global _last_sync
+    now = time.monotonic()
+    revalidate = now - _last_sync > Config.AUTH_RECHECK_SECONDS
+    if revalidate:
+        _last_sync = now
+    return admin_auth_token(revalidate)
+
+
+def login_session(username, role):
+    """Start an authenticated session with its role already resolved."""
+    session["admin"] = username
+    session["role"] = role
+    session["perm_token"] = current_token()
+
+
+def current_role():
+    """The logged-in admin's role, or None if not logged in / no longer exists."""
+    username = session.get("admin")
+    if not username:
+        return None
+
+    token = current_token()
+    if session.get("perm_token") == token and session.get("role"):
+        return session["role"]
+
+    admin = get_admin_by_username(username)
+    if not admin:
+        session.clear()
+        return None
+
+    session["role"] = admin.get("role", "admin")
+    session["perm_token"] = token
+    return session["role"]
+
+
+def has_permission(required):
+    role = current_role()
+    return role is not None and role_allows(role, required)
+
+
+# -------------------------
+# GUARDS
+# -------------------------
+def _wants_json():
+    return (request.is_json or "/api/" in request.path
+            or request.accept_mimetypes.best == "application/json")
+
+
+def _login_redirect():
+    if _wants_json():
+        return jsonify({"error": "login required"}), 401
+    flash("Please login first.", "warning")
+    return redirect(url_for("auth.login"))
+
+
+def _forbidden():
+    if _wants_json():
+        return jsonify({"error": "forbidden"}), 403
+    flash("You do not have permission to perform this action.", "danger")
+    return redirect(url_for("admin.dashboard"))
+
+
+def permission_required(required):
+    """Route decorator: the logged-in admin must hold `required` (or higher)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if current_role() is None:
+                return _login_redirect()
+            if not has_permission(required):
+                return _forbidden()
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def protect_blueprint(blueprint, required="viewer"):
+    """Require a logged-in admin holding `required` for every route of a blueprint."""
+    @blueprint.before_request
+    def _guard():
+        if current_role() is None:
+            return _login_redirect()
+        if not has_permission(required):
+            return _forbidden()
+        return None
+    return blueprint
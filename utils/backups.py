@@ -0,0 +1,530 @@
+# utils/backups.py
+import hashlib
+import json
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+from config import Config
+from utils.metrics import inc
+from utils.storage import segments
+from utils.storage.locking import FileLock, atomic_write
+
+# -------------------------
+# INCREMENTAL BACKUPS
+# -------------------------
+# Each table is cut into chunks of BACKUP_CHUNK_ROWS records (payroll chunks,
+# like the store's segments, never span two months). A chunk is
+# stored once, zlib-compressed, under chunks/<aa>/<sha256>.z, named by the
+# hash of its canonical JSON. A snapshot is a small manifest listing the
+# chunk hashes of every table, so a backup only writes the chunks that
+# changed since the last one (usually just the tail of the payroll table).
+#
+#   backups/
+#     chunks/ab/ab12....z         compressed chunk (JSON list of records)
+#     snapshots/<id>.json         manifest: {"id", "created", "tables", "counts",
+#                                            "checksum"}
+#     backup_*.json               legacy full copies (still listed/restorable)
+#
+# Chunks of unchanged rows are recognised without re-serializing them: the
+# last hash of each chunk is remembered together with the row objects it
+# covered, and the store replaces (never mutates) rows on write.
+
+BACKUP_DIR = Config.BACKUP_DIR
+CHUNK_DIR = os.path.join(BACKUP_DIR, "chunks")
+SNAPSHOT_DIR = os.path.join(BACKUP_DIR, "snapshots")
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def _backup_lock():
+    # serializes snapshot creation and pruning across processes, so a prune
+    # never collects chunks of a snapshot that is still being written
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    return FileLock(os.path.join(BACKUP_DIR, ".lock"), timeout=60)
+
+
+def _encode(rows):
+    # default=dict: cached payroll rows are PayrollRecord mappings
+    return json.dumps(rows, sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+                      default=dict).encode("utf-8")
+
+
+def tables_checksum(tables):
+    """Checksum of a snapshot: hash over its ordered chunk hashes."""
+    return hashlib.sha256(_encode(tables)).hexdigest()
+
+
+def chunk_path(digest):
+    return os.path.join(CHUNK_DIR, digest[:2], digest + ".z")
+
+
+def read_chunk(digest):
+    with open(chunk_path(digest), "rb") as f:
+        return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+
+
+def _groups(table, rows):
+    """(group, rows) to chunk separately: payroll by month, other tables whole."""
+    if table != "payroll":
+        return [(None, rows)]
+    by_month = segments.group_by_month(rows)
+    return [(key, by_month[key]) for key in sorted(by_month)]
+
+
+def _chunk_table(table, rows, chunk_rows, pending):
+    """Chunk hashes for one table; new chunk payloads are added to `pending`."""
+    digests = []
+    seen = set()
+    for group, group_rows in _groups(table, rows):
+        for start in range(0, len(group_rows), chunk_rows):
+            part = group_rows[start:start + chunk_rows]
+            key = (table, group, start)
+            seen.add(key)
+
+            memo = _memo.get(key)
+            if (memo and len(memo[0]) == len(part)
+                    and all(a is b for a, b in zip(memo[0], part))
+                    and os.path.exists(chunk_path(memo[1]))):
+                digests.append(memo[1])
+                continue
+
+            payload = _encode(part)
+            digest = hashlib.sha256(payload).hexdigest()
+            if not os.path.exists(chunk_path(digest)):
+                pending[digest] = payload
+            _memo[key] = (list(part), digest)
+            digests.append(digest)
+
+    # forget chunks of months that are gone or a table that shrank
+    for key in [k for k in _memo if k[0] == table and k not in seen]:
+        del _memo[key]
+
+    return digests
+
+
+def create_snapshot(store, chunk_rows=None, label=None):
+    """
+    Write an incremental snapshot of the store's current document. A
+    `label` marks a snapshot to keep as is: prune() and
+    rewrite_snapshots() leave labelled snapshots alone.
+    Returns the manifest dict, or None if the store is empty.
+    """
+    chunk_rows = chunk_rows or Config.BACKUP_CHUNK_ROWS
+    pending = {}
+
+    with _backup_lock():
+        # hash under the store lock so rows can't change mid-snapshot; only
+        # chunks that changed since the last snapshot are serialized
+        with store.lock, _memo_lock:
+            data = store.document()
+            if not any(data.get(t) for t in ("admins", "employees", "payroll")):
+                return None
+            tables = {
+                table: _chunk_table(table, rows, chunk_rows, pending)
+                for table, rows in data.items() if isinstance(rows, list)
+            }
+            counts = {table: len(rows) for table, rows in data.items() if isinstance(rows, list)}
+
+        written = 0
+        for digest, payload in pending.items():
+            blob = zlib.compress(payload, 6)
+            atomic_write(chunk_path(digest), blob)
+            written += len(blob)
+        inc("payroll_storage_bytes_written_total", written, file="backup")
+
+        now = datetime.now()
+        manifest = {
+            "id": now.strftime("%Y%m%d_%H%M%S_%f"),
+            "created": now.isoformat(timespec="seconds"),
+            "tables": tables,
+            "counts": counts,
+            "checksum": tables_checksum(tables),
+            "new_chunks": len(pending),
+            "new_bytes": written,
+        }
+        if label:
+            manifest["label"] = label
+        atomic_write(os.path.join(SNAPSHOT_DIR, manifest["id"] + ".json"), json.dumps(manifest))
+
+    return manifest
+
+
+# -------------------------
+# LISTING / LOADING
+# -------------------------
+def list_snapshots():
+    """All backups, oldest first: chunked snapshots and legacy full copies."""
+    out = []
+
+    if os.path.isdir(SNAPSHOT_DIR):
+        for name in os.listdir(SNAPSHOT_DIR):
+            if name.endswith(".json"):
+                out.append({"id": name[:-5], "kind": "snapshot",
+                            "path": os.path.join(SNAPSHOT_DIR, name)})
+
+    if os.path.isdir(BACKUP_DIR):
+        for name in os.listdir(BACKUP_DIR):
+            if name.startswith("backup_") and name.endswith(".json"):
+                # backup_YYYYmmdd_HHMMSS.json sorts alongside snapshot ids
+                out.append({"id": name[len("backup_"):-5], "kind": "legacy",
+                            "path": os.path.join(BACKUP_DIR, name)})
+
+    out.sort(key=lambda b: b["id"])
+    return out
+
+
+def find_snapshot(snapshot_id):
+    for b in list_snapshots():
+        if b["id"] == snapshot_id or os.path.basename(b["path"]) == snapshot_id:
+            return b
+    return None
+
+
+def read_manifest(snapshot):
+    with open(snapshot["path"], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _label(snapshot):
+    if snapshot["kind"] != "snapshot":
+        return None
+    try:
+        return read_manifest(snapshot).get("label")
+    except (OSError, ValueError):
+        return None
+
+
+def _require(snapshot_id):
+    snapshot = find_snapshot(snapshot_id)
+    if snapshot is None:
+        raise FileNotFoundError(f"No backup named {snapshot_id}")
+    return snapshot
+
+
+def iter_table_chunks(snapshot_id):
+    """
+    Yield (table, rows) one chunk at a time, so a large snapshot is never
+    held in memory all at once. Legacy full copies yield one chunk per table.
+    """
+    snapshot = _require(snapshot_id)
+
+    if snapshot["kind"] == "legacy":
+        with open(snapshot["path"], "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for table, rows in data.items():
+            if isinstance(rows, list):
+                yield table, rows
+        return
+
+    for table, digests in read_manifest(snapshot)["tables"].items():
+        if not digests:
+            yield table, []
+        for digest in digests:
+            yield table, read_chunk(digest)
+
+
+def load_snapshot(snapshot_id):
+    """Rebuild the full document stored by a backup."""
+    data = {}
+    for table, rows in iter_table_chunks(snapshot_id):
+        data.setdefault(table, []).extend(rows)
+    return data
+
+
+def iter_snapshot_json(snapshot_id):
+    """Yield a backup as JSON text, chunk by chunk (for downloads/exports)."""
+    current = None
+    first_row = True
+    yield "{"
+    for table, rows in iter_table_chunks(snapshot_id):
+        if table != current:
+            if current is not None:
+                yield "],"
+            yield json.dumps(table) + ":["
+            current = table
+            first_row = True
+        for row in rows:
+            yield ("" if first_row else ",") + json.dumps(row, ensure_ascii=False)
+            first_row = False
+    if current is not None:
+        yield "]"
+    yield "}"
+
+
+def snapshot_at(when):
+    """The newest backup taken at or before `when` (a datetime), or None."""
+    key = when.strftime("%Y%m%d_%H%M%S_%f")
+    chosen = None
+    for b in list_snapshots():
+        if b["id"] <= key:
+            chosen = b
+    return chosen
+
+
+# -------------------------
+# RETENTION
+# -------------------------
+def _snapshot_time(snapshot_id):
+    for fmt in ("%Y%m%d_%H%M%S_%f", "%Y%m%d_%H%M%S"):
+        try:
+            return datetime.strptime(snapshot_id, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def prune(keep_last=None, keep_daily=None, now=None):
+    """
+    Delete chunked snapshots outside the retention policy, then every chunk
+    no remaining snapshot refers to. Keeps the newest `keep_last` snapshots
+    plus the newest snapshot of each of the last `keep_daily` days. Legacy
+    full copies and labelled snapshots are left alone. Returns (snapshots
+    removed, chunks removed).
+    """
+    keep_last = Config.BACKUP_KEEP_LAST if keep_last is None else keep_last
+    keep_daily = Config.BACKUP_KEEP_DAILY if keep_daily is None else keep_daily
+    now = now or datetime.now()
+
+    with _backup_lock():
+        snapshots = [b for b in list_snapshots() if b["kind"] == "snapshot"]
+
+        keep = {b["id"] for b in snapshots[-keep_last:]} if keep_last else set()
+        if snapshots:
+            keep.add(snapshots[-1]["id"])  # never drop the latest
+
+        cutoff = (now - timedelta(days=keep_daily)).date()
+        seen_days = set()
+        for b in reversed(snapshots):
+            taken = _snapshot_time(b["id"])
+            if taken and taken.date() > cutoff and taken.date() not in seen_days:
+                seen_days.add(taken.date())
+                keep.add(b["id"])
+
+        removed = 0
+        for b in snapshots:
+            if b["id"] not in keep and not _label(b):
+                os.remove(b["path"])
+                removed += 1
+
+        swept = _sweep_chunks()
+
+    return removed, swept
+
+
+def _sweep_chunks():
+    """Delete every chunk no snapshot refers to (call under _backup_lock)."""
+    live = set()
+    for b in list_snapshots():
+        if b["kind"] == "snapshot":
+            for digests in read_manifest(b)["tables"].values():
+                live.update(digests)
+
+    swept = 0
+    if os.path.isdir(CHUNK_DIR):
+        for sub in os.listdir(CHUNK_DIR):
+            folder = os.path.join(CHUNK_DIR, sub)
+            for name in os.listdir(folder):
+                if name.endswith(".z") and name[:-2] not in live:
+                    os.remove(os.path.join(folder, name))
+                    swept += 1
+    return swept
+
+
+# -------------------------
+# REWRITING (MIGRATIONS)
+# -------------------------
+def rewrite_snapshots(transform, snapshot_ids=None, chunk_rows=None, dry_run=False):
+    """
+    Rewrite backups in place with `transform(document) -> document`.
+
+    Legacy full copies are rewritten as a whole; chunked snapshots keep
+    their id and creation time but get new chunks, counts and checksum.
+    Chunks that are no longer referenced are deleted afterwards. Backups
+    the transform leaves unchanged, and labelled snapshots, are not
+    touched. Returns {snapshot id: "rewritten" | "unchanged" | "kept
+    (<label>)" | error message}.
+    """
+    chunk_rows = chunk_rows or Config.BACKUP_CHUNK_ROWS
+    results = {}
+
+    with _backup_lock():
+        for b in list_snapshots():
+            if snapshot_ids is not None and b["id"] not in snapshot_ids:
+                continue
+            label = _label(b)
+            if label:
+                results[b["id"]] = f"kept ({label})"
+                continue
+            try:
+                data = load_snapshot(b["id"])
+                new = transform(data)
+            except (OSError, ValueError) as e:
+                results[b["id"]] = str(e)
+                continue
+
+            if _encode(new) == _encode(data):
+                results[b["id"]] = "unchanged"
+                continue
+            results[b["id"]] = "rewritten"
+            if dry_run:
+                continue
+
+            if b["kind"] == "legacy":
+                atomic_write(b["path"], json.dumps(new, indent=4, ensure_ascii=False))
+                continue
+
+            tables = {}
+            for table, rows in new.items():
+                if not isinstance(rows, list):
+                    continue
+                tables[table] = []
+                for _, group_rows in _groups(table, rows):
+                    for start in range(0, len(group_rows), chunk_rows):
+                        payload = _encode(group_rows[start:start + chunk_rows])
+                        digest = hashlib.sha256(payload).hexdigest()
+                        if not os.path.exists(chunk_path(digest)):
+                            atomic_write(chunk_path(digest), zlib.compress(payload, 6))
+                        tables[table].append(digest)
+
+            manifest = read_manifest(b)
+            manifest.update(
+                tables=tables,
+                counts={table: len(rows) for table, rows in new.items() if isinstance(rows, list)},
+                checksum=tables_checksum(tables),
+                rewritten=datetime.now().isoformat(timespec="seconds"),
+            )
+            atomic_write(b["path"], json.dumps(manifest))
+
+        if not dry_run:
+            _sweep_chunks()
+
+    return results
+
+
+# -------------------------
+# VERIFICATION / DIFF
+# -------------------------
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def index_backups():
+    """
+    Backups with their checksum, size and record counts, oldest first.
+    Snapshot checksums come from the manifest; legacy copies are hashed.
+    """
+    out = []
+    for b in list_snapshots():
+        entry = {"id": b["id"], "kind": b["kind"], "created": None,
+                 "checksum": None, "counts": None, "bytes": os.path.getsize(b["path"])}
+        try:
+            if b["kind"] == "snapshot":
+                manifest = read_manifest(b)
+                entry["created"] = manifest.get("created")
+                entry["counts"] = manifest.get("counts")
+                entry["checksum"] = manifest.get("checksum") or tables_checksum(manifest["tables"])
+            else:
+                taken = _snapshot_time(b["id"])
+                entry["created"] = taken.isoformat(timespec="seconds") if taken else None
+                entry["checksum"] = _file_sha256(b["path"])
+        except (OSError, ValueError, KeyError):
+            entry["checksum"] = None
+        out.append(entry)
+    return out
+
+
+def verify_snapshot(snapshot_id):
+    """
+    Check a backup end to end: the manifest checksum, that every chunk
+    exists, decompresses and hashes to its name, and that record counts
+    match. Returns {"id", "ok", "errors": [...], "counts": {...}}.
+    """
+    snapshot = _require(snapshot_id)
+    errors = []
+    counts = {}
+
+    if snapshot["kind"] == "legacy":
+        try:
+            for table, rows in iter_table_chunks(snapshot_id):
+                counts[table] = len(rows)
+        except (OSError, ValueError) as e:
+            errors.append(f"unreadable: {e}")
+        return {"id": snapshot["id"], "ok": not errors, "errors": errors, "counts": counts}
+
+    try:
+        manifest = read_manifest(snapshot)
+        tables = manifest["tables"]
+    except (OSError, ValueError, KeyError) as e:
+        return {"id": snapshot["id"], "ok": False, "errors": [f"bad manifest: {e}"], "counts": {}}
+
+    if manifest.get("checksum") and manifest["checksum"] != tables_checksum(tables):
+        errors.append("manifest checksum mismatch")
+
+    for table, digests in tables.items():
+        counts[table] = 0
+        for digest in digests:
+            try:
+                with open(chunk_path(digest), "rb") as f:
+                    payload = zlib.decompress(f.read())
+            except FileNotFoundError:
+                errors.append(f"{table}: missing chunk {digest[:12]}")
+                continue
+            except (OSError, zlib.error) as e:
+                errors.append(f"{table}: unreadable chunk {digest[:12]} ({e})")
+                continue
+
+            if hashlib.sha256(payload).hexdigest() != digest:
+                errors.append(f"{table}: corrupt chunk {digest[:12]}")
+                continue
+            counts[table] += len(json.loads(payload.decode("utf-8")))
+
+    for table, expected in (manifest.get("counts") or {}).items():
+        if counts.get(table) != expected:
+            errors.append(f"{table}: expected {expected} records, found {counts.get(table)}")
+
+    return {"id": snapshot["id"], "ok": not errors, "errors": errors, "counts": counts}
+
+
+def _row_key(table, row):
+    from utils.storage.journal import TABLE_KEYS
+    return str(row.get(TABLE_KEYS.get(table, "id")))
+
+
+def _fingerprints(snapshot_id):
+    """{table: {key: row hash}}, built one chunk at a time."""
+    out = {}
+    for table, rows in iter_table_chunks(snapshot_id):
+        prints = out.setdefault(table, {})
+        for row in rows:
+            prints[_row_key(table, row)] = hashlib.sha1(_encode(row)).digest()
+    return out
+
+
+def diff_snapshots(old_id, new_id):
+    """
+    Per-table record diff between two backups:
+    {table: {"before", "after", "added", "removed", "changed"}}.
+    Only keys and row hashes are kept in memory, never two full copies.
+    """
+    before = _fingerprints(old_id)
+    after = _fingerprints(new_id)
+
+    out = {}
+    for table in sorted(set(before) | set(after)):
+        a = before.get(table, {})
+        b = after.get(table, {})
+        out[table] = {
+            "before": len(a),
+            "after": len(b),
+            "added": sum(1 for k in b if k not in a),
+            "removed": sum(1 for k in a if k not in b),
+            "changed": sum(1 for k, h in b.items() if k in a and a[k] != h),
+        }
+    return out
@@ -0,0 +1,123 @@
+# utils/batch.py
+import csv
+import io
+import math
+from datetime import datetime
+
+from utils.datastore import (
+    transaction,
+    paid_employee_ids,
+    save_payroll_records,
+)
+from utils.jobs import enqueue
+from utils.payroll_calc import compute_payroll
+
+
+# -------------------------
+# INPUT PARSING
+# -------------------------
+def parse_batch_rows(text):
+    """
+    Parse CSV text into batch rows.
+    Columns: employee_id, days_worked[, rate]. A header line is optional.
+    """
+    rows = []
+    for line in csv.reader(io.StringIO(text or "")):
+        if not line or not "".join(line).strip():
+            continue
+        if not line[0].strip().lstrip("-").isdigit():
+            # header or junk line
+            continue
+
+        rows.append({
+            "employee_id": line[0].strip(),
+            "days_worked": line[1].strip() if len(line) > 1 else "0",
+            "rate": line[2].strip() if len(line) > 2 else "",
+        })
+    return rows
+
+
+# -------------------------
+# BATCH RUN
+# -------------------------
+def run_payroll_batch(rows):
+    """
+    Pay every row in one pass.
+
+    Rows are dicts with employee_id, days_worked and an optional rate (daily
+    rate; defaults to monthly salary / 30). Employees already paid this
+    month, unknown ids, duplicate rows and rows whose days or rate are not
+    finite non-negative numbers are skipped. All records are
+    written in a single transaction, followed by a single queued backup.
+
+    Returns {"processed": [records], "skipped": [(employee_id, reason)]}.
+    """
+    now = datetime.utcnow()
+    today_date = now.date().isoformat()
+
+    skipped = []
+    accepted = []
+    days_col = []
+    rate_col = []
+    salary_col = []
+
+    with transaction() as data:
+        employees = {str(e.get("id")): e for e in data.get("employees", [])}
+        paid = paid_employee_ids(now.year, now.month)
+
+        # pass 1: validate and dedupe into columns
+        for row in rows:
+            emp_key = str(row.get("employee_id", "")).strip()
+            emp = employees.get(emp_key)
+
+            if not emp:
+                skipped.append((emp_key, "Employee not found"))
+                continue
+            if emp_key in paid:
+                skipped.append((emp_key, "Already paid this month"))
+                continue
+
+            try:
+                days_worked = float(row.get("days_worked") or 0)
+                rate = row.get("rate")
+                rate = float(rate) if rate not in (None, "") else None
+            except (TypeError, ValueError):
+                skipped.append((emp_key, "Invalid days worked or rate"))
+                continue
+            # float() also accepts "nan", "inf" and negative numbers
+            if not math.isfinite(days_worked) or days_worked < 0 or (
+                    rate is not None and (not math.isfinite(rate) or rate < 0)):
+                skipped.append((emp_key, "Invalid days worked or rate"))
+                continue
+
+            accepted.append((emp_key, emp, days_worked))
+            days_col.append(days_worked)
+            rate_col.append(rate)
+            salary_col.append(emp["salary"])
+            # dedupe repeated rows inside the same batch
+            paid.add(emp_key)
+
+        # pass 2: compute the whole run at once
+        pay = compute_payroll(days_col, rate_col, salary_col)
+
+        processed = [
+            {
+                "employee_id": int(emp_key),
+                "employee_name": emp.get("name"),
+                "days_worked": days_worked,
+                "rate": float(pay["rate"][i]),
+                "gross_pay": float(pay["gross_pay"][i]),
+                "tax": float(pay["tax"][i]),
+                "net_pay": float(pay["net_pay"][i]),
+                "date": today_date
+            }
+            for i, (emp_key, emp, days_worked) in enumerate(accepted)
+        ]
+
+        if processed:
+            save_payroll_records(processed)
+
+    if processed:
+        enqueue("backup", unique=True)
+
+    return {"processed": processed, "skipped": skipped}
@@ -0,0 +1,169 @@
+# utils/credentials.py
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from config import Config
+
+# -------------------------
+# PASSWORD HASHING
+# -------------------------
+# Hashes use Config.PASSWORD_HASH_METHOD (a werkzeug method string such as
+# "scrypt:32768:8:1" or "pbkdf2:sha256:600000"), by default werkzeug's own
+# scrypt cost: the per-hash cost is not lowered here. Hashes written with any
+# other method, including the unsalted sha256 hex digests init_admin.py used
+# to write, still verify and are flagged for a rehash, which the login path
+# stores transparently.
+#
+# At most PASSWORD_HASH_CONCURRENCY key derivations run at once per worker,
+# so a burst of logins queues up instead of taking every core from payroll
+# requests. Successful verifications are remembered for
+# CREDENTIAL_CACHE_SECONDS as an HMAC under a per-process random key, so a
+# repeated login with the same password skips the key derivation.
+
+_kdf_slots = threading.BoundedSemaphore(max(1, Config.PASSWORD_HASH_CONCURRENCY))
+
+_cache_key = os.urandom(32)
+_cache = OrderedDict()   # username -> (stored hash, hmac, expires)
+_cache_lock = threading.Lock()
+CACHE_SIZE = 1024
+
+
+def _is_legacy_sha256(stored):
+    return len(stored) == 64 and all(c in "0123456789abcdef" for c in stored.lower())
+
+
+def hash_password(password):
+    with _kdf_slots:
+        return generate_password_hash(password, method=Config.PASSWORD_HASH_METHOD)
+
+
+@lru_cache(maxsize=None)
+def _method_prefix(method):
+    # werkzeug writes defaults into the prefix ("scrypt" -> "scrypt:32768:8:1"),
+    # so take it from a real hash instead of the configured string
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def needs_rehash(stored):
+    return (stored or "").split("$", 1)[0] != _method_prefix(Config.PASSWORD_HASH_METHOD)
+
+
+def _fingerprint(username, stored, password):
+    msg = "\0".join((username, stored, password)).encode("utf-8")
+    return hmac.new(_cache_key, msg, hashlib.sha256).digest()
+
+
+def verify_password(username, stored, password):
+    """
+    Check `password` against the stored hash.
+    Returns (ok, needs_rehash); the second flag is only meaningful when ok.
+    """
+    stored = stored or ""
+    if not stored or not password:
+        return False, False
+
+    fp = _fingerprint(username, stored, password)
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(username)
+        if hit and hit[0] == stored and hit[2] > now and hmac.compare_digest(hit[1], fp):
+            return True, needs_rehash(stored)
+
+    if _is_legacy_sha256(stored):
+        ok = hmac.compare_digest(hashlib.sha256(password.encode("utf-8")).hexdigest(), stored.lower())
+    else:
+        with _kdf_slots:
+            try:
+                ok = check_password_hash(stored, password)
+            except ValueError:  # unknown/garbled hash format
+                ok = False
+
+    if ok:
+        with _cache_lock:
+            _cache[username] = (stored, fp, now + Config.CREDENTIAL_CACHE_SECONDS)
+            _cache.move_to_end(username)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return ok, ok and needs_rehash(stored)
+
+
+def forget(username):
+    """Drop a cached verification (password changed, admin deleted)."""
+    with _cache_lock:
+        _cache.pop(username, None)
+
+
+# -------------------------
+# LOGIN RATE LIMITING
+# -------------------------
+# Failed logins are counted per (username, client) and, unless
+# Config.LOGIN_CLIENT_LIMIT_FACTOR is 0, per client over a sliding
+# LOGIN_WINDOW_SECONDS window. The client is request.remote_addr, which is
+# only the real client behind a proxy when Config.TRUSTED_PROXIES is set
+# (see app.py). Counters live in this worker's memory; with N gunicorn
+# workers an attacker gets at most N times the limit, which still bounds
+# the hashing work they can trigger.
+
+_failures = {}
+_failures_lock = threading.Lock()
+_next_prune = 0.0
+PRUNE_SECONDS = 10
+
+
+def _keys(username, client):
+    keys = [(("user", (username or "").lower(), client), Config.LOGIN_MAX_ATTEMPTS)]
+    if Config.LOGIN_CLIENT_LIMIT_FACTOR > 0:
+        keys.append((("client", client), Config.LOGIN_MAX_ATTEMPTS * Config.LOGIN_CLIENT_LIMIT_FACTOR))
+    return keys
+
+
+def login_retry_after(username, client):
+    """Seconds until another attempt is allowed, or 0 if allowed now."""
+    now = time.monotonic()
+    window = Config.LOGIN_WINDOW_SECONDS
+    wait = 0
+
+    with _failures_lock:
+        for key, limit in _keys(username, client):
+            attempts = _failures.get(key)
+            if not attempts:
+                continue
+            while attempts and now - attempts[0] > window:
+                attempts.popleft()
+            if not attempts:
+                del _failures[key]
+            elif len(attempts) >= limit:
+                wait = max(wait, int(window - (now - attempts[0])) + 1)
+    return wait
+
+
+def _prune(now):
+    """Drop counters whose newest failure left the window (call under the lock)."""
+    window = Config.LOGIN_WINDOW_SECONDS
+    for key in [k for k, attempts in _failures.items() if now - attempts[-1] > window]:
+        del _failures[key]
+
+
+def record_login_failure(username, client):
+    global _next_prune
+    now = time.monotonic()
+    with _failures_lock:
+        # keys that are never looked up again (credential spraying) would
+        # otherwise stay forever; sweep them every PRUNE_SECONDS
+        if now >= _next_prune:
+            _prune(now)
+            _next_prune = now + PRUNE_SECONDS
+        for key, limit in _keys(username, client):
+            _failures.setdefault(key, deque(maxlen=limit)).append(now)
+
+
+def record_login_success(username, client):
+    with _failures_lock:
+        _failures.pop(_keys(username, client)[0][0], None)
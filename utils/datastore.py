@@ -1,314 +1,453 @@
 # utils/datastore.py
-import json
-import os
+import threading
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-from reportlab.pdfgen import canvas
-import csv
+
+from config import Config
+from utils import backups, credentials
+from utils.exporters import get_exporter
+from utils.metrics import timed
+from utils.storage import create_store
+from utils.storage.base import copy_document
+from utils.storage.records import plain_row
 
 # -------------------------
 # REAL DATA FILE LOCATION
 # -------------------------
-DATA_FILE = "data/admins.json"
-BACKUP_FOLDER = "backups"
+DATA_FILE = Config.DATA_FILE
+BACKUP_FOLDER = Config.BACKUP_DIR
 
 # -------------------------
-# JSON I/O
+# STORAGE ENGINE
 # -------------------------
-def read_json():
-    if not os.path.exists(DATA_FILE):
-        return {"admins": [], "employees": [], "payroll": []}
+# The engine (JSON snapshot + month segments + journal, or SQLite) is picked
+# by Config.STORAGE_ENGINE. It owns the in-process cache: reads are served
+# from a shared parsed document that is revalidated with a cheap stamp.
+# Public calls are timed into DATASTORE_CALL (see /metrics); the engines
+# count the bytes they read and write.
+DATASTORE_CALL = "payroll_datastore_call_duration_seconds"
 
-    try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store(Config)
+    return _store
+
+
+def _cached_document():
+    """Shared, parsed document (read-only)."""
+    return get_store().document()
+
+
+def _commit(op):
+    get_store().commit(op)
+
+
+def transaction():
+    """Exclusive read-modify-write section (in-process and across workers)."""
+    return get_store().transaction()
+
+
+def data_generation():
+    """Counter that changes whenever the cached document changes."""
+    store = get_store()
+    with store.lock:
+        store.document()
+        return store.generation
+
+
+def invalidate_cache():
+    get_store().invalidate()
+
+
+# -------------------------
+# PROCESS LIFECYCLE
+# -------------------------
+# With gunicorn's preload the master builds the app (and this cache) once;
+# workers inherit it through fork() and only reset per-process state.
+def warm_up():
+    """Load the document and build the indexes/aggregates now, not on the first request."""
+    store = get_store()
+    with store.lock:
+        store.document()
+
+
+def before_fork():
+    """Close engine connections in the master before it forks (reopened on demand)."""
+    if _store is not None:
+        _store.close()
+
+
+def after_fork():
+    """Fresh locks and connections in a forked worker; the warm cache is kept."""
+    global _store_lock
+    _store_lock = threading.Lock()
+    if _store is not None:
+        _store.after_fork()
 
-            # ensure role present on older data
-            for admin in data.get("admins", []):
-                if "role" not in admin:
-                    admin["role"] = "admin"
 
-            return data
-    except:
-        return {"admins": [], "employees": [], "payroll": []}
+# -------------------------
+# JSON I/O
+# -------------------------
+@timed(DATASTORE_CALL)
+def read_json():
+    """Return a private, mutable copy of the whole document."""
+    return copy_document(_cached_document())
 
 
+@timed(DATASTORE_CALL)
 def write_json(data):
-    os.makedirs(os.path.dirname(DATA_FILE) or ".", exist_ok=True)
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    """Replace the whole document."""
+    get_store().replace(data)
 
 
 # -------------------------
 # BACKUP
 # -------------------------
-def create_backup():
-    if not os.path.exists(DATA_FILE):
+@timed(DATASTORE_CALL)
+def create_backup(prune=True, label=None):
+    """
+    Take an incremental snapshot (only changed chunks are written) and apply
+    the retention policy. A labelled snapshot is never pruned or rewritten.
+    Returns the snapshot id, or False if the store is empty.
+    """
+    manifest = backups.create_snapshot(get_store(), label=label)
+    if manifest is None:
         return False
 
-    os.makedirs(BACKUP_FOLDER, exist_ok=True)
+    if prune:
+        backups.prune()
+    return manifest["id"]
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_file = os.path.join(BACKUP_FOLDER, f"backup_{timestamp}.json")
 
-    with open(DATA_FILE, "r", encoding="utf-8") as src, open(backup_file, "w", encoding="utf-8") as dest:
-        dest.write(src.read())
+@timed(DATASTORE_CALL)
+def list_backups():
+    return backups.list_snapshots()
 
-    return True
+
+@timed(DATASTORE_CALL)
+def restore_backup(snapshot_id, verify=True, safety_backup=True):
+    """
+    Replace the live document with the contents of a backup.
+
+    The backup is verified first, and the current state is snapshotted so
+    the restore itself can be undone. The swap goes through store.replace(),
+    which holds the store's exclusive lock, so readers in any worker see
+    either the old or the restored data. Raises ValueError if verification fails.
+    Returns the id of the safety snapshot (or None).
+    """
+    if verify:
+        report = backups.verify_snapshot(snapshot_id)
+        if not report["ok"]:
+            raise ValueError(f"Backup {snapshot_id} failed verification: " + "; ".join(report["errors"]))
+
+    data = backups.load_snapshot(snapshot_id)
+    safety = create_backup(prune=False) if safety_backup else None
+    write_json(data)
+    return safety or None
 
 
 # -------------------------
 # ADMINS
 # -------------------------
+@timed(DATASTORE_CALL)
 def add_admin(username: str, password: str, role: str = "admin") -> bool:
-    data = read_json()
+    with get_store().transaction():
+        admins = _cached_document().get("admins", [])
 
-    # prevent duplicate names
-    for a in data.get("admins", []):
-        if a.get("username") == username:
+        # prevent duplicate names
+        if get_store().get_admin(username):
             return False
 
-    hashed = generate_password_hash(password)
-
-    # If first admin ever, promote to super_admin
-    if len(data.get("admins", [])) == 0:
-        role = "super_admin"
+        hashed = credentials.hash_password(password)
 
-    data.setdefault("admins", []).append({
-        "username": username,
-        "password": hashed,
-        "role": role
-    })
+        # If first admin ever, promote to super_admin
+        if len(admins) == 0:
+            role = "super_admin"
 
-    write_json(data)
+        _commit({"op": "insert", "table": "admins", "row": {
+            "username": username,
+            "password": hashed,
+            "role": role
+        }})
     return True
 
 
+@timed(DATASTORE_CALL)
 def verify_admin(username: str, password: str) -> bool:
-    data = read_json()
-    for a in data.get("admins", []):
-        if a.get("username") == username:
-            return check_password_hash(a.get("password"), password)
-    return False
+    admin = get_store().get_admin(username)
+    if not admin:
+        return False
+
+    ok, rehash = credentials.verify_password(username, admin.get("password"), password)
+    if ok and rehash:
+        _rehash_admin(username, admin.get("password"), password)
+    return ok
+
 
+def _rehash_admin(username, old_hash, password):
+    """Store `password` under the configured hash method (legacy migration)."""
+    new_hash = credentials.hash_password(password)
+    with get_store().transaction():
+        admin = get_store().get_admin(username)
+        # someone changed the password meanwhile; leave theirs alone
+        if not admin or admin.get("password") != old_hash:
+            return
+        admin["password"] = new_hash
+        _commit({"op": "update", "table": "admins", "row": admin})
 
+
+@timed(DATASTORE_CALL)
+def load_admins():
+    # read-only view: the records are shared with the cache
+    return list(_cached_document().get("admins", []))
+
+
+@timed(DATASTORE_CALL)
 def get_admin_by_username(username):
-    data = read_json()
-    for admin in data.get("admins", []):
-        if admin.get("username") == username:
-            return admin
-    return None
+    return get_store().get_admin(username)
 
 
+def admin_auth_token(revalidate=True):
+    """Token that changes whenever an admin is added, deleted or re-roled."""
+    return get_store().admin_token(revalidate)
+
+
+@timed(DATASTORE_CALL)
 def delete_admin(username) -> bool:
     """
     Remove admin by username.
     Returns True if removed, False otherwise (e.g. trying to delete last super_admin).
     """
-    data = read_json()
-    admins = data.get("admins", [])
+    with get_store().transaction():
+        admins = _cached_document().get("admins", [])
 
-    # prevent deleting non-existent
-    found = next((a for a in admins if a.get("username") == username), None)
-    if not found:
-        return False
+        # prevent deleting non-existent
+        found = next((a for a in admins if a.get("username") == username), None)
+        if not found:
+            return False
 
-    # prevent removing last admin
-    if len(admins) <= 1:
-        return False
+        # prevent removing last admin
+        if len(admins) <= 1:
+            return False
 
-    admins = [a for a in admins if a.get("username") != username]
-    data["admins"] = admins
-    write_json(data)
+        _commit({"op": "delete", "table": "admins", "key": username})
+    credentials.forget(username)
     return True
 
 
 # -------------------------
 # EMPLOYEES
 # -------------------------
+@timed(DATASTORE_CALL)
 def load_employees():
-    return read_json().get("employees", [])
+    # read-only view: the records are shared with the cache
+    return list(_cached_document().get("employees", []))
 
 
-def save_employee(employee_dict):
-    data = read_json()
-    employees = data.get("employees", [])
+@timed(DATASTORE_CALL)
+def get_employee(employee_id):
+    return get_store().get_employee(employee_id)
 
-    new_id = max([int(e.get("id", 0)) for e in employees], default=0) + 1
-    employee_dict["id"] = new_id
 
-    employees.append(employee_dict)
-    data["employees"] = employees
-    write_json(data)
+@timed(DATASTORE_CALL)
+def save_employee(employee_dict):
+    with get_store().transaction():
+        employee_dict["id"] = get_store().next_id("employees")
+
+        _commit({"op": "insert", "table": "employees", "row": employee_dict})
     return True
 
 
+@timed(DATASTORE_CALL)
 def update_employee(updated):
-    data = read_json()
-    employees = data.get("employees", [])
-
-    for i, e in enumerate(employees):
-        if int(e.get("id")) == int(updated.get("id")):
-            employees[i] = updated
-            data["employees"] = employees
-            write_json(data)
-            return True
+    with get_store().transaction():
+        if get_store().get_employee(updated.get("id")) is None:
+            return False
 
-    return False
+        _commit({"op": "update", "table": "employees", "row": updated})
+    return True
 
 
+@timed(DATASTORE_CALL)
 def delete_employee(employee_id):
-    data = read_json()
-    employees = data.get("employees", [])
-
-    employees = [e for e in employees if int(e.get("id")) != int(employee_id)]
-    data["employees"] = employees
-    write_json(data)
+    _commit({"op": "delete", "table": "employees", "key": employee_id})
     return True
 
 
 # -------------------------
 # PAYROLL
 # -------------------------
+@timed(DATASTORE_CALL)
 def load_payroll_records():
-    return read_json().get("payroll", [])
-
+    # read-only view: the records are shared with the cache
+    return list(_cached_document().get("payroll", []))
 
-def has_been_paid_this_month(employee_id):
-    data = read_json()
-    records = data.get("payroll", [])
 
-    now = datetime.utcnow()
-    current_year = now.year
-    current_month = now.month
+@timed(DATASTORE_CALL)
+def load_payroll_for_employee(employee_id):
+    return get_store().payroll_for_employee(employee_id)
 
-    for r in records:
-        try:
-            if int(r.get("employee_id")) != int(employee_id):
-                continue
-        except:
-            continue
 
-        try:
-            rd = datetime.fromisoformat(r.get("date")).date()
-        except:
-            continue
+@timed(DATASTORE_CALL)
+def load_payroll_for_month(year, month):
+    # read-only view: the records are shared with the cache
+    return get_store().payroll_for_month(year, month)
 
-        if rd.year == current_year and rd.month == current_month:
-            return True
 
-    return False
+@timed(DATASTORE_CALL)
+def has_been_paid_this_month(employee_id):
+    now = datetime.utcnow()
+    try:
+        return get_store().paid_in_month(int(employee_id), now.year, now.month)
+    except (TypeError, ValueError):
+        return False
 
 
+@timed(DATASTORE_CALL)
 def save_payroll_record(record):
-    data = read_json()
-    recs = data.get("payroll", [])
-
-    new_id = max([int(r.get("id", 0)) for r in recs], default=0) + 1
-    record["id"] = new_id
+    with get_store().transaction():
+        record["id"] = get_store().next_id("payroll")
 
-    recs.append(record)
-    data["payroll"] = recs
-    write_json(data)
+        _commit({"op": "insert", "table": "payroll", "row": record})
     return True
 
 
-# -------------------------
-# EXPORTS (CSV / PDF)
-# -------------------------
-def export_payroll_pdf(record, output_path="exports/payslip.pdf"):
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    import qrcode
-    import os
-
-    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
-
-    c = canvas.Canvas(output_path, pagesize=A4)
-    width, height = A4
-
-    logo_path = "assets/company_logo.png"
-    if not os.path.exists("assets"):
-        os.makedirs("assets")
-
-    if not os.path.exists(logo_path):
-        try:
-            from PIL import Image, ImageDraw
-            img = Image.new("RGB", (500, 150), "#0A3D62")
-            d = ImageDraw.Draw(img)
-            d.text((140, 50), "CodeNest Security Ltd.", fill="white")
-            img.save(logo_path)
-        except Exception:
-            pass
+@timed(DATASTORE_CALL)
+def pay_once(employee_id, record):
+    """
+    Save `record` unless the employee was already paid this month. The check
+    and the insert share one transaction, so concurrent requests from other
+    workers cannot both pay. Returns False (nothing saved) if already paid.
+    """
+    with get_store().transaction():
+        if has_been_paid_this_month(employee_id):
+            return False
+        return save_payroll_record(record)
 
-    try:
-        c.drawImage(logo_path, 40, height - 110, width=170, height=60, preserveAspectRatio=True)
-    except Exception:
-        pass
 
-    c.setFont("Helvetica-Bold", 20)
-    c.drawString(230, height - 80, "PAYSLIP")
+@timed(DATASTORE_CALL)
+def save_payroll_records(records):
+    """Insert many payroll records with a single write."""
+    with get_store().transaction():
+        next_id = get_store().next_id("payroll")
 
-    c.setFont("Helvetica", 10)
-    c.drawString(230, height - 100, "Generated by CodeNest Payroll System")
+        ops = []
+        for record in records:
+            record["id"] = next_id
+            next_id += 1
+            ops.append({"op": "insert", "table": "payroll", "row": record})
+
+        get_store().commit_many(ops)
+    return True
 
-    c.setStrokeColor(colors.black)
-    c.setLineWidth(1)
-    c.rect(40, height - 250, width - 80, 120)
 
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(50, height - 140, "Employee Information")
+@timed(DATASTORE_CALL)
+def paid_employee_ids(year, month):
+    """Ids (as str) of employees already paid in the given month."""
+    return get_store().paid_employee_ids(year, month)
 
-    c.setFont("Helvetica", 10)
-    c.drawString(50, height - 160, f"Name: {record.get('employee_name', 'N/A')}")
-    c.drawString(50, height - 180, f"Date: {record.get('date', 'N/A')}")
 
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(50, height - 220, "Salary Breakdown")
+def encode_cursor(record):
+    return f"{record.get('date') or ''}|{record.get('id') or 0}"
 
-    c.setFont("Helvetica", 10)
-    c.drawString(50, height - 240, f"Gross Salary:  ${record.get('gross_pay', 0):,.2f}")
-    c.drawString(50, height - 260, f"Tax Deducted: ${record.get('tax', 0):,.2f}")
-    c.drawString(50, height - 280, f"Net Salary:   ${record.get('net_pay', 0):,.2f}")
 
-    qr_data = f"Employee: {record.get('employee_name')}\nNet Pay: ${record.get('net_pay')}"
+def decode_cursor(cursor):
+    """(date, id) from a cursor string, or None if missing/invalid."""
+    if not cursor or "|" not in cursor:
+        return None
+    date_value, _, id_value = cursor.rpartition("|")
     try:
-        qr = qrcode.make(qr_data)
-        qr_path = "assets/payslip_qr.png"
-        qr.save(qr_path)
-        c.drawImage(qr_path, width - 180, height - 260, width=120, height=120)
-    except Exception:
-        pass
+        return (date_value, int(id_value))
+    except ValueError:
+        return None
+
+
+@timed(DATASTORE_CALL)
+def payroll_history_page(limit=50, cursor=None, date_from=None, date_to=None,
+                         employee_id=None, department=None, copy=True):
+    """
+    One page of payroll history, newest first.
+    copy=False hands out the cached records (read-only Mappings, not dicts).
+    Returns {"records": [...], "next_cursor": str or None}.
+    """
+    records, has_more = get_store().payroll_page(
+        limit=limit,
+        before=decode_cursor(cursor),
+        date_from=date_from or None,
+        date_to=date_to or None,
+        employee_id=employee_id,
+        department=department or None,
+        copy=copy,
+    )
+    next_cursor = encode_cursor(records[-1]) if has_more and records else None
+    return {"records": records, "next_cursor": next_cursor}
+
+
+@timed(DATASTORE_CALL)
+def payroll_summary(months=()):
+    """
+    Dashboard figures from the maintained aggregates (no history scan).
+    `months` is a list of (year, month) whose totals should be included.
+    Money values are in dollars.
+    """
+    store = get_store()
+    with store.lock:
+        store.document()
+        agg = store.aggregates
+
+        def dollars(totals):
+            return {k: (v / 100.0 if k != "count" else v) for k, v in totals.items()}
 
-    c.setLineWidth(1)
-    c.line(50, 120, 250, 120)
-    c.drawString(50, 105, "Authorized Signature")
+        return {
+            "count": agg.count,
+            "totals": dollars(agg.totals),
+            "months": {m: dollars(agg.month(*m)) for m in months},
+            "recent": [plain_row(r) for r in agg.recent()],
+            "top_employees": agg.top_employees(5),
+        }
 
-    c.setFont("Helvetica-Oblique", 9)
-    c.drawString(40, 50, "This is a system-generated payslip. No physical signature required.")
 
-    c.save()
+# -------------------------
+# EXPORTS (CSV / PDF)
+# -------------------------
+# The export code lives in utils/exporters and is imported on first use;
+# ReportLab is never loaded by a worker that does not render a PDF.
+@timed(DATASTORE_CALL)
+def export_payroll_pdf(record, output_path="exports/payslip.pdf"):
+    return get_exporter("payslip_pdf")(record, output_path)
+
 
-    return output_path
+def iter_payroll_records(chunk_size=1000, **filters):
+    """
+    Yield payroll records newest first, one keyset page at a time. The
+    records are the cached read-only rows, so nothing is copied.
+    Accepts the same filters as payroll_history_page().
+    """
+    cursor = None
+    while True:
+        page = payroll_history_page(limit=chunk_size, cursor=cursor, copy=False, **filters)
+        yield from page["records"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return
 
 
-def export_payroll_csv(records, output_path="exports/payroll.csv"):
-    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+def iter_payroll_csv(records, rows_per_chunk=500):
+    """Yield CSV text in chunks of `rows_per_chunk` rows (header first)."""
+    return get_exporter("csv_stream")(records, rows_per_chunk)
 
-    fieldnames = ["id", "employee_name", "date", "gross_pay", "tax", "net_pay"]
 
-    with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
+def gzip_chunks(chunks):
+    """Compress a stream of text chunks into a gzip byte stream."""
+    return get_exporter("gzip")(chunks)
 
-        for r in records:
-            writer.writerow({
-                "id": r.get("id"),
-                "employee_name": r.get("employee_name"),
-                "date": r.get("date"),
-                "gross_pay": r.get("gross_pay"),
-                "tax": r.get("tax"),
-                "net_pay": r.get("net_pay"),
-            })
 
-    return output_path
+@timed(DATASTORE_CALL)
+def export_payroll_csv(records, output_path="exports/payroll.csv"):
+    return get_exporter("csv")(records, output_path)
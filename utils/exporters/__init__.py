@@ -0,0 +1,46 @@
+# utils/exporters/__init__.py
+import importlib
+
+# -------------------------
+# EXPORTER REGISTRY
+# -------------------------
+# Exporters are registered by name as "module:function" and imported on
+# first use, so ReportLab, PIL and qrcode are only loaded by a process that
+# actually renders a PDF. Importing this package imports nothing else.
+#
+#   csv           export_csv(records, output_path)        -> path
+#   csv_stream    iter_csv(records, rows_per_chunk=500)   -> text chunks
+#   gzip          gzip_chunks(chunks)                     -> gzip byte chunks
+#   payslip_pdf   render_payslip(record, output)          -> output
+#   payslip_zip   generate_payslips(records, label=None)  -> {"zip", "files", "failed"}
+
+EXPORTERS = {
+    "csv": "utils.exporters.csv_export:export_csv",
+    "csv_stream": "utils.exporters.csv_export:iter_csv",
+    "gzip": "utils.exporters.csv_export:gzip_chunks",
+    "payslip_pdf": "utils.exporters.payslip_pdf:render_payslip",
+    "payslip_zip": "utils.exporters.payslips:generate_payslips",
+}
+
+_loaded = {}
+
+
+def register_exporter(name, target):
+    """Register an exporter: a callable, or "module:function" to import lazily."""
+    EXPORTERS[name] = target
+    _loaded.pop(name, None)
+
+
+def get_exporter(name):
+    """The exporter registered as `name`, importing its module on first use."""
+    fn = _loaded.get(name)
+    if fn is None:
+        try:
+            target = EXPORTERS[name]
+        except KeyError:
+            raise KeyError(f"Unknown exporter: {name}") from None
+        if isinstance(target, str):
+            module, _, attr = target.partition(":")
+            target = getattr(importlib.import_module(module), attr)
+        fn = _loaded[name] = target
+    return fn
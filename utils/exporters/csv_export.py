@@ -0,0 +1,53 @@
+# utils/exporters/csv_export.py
+import csv
+import io
+import os
+import zlib
+
+# -------------------------
+# CSV EXPORT
+# -------------------------
+# Records are the cached read-only rows or plain dicts; only .get() is used.
+
+CSV_FIELDS = ["id", "employee_name", "date", "gross_pay", "tax", "net_pay"]
+
+
+def iter_csv(records, rows_per_chunk=500):
+    """Yield CSV text in chunks of `rows_per_chunk` rows (header first)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_FIELDS)
+
+    count = 0
+    for r in records:
+        writer.writerow([r.get(f) for f in CSV_FIELDS])
+        count += 1
+        if count % rows_per_chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    yield buf.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of text chunks into a gzip byte stream."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_csv(records, output_path="exports/payroll.csv"):
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_FIELDS)
+
+        for r in records:
+            writer.writerow([r.get(f) for f in CSV_FIELDS])
+
+    return output_path
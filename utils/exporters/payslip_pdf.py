@@ -0,0 +1,156 @@
+# utils/exporters/payslip_pdf.py
+import io
+import os
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from utils.metrics import timed
+
+PAYSLIP_LOGO = "assets/company_logo.png"
+
+# -------------------------
+# PAYSLIP RENDERING
+# -------------------------
+# The logo is decoded (and, when opaque, re-encoded as JPEG) once per
+# process by _static_layer(), which also keeps the fixed drawing calls for
+# the titles, frame and footer. Every payslip is its own one-page PDF, so
+# the template is still drawn and written into each file; what is saved per
+# payslip is the logo lookup, the image decode and its recompression. The
+# QR code is built as an in-memory image straight from the qrcode
+# matrix, so no file is written and parallel renders share nothing on disk.
+
+WIDTH, HEIGHT = A4
+
+QR_SIZE = 120
+QR_BORDER = 4
+# a fixed mask skips qrcode's 8-way mask search; scanners accept any mask
+QR_MASK = 0
+
+
+def ensure_payslip_logo():
+    """Create the placeholder company logo if it is missing. Returns its path."""
+    os.makedirs(os.path.dirname(PAYSLIP_LOGO), exist_ok=True)
+
+    if not os.path.exists(PAYSLIP_LOGO):
+        try:
+            from PIL import Image, ImageDraw
+            img = Image.new("RGB", (500, 150), "#0A3D62")
+            d = ImageDraw.Draw(img)
+            d.text((140, 50), "CodeNest Security Ltd.", fill="white")
+            img.save(PAYSLIP_LOGO)
+        except Exception:
+            pass
+
+    return PAYSLIP_LOGO
+
+
+def _load_logo(path):
+    """
+    Decode the logo once. Opaque logos are re-encoded as an in-memory JPEG,
+    which ReportLab embeds as-is instead of recompressing the raw pixels
+    on every page.
+    """
+    try:
+        from PIL import Image
+        with Image.open(path) as img:
+            img.load()
+            if img.mode in ("RGBA", "LA", "P") and "A" in img.getbands():
+                return ImageReader(img.copy())
+            buf = io.BytesIO()
+            img.convert("RGB").save(buf, "JPEG", quality=95)
+        buf.seek(0)
+        return ImageReader(buf)
+    except Exception:
+        try:
+            return ImageReader(path)
+        except Exception:
+            return None
+
+
+@lru_cache(maxsize=1)
+def _static_layer():
+    """
+    The decoded logo and the list of fixed drawing calls, built once per
+    process. The calls are replayed onto each page by _draw_static().
+    """
+    logo = _load_logo(ensure_payslip_logo())
+
+    ops = [
+        ("setFont", ("Helvetica-Bold", 20)),
+        ("drawString", (230, HEIGHT - 80, "PAYSLIP")),
+        ("setFont", ("Helvetica", 10)),
+        ("drawString", (230, HEIGHT - 100, "Generated by CodeNest Payroll System")),
+        ("setStrokeColor", (colors.black,)),
+        ("setLineWidth", (1,)),
+        ("rect", (40, HEIGHT - 250, WIDTH - 80, 120)),
+        ("setFont", ("Helvetica-Bold", 12)),
+        ("drawString", (50, HEIGHT - 140, "Employee Information")),
+        ("drawString", (50, HEIGHT - 220, "Salary Breakdown")),
+        ("setLineWidth", (1,)),
+        ("line", (50, 120, 250, 120)),
+        ("setFont", ("Helvetica", 10)),
+        ("drawString", (50, 105, "Authorized Signature")),
+        ("setFont", ("Helvetica-Oblique", 9)),
+        ("drawString", (40, 50, "This is a system-generated payslip. No physical signature required.")),
+    ]
+    return logo, ops
+
+
+def _draw_static(c):
+    logo, ops = _static_layer()
+    if logo is not None:
+        try:
+            c.drawImage(logo, 40, HEIGHT - 110, width=170, height=60,
+                        preserveAspectRatio=True, mask="auto")
+        except Exception:
+            pass
+
+    for name, args in ops:
+        getattr(c, name)(*args)
+
+
+def draw_qr(c, data, x, y, size=QR_SIZE):
+    """Draw `data` as a QR code in the size x size box at (x, y)."""
+    import qrcode
+    from PIL import Image
+
+    qr = qrcode.QRCode(border=QR_BORDER, mask_pattern=QR_MASK)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+
+    # one pixel per module, built in memory and scaled up by the PDF viewer
+    n = len(matrix)
+    img = Image.new("L", (n, n))
+    img.putdata([0 if dark else 255 for row in matrix for dark in row])
+    c.drawImage(ImageReader(img), x, y, width=size, height=size)
+
+
+@timed("payroll_pdf_render_duration_seconds", op="payslip")
+def render_payslip(record, output):
+    """Render one payslip to `output` (a path or a binary file object)."""
+    if isinstance(output, str):
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    c = canvas.Canvas(output, pagesize=A4)
+    _draw_static(c)
+
+    c.setFont("Helvetica", 10)
+    c.drawString(50, HEIGHT - 160, f"Name: {record.get('employee_name', 'N/A')}")
+    c.drawString(50, HEIGHT - 180, f"Date: {record.get('date', 'N/A')}")
+    c.drawString(50, HEIGHT - 240, f"Gross Salary:  ${record.get('gross_pay', 0):,.2f}")
+    c.drawString(50, HEIGHT - 260, f"Tax Deducted: ${record.get('tax', 0):,.2f}")
+    c.drawString(50, HEIGHT - 280, f"Net Salary:   ${record.get('net_pay', 0):,.2f}")
+
+    qr_data = f"Employee: {record.get('employee_name')}\nNet Pay: ${record.get('net_pay')}"
+    try:
+        draw_qr(c, qr_data, WIDTH - 180, HEIGHT - 260)
+    except Exception:
+        pass
+
+    c.save()
+    return output
@@ -0,0 +1,95 @@
+# utils/exporters/payslips.py
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from utils.exporters.payslip_pdf import ensure_payslip_logo, render_payslip
+from utils.storage.records import plain_row
+
+PAYSLIP_FOLDER = "exports/payslips"
+
+
+# -------------------------
+# FILE NAMING
+# -------------------------
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(value or "")).strip("-") or "na"
+
+
+def payslip_filename(record):
+    """payslip_<employee id>_<YYYY-MM>_<record id>.pdf, unique per record."""
+    period = str(record.get("date") or "")[:7]
+    return "payslip_{}_{}_{}.pdf".format(
+        _slug(record.get("employee_id")),
+        _slug(period),
+        _slug(record.get("id")),
+    )
+
+
+# -------------------------
+# RENDERING
+# -------------------------
+def _render_payslip(job):
+    """Worker entry point: render one payslip, never raise across the pool."""
+    record, output_path = job
+    try:
+        render_payslip(record, output_path)
+        return output_path, None
+    except Exception as e:
+        return output_path, str(e)
+
+
+def generate_payslips(records, label=None, workers=None):
+    """
+    Render one payslip per record and bundle them into a zip.
+
+    Rendering is fanned out over a ProcessPoolExecutor (one worker per CPU
+    by default), so a month-end run scales with cores instead of blocking a
+    single request thread per payslip. The workers come from a forkserver
+    (spawn where that is unavailable), never a plain fork: callers are
+    multithreaded, and a child forked while another thread holds a lock
+    (metrics, logging) would deadlock on it. Files land in
+    exports/payslips/<label>_<timestamp>/ and the zip next to that folder.
+
+    Returns {"zip": path or None, "files": [paths], "failed": [(path, error)]}.
+    """
+    # timestamped so concurrent runs for the same period never share a folder
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    label = f"{_slug(label)}_{stamp}" if label else stamp
+    out_dir = os.path.join(PAYSLIP_FOLDER, label)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # create the logo once, before any worker can race on it
+    ensure_payslip_logo()
+
+    jobs = [(plain_row(r), os.path.join(out_dir, payslip_filename(r))) for r in records]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+
+    if workers == 1:
+        results = [_render_payslip(job) for job in jobs]
+    else:
+        # batch jobs per worker round-trip to keep pickling overhead low
+        chunksize = max(1, len(jobs) // (workers * 4))
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        # the forkserver keeps the cwd it started with; hand it absolute paths
+        remote = [(record, os.path.abspath(path)) for record, path in jobs]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            done = pool.map(_render_payslip, remote, chunksize=chunksize)
+            results = [(path, error) for (_, path), (_, error) in zip(jobs, done)]
+
+    files = [path for path, error in results if error is None]
+    failed = [(path, error) for path, error in results if error is not None]
+
+    zip_path = None
+    if files:
+        zip_path = out_dir + ".zip"
+        # PDFs are already compressed; storing them keeps zipping cheap
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zf:
+            for path in files:
+                zf.write(path, arcname=os.path.basename(path))
+
+    return {"zip": zip_path, "files": files, "failed": failed}
@@ -0,0 +1,357 @@
+# utils/jobs.py
+import json
+import os
+import shutil
+import threading
+import time
+import traceback
+import uuid
+
+from config import Config
+from utils.storage.locking import atomic_write
+
+# -------------------------
+# BACKGROUND JOBS
+# -------------------------
+# A small local job queue with no external broker. Every job is one JSON
+# file under JOBS_DIR/<state>/<job id>.json, with state one of
+# queued / running / done / failed. Workers claim a job by os.rename()ing it
+# from queued/ to running/, which only one process can win, so any number of
+# gunicorn workers can run worker threads over the same directory.
+#
+# A job that raises is put back in queued/ with an exponential back-off
+# until it has used JOB_MAX_ATTEMPTS attempts, then it lands in failed/.
+# While a job runs, its worker renews the lease by re-stamping the job's
+# "updated" time every HEARTBEAT_INTERVAL seconds, so only jobs left in
+# running/ by a crashed process go RUNNING_LEASE seconds without one and
+# are re-queued, however long a healthy job takes. Finished jobs are kept
+# for KEEP_FINISHED seconds, then removed together with the files they
+# wrote under exports/.
+
+JOBS_DIR = Config.JOBS_DIR
+STATES = ("queued", "running", "done", "failed")
+
+RUNNING_LEASE = 600
+HEARTBEAT_INTERVAL = RUNNING_LEASE / 4
+POLL_INTERVAL = 1.0
+KEEP_FINISHED = 7 * 24 * 3600
+EXPORTS_DIR = "exports"   # job output under here is deleted with the job
+
+HANDLERS = {}
+
+_wakeup = threading.Event()
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+def register_handler(kind, fn):
+    """Register fn(args, job) -> result (JSON-serializable) for a job kind."""
+    HANDLERS[kind] = fn
+
+
+def _path(state, job_id):
+    return os.path.join(JOBS_DIR, state, f"{job_id}.json")
+
+
+def _write(state, job):
+    job["status"] = state
+    job["updated"] = time.time()
+    atomic_write(_path(state, job["id"]), json.dumps(job))
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _list(state):
+    try:
+        names = os.listdir(os.path.join(JOBS_DIR, state))
+    except FileNotFoundError:
+        return []
+    # ids start with a hex timestamp, so name order is FIFO order
+    return sorted(n[:-5] for n in names if n.endswith(".json"))
+
+
+# -------------------------
+# PUBLIC API
+# -------------------------
+def enqueue(kind, args=None, unique=False, max_attempts=None):
+    """
+    Queue a job and return its id. With unique=True an already queued job
+    of the same kind and args is reused instead (e.g. one pending backup).
+    """
+    args = args or {}
+
+    if unique:
+        for job_id in _list("queued"):
+            job = _read(_path("queued", job_id))
+            if job and job["kind"] == kind and job["args"] == args:
+                return job_id
+
+    job = {
+        "id": f"{time.time_ns():x}-{uuid.uuid4().hex[:8]}",
+        "kind": kind,
+        "args": args,
+        "attempts": 0,
+        "max_attempts": max_attempts or Config.JOB_MAX_ATTEMPTS,
+        "not_before": 0,
+        "created": time.time(),
+        "result": None,
+        "error": None,
+    }
+    _write("queued", job)
+    _wakeup.set()
+    return job["id"]
+
+
+def job_status(job_id):
+    """The job dict, or None if unknown."""
+    if not job_id or "/" in job_id or "\\" in job_id or job_id.startswith("."):
+        return None
+
+    # states are checked in pipeline order, twice, so a job that moves
+    # between two lookups is still found
+    for _ in range(2):
+        for state in STATES:
+            job = _read(_path(state, job_id))
+            if job is not None:
+                return job
+    return None
+
+
+# -------------------------
+# WORKER
+# -------------------------
+def _claim():
+    now = time.time()
+    for job_id in _list("queued"):
+        job = _read(_path("queued", job_id))
+        if job is None or job.get("not_before", 0) > now:
+            continue
+
+        running = _path("running", job_id)
+        os.makedirs(os.path.dirname(running), exist_ok=True)
+        try:
+            os.rename(_path("queued", job_id), running)
+        except FileNotFoundError:
+            continue  # another worker got it
+
+        job["attempts"] += 1
+        _write("running", job)
+        return job
+    return None
+
+
+def _finish(job, state):
+    _write(state, job)
+    try:
+        os.remove(_path("running", job["id"]))
+    except FileNotFoundError:
+        pass
+
+
+class _Heartbeat:
+    """Keeps a running job's lease alive from a side thread until stop()."""
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = HEARTBEAT_INTERVAL if interval is None else interval
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"heartbeat-{job['id']}", daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                # re-check under the lock: once stop() returns the job file
+                # belongs to _finish, and a recovered job is left alone
+                if self.stopped.is_set() or not os.path.exists(_path("running", self.job["id"])):
+                    return
+                try:
+                    _write("running", dict(self.job))
+                except OSError:
+                    traceback.print_exc()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stop(self):
+        with self.lock:
+            self.stopped.set()
+
+
+def run_job(job):
+    """Run one claimed job and file it under done/, queued/ (retry) or failed/."""
+    handler = HANDLERS.get(job["kind"])
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job['kind']}")
+        with _Heartbeat(job):
+            result = handler(job["args"], job)
+        job["result"] = result
+        job["error"] = None
+        _finish(job, "done")
+    except Exception as e:
+        job["error"] = f"{type(e).__name__}: {e}"
+        job["traceback"] = traceback.format_exc(limit=5)
+        if handler is not None and job["attempts"] < job["max_attempts"]:
+            job["not_before"] = time.time() + 2 ** job["attempts"]
+            _finish(job, "queued")
+        else:
+            _finish(job, "failed")
+
+
+def run_pending(limit=None):
+    """Run queued jobs in this thread until none are due. Returns the count."""
+    count = 0
+    while limit is None or count < limit:
+        job = _claim()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def _remove_output(job):
+    """Delete the files a finished job produced ("path", "dir"), if under exports/."""
+    result = job.get("result")
+    if not isinstance(result, dict):
+        return
+    root = os.path.realpath(EXPORTS_DIR)
+    for key in ("path", "dir"):
+        target = os.path.realpath(result[key]) if result.get(key) else None
+        if not target or target == root or os.path.commonpath([root, target]) != root:
+            continue
+        if os.path.isdir(target):
+            shutil.rmtree(target, ignore_errors=True)
+        else:
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+
+
+def recover_stale(lease=RUNNING_LEASE, keep_finished=KEEP_FINISHED):
+    """Re-queue jobs orphaned in running/ and drop old finished jobs."""
+    now = time.time()
+
+    for job_id in _list("running"):
+        job = _read(_path("running", job_id))
+        if job and now - job.get("updated", now) > lease:
+            _finish(job, "queued")
+
+    for state in ("done", "failed"):
+        for job_id in _list(state):
+            job = _read(_path(state, job_id))
+            if job and now - job.get("updated", now) > keep_finished:
+                _remove_output(job)
+                try:
+                    os.remove(_path(state, job_id))
+                except FileNotFoundError:
+                    pass
+
+
+def _worker_loop():
+    last_recovery = 0
+    while True:
+        try:
+            if time.time() - last_recovery > RUNNING_LEASE / 2:
+                recover_stale()
+                last_recovery = time.time()
+            run_pending()
+        except Exception:
+            traceback.print_exc()
+
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_workers(count=None):
+    """
+    Start the worker threads for this process (once per pid, so forked
+    gunicorn workers each start their own). count=0 disables them.
+    """
+    global _started_pid
+
+    count = Config.JOB_WORKERS if count is None else count
+    with _start_lock:
+        if count <= 0 or _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+
+        for state in STATES:
+            os.makedirs(os.path.join(JOBS_DIR, state), exist_ok=True)
+        for i in range(count):
+            threading.Thread(target=_worker_loop, name=f"payroll-jobs-{i}", daemon=True).start()
+
+
+# -------------------------
+# BUILT-IN JOBS
+# -------------------------
+JOB_EXPORT_FOLDER = "exports/jobs"
+
+
+def _backup_job(args, job):
+    from utils.datastore import create_backup
+    return {"created": create_backup()}
+
+
+def _payslip_job(args, job):
+    from utils.datastore import export_payroll_pdf
+    from utils.exporters.payslips import PAYSLIP_FOLDER, payslip_filename
+
+    record = args["record"]
+    path = os.path.join(PAYSLIP_FOLDER, payslip_filename(record))
+    export_payroll_pdf(record, path)
+    return {"path": path}
+
+
+def _payslip_bundle_job(args, job):
+    from utils.datastore import load_payroll_for_month
+    from utils.exporters import get_exporter
+
+    records = load_payroll_for_month(args["year"], args["month"])
+    result = get_exporter("payslip_zip")(records, label=f"{args['year']}-{args['month']:02d}")
+    if records and not result["zip"]:
+        raise RuntimeError(f"{len(result['failed'])} payslip(s) failed to render")
+    return {
+        "path": result["zip"],
+        # the rendered PDFs, kept next to the zip until the job is pruned
+        "dir": os.path.splitext(result["zip"])[0] if result["zip"] else None,
+        "count": len(result["files"]),
+        "failed": result["failed"],
+    }
+
+
+def _export_csv_job(args, job):
+    from utils.datastore import iter_payroll_records, iter_payroll_csv, gzip_chunks
+
+    filters = args.get("filters") or {}
+    chunks = iter_payroll_csv(iter_payroll_records(**filters))
+    path = os.path.join(JOB_EXPORT_FOLDER, f"payroll_{job['id']}.csv")
+    if args.get("gzip"):
+        chunks = gzip_chunks(chunks)
+        path += ".gz"
+
+    os.makedirs(JOB_EXPORT_FOLDER, exist_ok=True)
+    tmp = path + ".part"
+    with open(tmp, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+    os.replace(tmp, path)
+    return {"path": path}
+
+
+register_handler("backup", _backup_job)
+register_handler("payslip", _payslip_job)
+register_handler("payslip_bundle", _payslip_bundle_job)
+register_handler("export_csv", _export_csv_job)
@@ -0,0 +1,130 @@
+# utils/metrics.py
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# -------------------------
+# METRICS REGISTRY
+# -------------------------
+# A small in-process registry of counters and latency histograms, rendered
+# in the Prometheus text format by the /metrics endpoint. There is no
+# external dependency. Each gunicorn worker keeps its own numbers and
+# labels them with its pid, so scrape every worker or sum by name.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "payroll_http_request_duration_seconds": "HTTP request latency by endpoint",
+    "payroll_http_requests_total": "HTTP requests by endpoint and status",
+    "payroll_datastore_call_duration_seconds": "Datastore call latency by operation",
+    "payroll_storage_bytes_read_total": "Bytes read from storage files",
+    "payroll_storage_bytes_written_total": "Bytes written to storage files",
+    "payroll_template_render_duration_seconds": "Jinja template render latency",
+    "payroll_pdf_render_duration_seconds": "Payslip PDF render latency",
+    "payroll_app_startup_seconds": "Time to build the Flask app in create_app()",
+}
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> value
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    i = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        h[i] += 1
+        h[-1] += seconds
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name, **labels):
+    """Decorator: observe each call's duration, labelled op=<function name>."""
+    def decorator(fn):
+        op = labels.pop("op", fn.__name__)
+
+        @wraps(fn)
+        def wrapped(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, op=op, **labels)
+        return wrapped
+    return decorator
+
+
+# -------------------------
+# EXPOSITION
+# -------------------------
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    pid = (("pid", os.getpid()),)
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+
+    lines = []
+    seen = set()
+
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_fmt_labels(labels, pid)} {value}")
+
+    for (name, labels), h in histograms:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, h):
+            cumulative += count
+            lines.append(f"{name}_bucket{_fmt_labels(labels, pid + (('le', bound),))} {cumulative}")
+        cumulative += h[len(LATENCY_BUCKETS)]
+        lines.append(f"{name}_bucket{_fmt_labels(labels, pid + (('le', '+Inf'),))} {cumulative}")
+        lines.append(f"{name}_sum{_fmt_labels(labels, pid)} {h[-1]:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(labels, pid)} {cumulative}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -0,0 +1,176 @@
+# utils/payroll_calc.py
+import math
+from array import array
+
+# NumPy is imported on the first columnar run rather than at import time:
+# single-employee routes never need it, and it is most of a worker's
+# import cost. False once it turned out to be missing.
+_np = None
+
+
+def _numpy():
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:  # fall back to array-backed columns
+            _np = False
+    return _np
+
+# -------------------------
+# PAYROLL RULES
+# -------------------------
+# gross = daily rate * days worked, where the daily rate is either given or
+#         monthly salary / DAYS_IN_MONTH
+# tax   = TAX_RATE_BP basis points of gross
+# net   = gross - tax
+#
+# All math is done on integers (rates in 1/10000 dollar, days in 1/100 day,
+# money in cents) and rounded half-up (ROUND_HALF_UP) exactly once per
+# amount, so there is no float drift and gross always equals tax + net to
+# the cent.
+DAYS_IN_MONTH = 30
+TAX_RATE_BP = 500  # 5%
+
+RATE_SCALE = 10000
+DAYS_SCALE = 100
+
+# A daily rate is carried as rate_num / (RATE_SCALE * DAYS_IN_MONTH) dollars
+# so salary / 30 stays exact. rate_num * days (in 1/DAYS_SCALE days) over
+# GROSS_DEN is then gross in cents.
+GROSS_DEN = RATE_SCALE * DAYS_IN_MONTH * DAYS_SCALE // 100
+RATE_CENTS_DEN = RATE_SCALE * DAYS_IN_MONTH // 100
+
+
+def _div_half_up(num, den):
+    """Integer num / den rounded half away from zero (scalars or int64 arrays)."""
+    if isinstance(num, int):
+        sign = -1 if num < 0 else 1
+        return sign * ((2 * abs(num) + den) // (2 * den))
+    return _np.sign(num) * ((2 * _np.abs(num) + den) // (2 * den))
+
+
+def _is_missing(value):
+    return value is None or value == "" or value != value  # None / blank / NaN
+
+
+def _checked(value, name):
+    """float(value), or ValueError unless it is a finite number >= 0."""
+    number = float(value)
+    # float() accepts "nan", "inf" and negatives; none of them can be scaled
+    if not math.isfinite(number) or number < 0:
+        raise ValueError(f"{name} must be a finite number >= 0, got {value!r}")
+    return number
+
+
+# -------------------------
+# COLUMNAR (VECTORIZED)
+# -------------------------
+def compute_payroll(days_worked, rate=None, salary=None):
+    """
+    Compute a whole run at once.
+
+    days_worked, rate and salary are equal-length sequences (lists or NumPy
+    arrays). A missing rate (None/NaN) falls back to salary / DAYS_IN_MONTH.
+    Raises ValueError if any days, rate or salary is infinite or negative,
+    or any days is NaN. Returns a dict of columns: rate, gross_pay, tax,
+    net_pay in dollars and gross_cents, tax_cents, net_cents as integers.
+    """
+    n = len(days_worked)
+    rate = [None] * n if rate is None else rate
+    salary = [0.0] * n if salary is None else salary
+
+    if _numpy():
+        return _compute_numpy(days_worked, rate, salary)
+    return _compute_arrays(days_worked, rate, salary)
+
+
+def _compute_numpy(days_worked, rate, salary):
+    np = _np
+    days = np.asarray(days_worked, dtype=np.float64)
+    rates = np.array([np.nan if _is_missing(r) else float(r) for r in rate], dtype=np.float64)
+    missing = np.isnan(rates)
+    salaries = np.asarray(salary, dtype=np.float64)
+    salaries = np.where(np.isnan(salaries), 0.0, salaries)
+
+    # checked before scaling: casting inf/NaN to int64 gives garbage
+    if not (np.isfinite(days).all() and (days >= 0).all()):
+        raise ValueError("days_worked must be finite numbers >= 0")
+    if not (np.isfinite(rates[~missing]).all() and (rates[~missing] >= 0).all()):
+        raise ValueError("rate must be finite numbers >= 0")
+    if not (np.isfinite(salaries).all() and (salaries >= 0).all()):
+        raise ValueError("salary must be finite numbers >= 0")
+    days = np.rint(days * DAYS_SCALE).astype(np.int64)
+
+    rate_num = np.where(
+        missing,
+        np.rint(salaries * RATE_SCALE),
+        np.rint(np.nan_to_num(rates) * RATE_SCALE) * DAYS_IN_MONTH,
+    ).astype(np.int64)
+    gross = _div_half_up(rate_num * days, GROSS_DEN)
+    tax = _div_half_up(gross * TAX_RATE_BP, 10000)
+    net = gross - tax
+    rate_cents = _div_half_up(rate_num, RATE_CENTS_DEN)
+
+    return {
+        "rate": rate_cents / 100.0,
+        "gross_pay": gross / 100.0,
+        "tax": tax / 100.0,
+        "net_pay": net / 100.0,
+        "gross_cents": gross,
+        "tax_cents": tax,
+        "net_cents": net,
+    }
+
+
+def _compute_arrays(days_worked, rate, salary):
+    rate_cents = array("q")
+    gross = array("q")
+    tax = array("q")
+    net = array("q")
+
+    for d, r, s in zip(days_worked, rate, salary):
+        days = int(round(_checked(d, "days_worked") * DAYS_SCALE))
+        if _is_missing(r):
+            rate_num = int(round(_checked(0 if _is_missing(s) else s, "salary") * RATE_SCALE))
+        else:
+            rate_num = int(round(_checked(r, "rate") * RATE_SCALE)) * DAYS_IN_MONTH
+
+        g = _div_half_up(rate_num * days, GROSS_DEN)
+        t = _div_half_up(g * TAX_RATE_BP, 10000)
+        rate_cents.append(_div_half_up(rate_num, RATE_CENTS_DEN))
+        gross.append(g)
+        tax.append(t)
+        net.append(g - t)
+
+    return {
+        "rate": [c / 100.0 for c in rate_cents],
+        "gross_pay": [c / 100.0 for c in gross],
+        "tax": [c / 100.0 for c in tax],
+        "net_pay": [c / 100.0 for c in net],
+        "gross_cents": gross,
+        "tax_cents": tax,
+        "net_cents": net,
+    }
+
+
+# -------------------------
+# SINGLE EMPLOYEE
+# -------------------------
+def compute_one(days_worked, rate=None, salary=None):
+    """
+    Scalar wrapper used by the single-employee routes. Returns plain floats.
+    Raises ValueError unless days, rate (if given) and salary are finite
+    numbers >= 0; a NaN rate is refused here rather than read as missing.
+    """
+    if rate is not None and rate != "":
+        _checked(rate, "rate")
+    # same integer math as compute_payroll, without NumPy for a single row
+    cols = _compute_arrays([days_worked], [rate], [salary or 0.0])
+    return {
+        "rate": float(cols["rate"][0]),
+        "gross_pay": float(cols["gross_pay"][0]),
+        "tax": float(cols["tax"][0]),
+        "net_pay": float(cols["net_pay"][0]),
+    }
@@ -0,0 +1,72 @@
+# utils/profiling.py
+import os
+import re
+import threading
+from datetime import datetime
+
+from config import Config
+
+# -------------------------
+# PER-REQUEST PROFILING
+# -------------------------
+# Off unless Config.PROFILE_ENABLED. When on, a request carrying the
+# Config.PROFILE_HEADER header, from a super_admin or with the
+# instrumentation token (checked in app.py), is profiled and the result is
+# written to Config.PROFILE_DIR: "<stamp>_<endpoint>.prof" (cProfile, open
+# with pstats or snakeviz) or, for "X-Profile: pyinstrument" when
+# pyinstrument is installed, an HTML call tree. One request is profiled at a time per
+# worker; others run normally while it is in progress.
+
+_busy = threading.Lock()
+
+
+class _Profile:
+    def __init__(self, kind, profiler):
+        self.kind = kind
+        self.profiler = profiler
+
+
+def start(mode):
+    """Start profiling the current request, or return None if not possible."""
+    if not Config.PROFILE_ENABLED or not _busy.acquire(blocking=False):
+        return None
+
+    try:
+        if mode.strip().lower() == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                pass
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return _Profile("pyinstrument", profiler)
+
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return _Profile("cprofile", profiler)
+    except Exception:
+        _busy.release()
+        raise
+
+
+def stop(profile, label):
+    """Stop `profile` and write it out. Returns the output path."""
+    try:
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        name = "{}_{}".format(datetime.now().strftime("%Y%m%d_%H%M%S_%f"),
+                              re.sub(r"[^A-Za-z0-9_.-]", "_", label or "request"))
+
+        if profile.kind == "pyinstrument":
+            profile.profiler.stop()
+            path = os.path.join(Config.PROFILE_DIR, name + ".html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profile.profiler.output_html())
+        else:
+            profile.profiler.disable()
+            path = os.path.join(Config.PROFILE_DIR, name + ".prof")
+            profile.profiler.dump_stats(path)
+        return path
+    finally:
+        _busy.release()
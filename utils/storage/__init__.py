@@ -0,0 +1,24 @@
+# utils/storage/__init__.py
+from config import Config
+from utils.storage.json_store import JsonStore
+from utils.storage.sqlite_store import SqliteStore
+
+
+def create_store(config=Config):
+    """Build the storage engine named by config.STORAGE_ENGINE ("json" or "sqlite")."""
+    json_store = JsonStore(
+        config.DATA_FILE,
+        config.JOURNAL_FILE,
+        journal_enabled=config.JOURNAL_ENABLED,
+        compact_bytes=config.JOURNAL_COMPACT_BYTES,
+        segments_dir=config.PAYROLL_SEGMENTS_DIR,
+    )
+
+    engine = (config.STORAGE_ENGINE or "json").lower()
+    if engine == "json":
+        return json_store
+    if engine == "sqlite":
+        # first start imports whatever the JSON store holds
+        return SqliteStore(config.SQLITE_FILE, seed=json_store)
+
+    raise ValueError(f"Unknown STORAGE_ENGINE: {config.STORAGE_ENGINE}")
@@ -0,0 +1,387 @@
+# utils/storage/base.py
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import date
+
+from utils.storage import journal
+from utils.storage.locking import FileLock
+from utils.storage.records import PayrollRecord, compact_rows, plain_row, reset_tables
+from utils.storage.schema import SchemaError, clean_amount, normalize_document, normalize_op
+from utils.storage.views import AdminIndex, PayrollAggregates, PayrollIndex, PayrollTimeline, id_num
+
+
+def empty_document():
+    return {"admins": [], "employees": [], "payroll": []}
+
+
+def copy_document(data):
+    # rows are flat (dicts, or PayrollRecords for payroll), so a per-row
+    # plain dict copy is enough to keep callers from mutating the shared cache
+    return {
+        key: [plain_row(r) for r in value] if isinstance(value, list) else value
+        for key, value in data.items()
+    }
+
+
+def compact_document(data):
+    """
+    Private copy of `data` for the cache: payroll rows become compact
+    PayrollRecords, other rows are shallow-copied dicts. Values shared with
+    the previous document are dropped first (see records.reset_tables).
+    """
+    reset_tables()
+    return {
+        key: (compact_rows(value) if key == "payroll" else [dict(r) for r in value])
+        if isinstance(value, list) else value
+        for key, value in data.items()
+    }
+
+
+def normalize_admins(data):
+    # ensure role present on data written before the schema layer
+    for admin in data.get("admins", []):
+        if "role" not in admin:
+            admin["role"] = "admin"
+    return data
+
+
+def normalize_salaries(data):
+    # salaries as floats in the cache even before migrate_data.py rewrote
+    # the file ("$500", "500 USD", missing); unreadable ones count as 0
+    for emp in data.get("employees", []):
+        salary = emp.get("salary")
+        if type(salary) is not float:
+            try:
+                emp["salary"] = clean_amount(salary, "salary", default=0.0)
+            except SchemaError:
+                emp["salary"] = 0.0
+    return data
+
+
+def month_bounds(year, month):
+    """ISO date strings [start, end) covering one calendar month."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+class BaseStore:
+    """
+    Shared in-process cache over a storage engine.
+
+    The parsed document is kept in memory and shared by every request in this
+    worker. On each read the engine is asked for a cheap stamp; the document
+    is only rebuilt when the stamp moved, and engines that can (the JSON
+    journal) catch up incrementally instead of reloading.
+
+    Engines implement:
+        _current_stamp()            -> cheap change token
+        _load()                     -> (document, stamp)
+        _catch_up(data, stamp)      -> new stamp, or None to force a reload
+        _persist(data, ops, stamp)  -> new stamp after writing `ops` and
+                                       applying them to `data`, or None when
+                                       someone else wrote in between
+        _replace(data)              -> stamp after a full rewrite
+
+    Engines apply ops to the cached document through _apply()/_replay() so
+    the derived views (aggregates, ...) stay in step without rescanning.
+
+    Every written row is canonicalized first (see schema.py); data written
+    before that is rewritten once with migrate_data.py.
+
+    Writes happen inside transaction(), which holds the in-process lock and
+    an exclusive fcntl lock on `lock_path`, so read-modify-write cycles
+    (e.g. allocating the next id) are atomic across gunicorn workers.
+    """
+
+    name = "base"
+    # errors worth retrying while another process is mid-write
+    retry_errors = (ValueError, OSError)
+    load_attempts = 5
+
+    def __init__(self, lock_path=None):
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(lock_path) if lock_path else None
+        self._txn_depth = 0
+        self._data = None
+        self._stamp = None
+        self.generation = 0
+
+        self.aggregates = PayrollAggregates()
+        self.indexes = PayrollIndex()
+        self.timeline = PayrollTimeline()
+        self.admins = AdminIndex()
+        self.views = [self.aggregates, self.indexes, self.timeline, self.admins]
+        self.positions = journal.RowPositions()
+
+    # -------------------------
+    # ENGINE HOOKS
+    # -------------------------
+    def _current_stamp(self):
+        raise NotImplementedError
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _catch_up(self, data, stamp):
+        return None
+
+    def _persist(self, data, ops, stamp):
+        raise NotImplementedError
+
+    def _replace(self, data):
+        raise NotImplementedError
+
+    # -------------------------
+    # VIEW MAINTENANCE
+    # -------------------------
+    def _apply(self, data, op):
+        if op["table"] == "payroll" and "row" in op:
+            # the cache holds compact records; views see the same object
+            op = dict(op, row=PayrollRecord.from_dict(op["row"]))
+        removed = journal.apply(data, op, self.positions)
+        for view in self.views:
+            view.apply(op, removed)
+        return removed
+
+    def _replay(self, data, ops):
+        return journal.replay(data, ops, apply_fn=self._apply, positions=self.positions)
+
+    def _rebuild_views(self, data):
+        self.positions.rebuild(data)
+        for view in self.views:
+            view.rebuild(data)
+
+    # -------------------------
+    # CACHE
+    # -------------------------
+    @property
+    def lock(self):
+        return self._lock
+
+    @contextmanager
+    def transaction(self):
+        """
+        Exclusive section for read-modify-write. Yields the freshly
+        revalidated document; commits inside it see no foreign writes.
+        Re-entrant within a thread.
+        """
+        with self._lock:
+            outer = self._txn_depth == 0
+            if outer and self._file_lock:
+                self._file_lock.acquire()
+            self._txn_depth += 1
+            try:
+                yield self.document()
+            finally:
+                self._txn_depth -= 1
+                if outer and self._file_lock:
+                    self._file_lock.release()
+
+    def _shared(self):
+        """Shared cross-process lock for reads (no-op inside a transaction)."""
+        if self._file_lock is None or self._txn_depth:
+            return nullcontext()
+
+        @contextmanager
+        def held():
+            self._file_lock.acquire(shared=True)
+            try:
+                yield
+            finally:
+                self._file_lock.release()
+
+        return held()
+
+    def _load_with_retry(self):
+        delay = 0.01
+        for attempt in range(self.load_attempts):
+            try:
+                with self._shared():
+                    return self._load()
+            except self.retry_errors:
+                if attempt == self.load_attempts - 1:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def document(self):
+        """Return the shared, parsed document (read-only)."""
+        stamp = self._current_stamp()
+
+        with self._lock:
+            if self._data is not None:
+                if self._stamp == stamp:
+                    return self._data
+
+                with self._shared():
+                    new_stamp = self._catch_up(self._data, self._stamp)
+                if new_stamp is not None:
+                    self._stamp = new_stamp
+                    self.generation += 1
+                    return self._data
+
+            # a failed load raises instead of pretending the store is empty,
+            # so a later write can never clobber real data
+            data, stamp = self._load_with_retry()
+
+            self._data = normalize_salaries(normalize_admins(compact_document(data)))
+            self._stamp = stamp
+            self._rebuild_views(self._data)
+            self.generation += 1
+            return self._data
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+            self._stamp = None
+
+    def commit(self, op):
+        """Persist a single mutation and apply it to the cached document."""
+        self.commit_many([op])
+
+    def commit_many(self, ops):
+        """
+        Persist several mutations as one write (one journal append / one SQL
+        transaction). Rows are canonicalized first; a bad row raises
+        SchemaError before anything is written.
+        """
+        ops = [normalize_op(op) for op in ops]
+        if not ops:
+            return
+
+        with self.transaction() as data:
+            new_stamp = self._persist(data, ops, self._stamp)
+            if new_stamp is None:
+                # another process wrote in between; re-sync on next read
+                self.document()
+            else:
+                self._stamp = new_stamp
+                self.generation += 1
+
+    def replace(self, data):
+        """Rewrite the whole document (canonicalized; raises SchemaError)."""
+        data = normalize_document(data)
+        with self.transaction():
+            self._stamp = self._replace(data)
+            self._data = normalize_salaries(normalize_admins(compact_document(data)))
+            self._rebuild_views(self._data)
+            self.generation += 1
+
+    # -------------------------
+    # QUERIES
+    # -------------------------
+    # Defaults are dictionary lookups on the in-memory indexes; engines with
+    # their own indexes (SQLite) may override.
+    def get_admin(self, username):
+        with self._lock:
+            self.document()
+            admin = self.admins.by_username.get(username)
+            return dict(admin) if admin else None
+
+    def admin_token(self, revalidate=True):
+        """Current AdminIndex token; revalidate=False skips the stamp check."""
+        if revalidate:
+            with self._lock:
+                self.document()
+        return self.admins.token
+
+    def get_employee(self, employee_id):
+        with self._lock:
+            self.document()
+            emp = self.indexes.employees.get(str(employee_id))
+            return dict(emp) if emp else None
+
+    def payroll_for_employee(self, employee_id):
+        with self._lock:
+            self.document()
+            return [plain_row(r) for r in self.indexes.by_employee.get(str(employee_id), [])]
+
+    def payroll_for_month(self, year, month):
+        with self._lock:
+            self.document()
+            return list(self.indexes.by_month.get((year, month), []))
+
+    def payroll_page(self, limit=50, before=None, date_from=None, date_to=None,
+                     employee_id=None, department=None, copy=True):
+        """
+        One page of payroll history, newest first, using keyset pagination.
+        `before` is the (date, id) of the last record on the previous page.
+        copy=False returns the cached (read-only) rows instead of dicts.
+        Returns (records, has_more).
+        """
+        with self._lock:
+            self.document()
+
+            dept_ids = None
+            if department:
+                wanted = department.strip().lower()
+                dept_ids = {
+                    key for key, e in self.indexes.employees.items()
+                    if str(e.get("department") or "").strip().lower() == wanted
+                }
+
+            def match(r):
+                if employee_id is not None and str(r.get("employee_id")) != str(employee_id):
+                    return False
+                if dept_ids is not None and str(r.get("employee_id")) not in dept_ids:
+                    return False
+                return True
+
+            if employee_id is not None:
+                # small bucket: sort just this employee's records
+                records = sorted(
+                    self.indexes.by_employee.get(str(employee_id), []),
+                    key=lambda r: (str(r.get("date") or ""), id_num(r.get("id"))),
+                    reverse=True,
+                )
+                rows = []
+                for r in records:
+                    key = (str(r.get("date") or ""), id_num(r.get("id")))
+                    if before is not None and key >= tuple(before):
+                        continue
+                    if date_to and key[0][:len(date_to)] > date_to:
+                        continue
+                    if date_from and key[0] < date_from:
+                        break
+                    rows.append(r)
+                    if len(rows) > limit:
+                        break
+            else:
+                rows = self.timeline.page(limit + 1, before, date_from, date_to,
+                                          match if dept_ids is not None else None)
+
+            rows, has_more = rows[:limit], len(rows) > limit
+            return ([plain_row(r) for r in rows] if copy else rows), has_more
+
+    def next_id(self, table):
+        """Next free id for employees/payroll (call inside transaction())."""
+        with self._lock:
+            self.document()
+            return self.indexes.max_id[table] + 1
+
+    def paid_in_month(self, employee_id, year, month):
+        with self._lock:
+            self.document()
+            return str(employee_id) in self.indexes.paid.get((year, month), {})
+
+    def paid_employee_ids(self, year, month):
+        """Set of employee ids (as str) with a payroll record in the month."""
+        with self._lock:
+            self.document()
+            return set(self.indexes.paid.get((year, month), {}))
+
+    def after_fork(self):
+        """
+        Reset per-process state in a forked worker. The cached document and
+        views are kept (shared copy-on-write with the parent); locks are
+        recreated so none can be inherited in a held state.
+        """
+        self._lock = threading.RLock()
+        self._txn_depth = 0
+        if self._file_lock:
+            self._file_lock = FileLock(self._file_lock.path, self._file_lock.timeout)
+
+    def close(self):
+        pass
@@ -0,0 +1,204 @@
+# utils/storage/journal.py
+import json
+import os
+from array import array
+
+# -------------------------
+# JOURNAL FORMAT
+# -------------------------
+# One compact JSON object per line:
+#   {"op": "insert", "table": "payroll", "row": {...}}
+#   {"op": "update", "table": "employees", "row": {...}}
+#   {"op": "delete", "table": "admins", "key": "someone"}
+# Rows are matched on the table's key field. Replaying an entry that is
+# already part of the snapshot is harmless (inserts act as upserts), so a
+# crash between writing a snapshot and truncating the journal loses nothing.
+TABLE_KEYS = {"admins": "username", "employees": "id", "payroll": "id"}
+
+
+def _key(value):
+    # ids are stored as int or str depending on who wrote them
+    return str(value)
+
+
+def encode(op):
+    return json.dumps(op, separators=(",", ":"), ensure_ascii=False) + "\n"
+
+
+def append(path, ops):
+    """Append entries in a single write and return the new end-of-file offset."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "ab") as f:
+        f.write("".join(encode(op) for op in ops).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def read_from(path, offset=0):
+    """
+    Return (ops, new_offset) for every complete line after `offset`.
+    A trailing partial line (a writer mid-append) is left for the next read.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+    except FileNotFoundError:
+        return [], 0
+
+    end = chunk.rfind(b"\n") + 1
+    ops = []
+    for line in chunk[:end].splitlines():
+        if line.strip():
+            ops.append(json.loads(line))
+
+    return ops, offset + end
+
+
+# -------------------------
+# APPLYING ENTRIES
+# -------------------------
+DENSE_IDS = 1 << 22   # integer keys below this get an array slot (4 bytes each)
+
+
+class _TablePositions:
+    """
+    Key -> list position for one table. Non-negative integer keys (all ids
+    written since the schema layer) index an array, so a million rows cost
+    a few MB instead of a dict entry each; other keys go to a dict.
+    """
+
+    def __init__(self, rows, field):
+        self.dense = array("i")
+        self.other = {}
+        for i, r in enumerate(rows):
+            self[r.get(field)] = i
+
+    @staticmethod
+    def _slot(key):
+        # an int slot for keys whose _key() is the decimal form of an int
+        if type(key) is str and key.isdigit() and (key == "0" or key[0] != "0"):
+            key = int(key)
+        if type(key) is int and 0 <= key < DENSE_IDS:
+            return key
+        return None
+
+    def get(self, key):
+        slot = self._slot(key)
+        if slot is None:
+            return self.other.get(_key(key))
+        if slot < len(self.dense) and self.dense[slot] >= 0:
+            return self.dense[slot]
+        return None
+
+    def __setitem__(self, key, position):
+        slot = self._slot(key)
+        if slot is None:
+            self.other[_key(key)] = position
+            return
+        if slot >= len(self.dense):
+            # all-ones bytes are -1, i.e. no row
+            grow = max(slot + 1, 2 * len(self.dense)) - len(self.dense)
+            self.dense.frombytes(b"\xff" * (grow * self.dense.itemsize))
+        self.dense[slot] = position
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class RowPositions:
+    """
+    Key -> list position of every row, per table, so entries find their row
+    (and replay tells inserts from upserts) without scanning the table.
+    Kept in step by apply(); a delete renumbers its table, which is O(rows)
+    but rare.
+    """
+
+    def __init__(self, data=None):
+        self.tables = {}
+        self.rebuild(data or {})
+
+    def rebuild(self, data):
+        for table in TABLE_KEYS:
+            self.rebuild_table(table, data.get(table, []))
+
+    def rebuild_table(self, table, rows):
+        self.tables[table] = _TablePositions(rows, TABLE_KEYS[table])
+
+    def __contains__(self, item):
+        table, key = item
+        return key in self.tables[table]
+
+
+def apply(data, op, positions=None):
+    """
+    Apply a single live entry to the in-memory document.
+    Returns the rows it replaced or removed ([] for an insert), or None when
+    the entry matched nothing and the document is unchanged. `positions`
+    (kept up to date here) replaces the linear search for the row.
+    """
+    table = op["table"]
+    field = TABLE_KEYS[table]
+    rows = data.setdefault(table, [])
+    where = positions.tables[table] if positions is not None else None
+
+    if op["op"] == "insert":
+        if where is not None:
+            where[op["row"].get(field)] = len(rows)
+        rows.append(op["row"])
+        return []
+
+    if op["op"] == "update":
+        key = _key(op["row"].get(field))
+        if where is not None:
+            i = where.get(op["row"].get(field))
+            if i is None:
+                return None
+            old = rows[i]
+            rows[i] = op["row"]
+            return [old]
+        for i in range(len(rows) - 1, -1, -1):
+            if _key(rows[i].get(field)) == key:
+                old = rows[i]
+                rows[i] = op["row"]
+                return [old]
+        return None
+
+    if op["op"] == "delete":
+        key = _key(op["key"])
+        if where is not None and op["key"] not in where:
+            return None
+        kept = []
+        removed = []
+        for r in rows:
+            (removed if _key(r.get(field)) == key else kept).append(r)
+        if not removed:
+            return None
+        data[table] = kept
+        if positions is not None:
+            positions.rebuild_table(table, kept)
+        return removed
+
+    raise ValueError(f"Unknown journal op: {op['op']}")
+
+
+def replay(data, ops, apply_fn=None, positions=None):
+    """
+    Apply entries read back from disk, treating inserts as upserts.
+    `apply_fn(data, op)` lets the store observe each applied entry; it must
+    keep `positions` (built from `data` when not given) up to date, as
+    apply(data, op, positions) does.
+    """
+    if positions is None:
+        positions = RowPositions(data)
+    if apply_fn is None:
+        def apply_fn(doc, op):
+            return apply(doc, op, positions)
+
+    for op in ops:
+        table = op["table"]
+        if op["op"] == "insert" and (table, op["row"].get(TABLE_KEYS[table])) in positions:
+            op = {"op": "update", "table": table, "row": op["row"]}
+        apply_fn(data, op)
+    return data
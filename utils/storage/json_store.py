@@ -0,0 +1,370 @@
+# utils/storage/json_store.py
+import json
+import os
+import threading
+
+from utils.storage import journal, segments
+from utils.storage.base import BaseStore, copy_document, empty_document
+from utils.storage.locking import atomic_write
+from utils.metrics import inc
+
+BYTES_READ = "payroll_storage_bytes_read_total"
+BYTES_WRITTEN = "payroll_storage_bytes_written_total"
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class JsonStore(BaseStore):
+    """
+    JSON snapshot + append-only journal.
+
+    With journaling on, mutations append one compact line to `journal_file`
+    instead of rewriting `data_file`. `data_file` is the snapshot and is
+    rewritten in the background once the journal passes `compact_bytes`.
+    The cache stamp is (snapshot stamp, (journal inode, replayed offset)),
+    so journal growth is replayed from the last offset instead of reloading.
+
+    With `segments_dir`, the snapshot is split: payroll rows live in month
+    segments under that directory (see segments.py) and `data_file` holds
+    the other tables. The snapshot stamp then also covers the segment
+    manifest. Journal entries mark the months they touch, and compaction
+    rewrites only those segments. A `data_file` that still holds the
+    payroll table (written before segments) is read as is and split up by
+    the next compaction or full rewrite.
+
+    Snapshot, segment and journal rewrites go through atomic_write (temp
+    file, fsync, os.replace); appends and compaction hold the exclusive lock
+    on `<data_file>.lock`.
+    """
+
+    name = "json"
+
+    def __init__(self, data_file, journal_file, journal_enabled=True,
+                 compact_bytes=1024 * 1024, segments_dir=None):
+        super().__init__(lock_path=data_file + ".lock")
+        self.data_file = data_file
+        self.journal_file = journal_file
+        self.journal_enabled = journal_enabled
+        self.compact_bytes = compact_bytes
+        self.segments_dir = segments_dir
+        self._compacting = threading.Event()
+        self._manifest = None   # segment manifest the cache was loaded from
+        self._dirty = set()     # segments that differ from the cache
+
+    @property
+    def legacy_layout(self):
+        """True while payroll rows still live in data_file (written before segments)."""
+        with self._lock:
+            self.document()
+            return bool(self.segments_dir) and self._manifest is None
+
+    def after_fork(self):
+        super().after_fork()
+        # a compaction thread of the parent does not exist here
+        self._compacting = threading.Event()
+
+    # -------------------------
+    # STAMPS
+    # -------------------------
+    def _journal_stamp(self):
+        stamp = _file_stamp(self.journal_file)
+        if stamp is None:
+            return None
+        return (stamp[0], stamp[2])
+
+    def _snapshot_stamp(self):
+        snap = _file_stamp(self.data_file)
+        if self.segments_dir:
+            return (snap, _file_stamp(os.path.join(self.segments_dir, segments.MANIFEST)))
+        return snap
+
+    def _current_stamp(self):
+        return (self._snapshot_stamp(), self._journal_stamp())
+
+    # -------------------------
+    # LOAD
+    # -------------------------
+    def _load(self):
+        snap = self._snapshot_stamp()
+        stamp = _file_stamp(self.data_file)
+        if stamp is None:
+            data = empty_document()
+        else:
+            with open(self.data_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            inc(BYTES_READ, stamp[2], file="snapshot")
+
+        manifest = segments.read_manifest(self.segments_dir) if self.segments_dir else None
+        dirty = set()
+        if manifest is not None:
+            data["payroll"] = []
+            for entry in manifest["segments"].values():
+                data["payroll"].extend(segments.read_segment(self.segments_dir, entry))
+                inc(BYTES_READ, entry["bytes"], file="segment")
+        elif self.segments_dir:
+            # payroll is still in data_file: every month is yet to be written
+            dirty = set(segments.group_by_month(data.get("payroll", [])))
+
+        positions = journal.RowPositions(data)
+
+        def fold(doc, op):
+            removed = journal.apply(doc, op, positions)
+            dirty.update(segments.touched(op, removed))
+
+        ops, offset = journal.read_from(self.journal_file)
+        inc(BYTES_READ, offset, file="journal")
+        journal.replay(data, ops, apply_fn=fold, positions=positions)
+
+        jstamp = self._journal_stamp()
+        if jstamp is not None:
+            jstamp = (jstamp[0], offset)
+
+        self._manifest, self._dirty = manifest, dirty
+        return data, (snap, jstamp)
+
+    def _catch_up(self, data, stamp):
+        """Replay only the journal lines appended since `stamp`."""
+        snap, cached = stamp
+        current = self._journal_stamp()
+
+        if snap != self._snapshot_stamp():
+            return None
+        if cached is None or current is None or cached[0] != current[0] or current[1] < cached[1]:
+            return None
+
+        ops, offset = journal.read_from(self.journal_file, cached[1])
+        inc(BYTES_READ, offset - cached[1], file="journal")
+        self._replay(data, ops)
+        return (snap, (cached[0], offset))
+
+    # -------------------------
+    # MONTH QUERIES
+    # -------------------------
+    # A loaded cache answers from its indexes. Before that (a cold process,
+    # a tool), a month is read from its own segment plus the journal
+    # instead of loading the whole history.
+    def _read_month(self, year, month):
+        """Rows of one month straight from disk, or None to use the cache."""
+        if not self.segments_dir or self._data is not None:
+            return None
+
+        key = segments.period_key(year, month)
+        with self._lock, self._shared():
+            manifest = segments.read_manifest(self.segments_dir)
+            if manifest is None or self._data is not None:
+                return None
+            entry = manifest["segments"].get(key)
+            rows = segments.read_segment(self.segments_dir, entry) if entry else []
+            ops, offset = journal.read_from(self.journal_file)
+        inc(BYTES_READ, entry["bytes"] if entry else 0, file="segment")
+        inc(BYTES_READ, offset, file="journal")
+        return segments.fold_month(rows, ops, key)
+
+    def payroll_for_month(self, year, month):
+        rows = self._read_month(year, month)
+        if rows is None:
+            return super().payroll_for_month(year, month)
+        return rows
+
+    def paid_employee_ids(self, year, month):
+        rows = self._read_month(year, month)
+        if rows is None:
+            return super().paid_employee_ids(year, month)
+        return {str(r.get("employee_id")) for r in rows}
+
+    def paid_in_month(self, employee_id, year, month):
+        if not self.segments_dir or self._data is not None:
+            return super().paid_in_month(employee_id, year, month)
+        return str(employee_id) in self.paid_employee_ids(year, month)
+
+    # -------------------------
+    # WRITE
+    # -------------------------
+    def _apply(self, data, op):
+        removed = super()._apply(data, op)
+        if self.segments_dir:
+            self._dirty.update(segments.touched(op, removed))
+        return removed
+
+    def _write_snapshot(self, payload):
+        payload = payload.encode("utf-8") if isinstance(payload, str) else payload
+        atomic_write(self.data_file, payload)
+        inc(BYTES_WRITTEN, len(payload), file="snapshot")
+
+    def _write_segments(self, by_month):
+        """
+        Write segment files for {segment: rows}. Returns {segment: manifest
+        entry, or None for a month with no rows left}; nothing refers to the
+        new files until _switch_manifest().
+        """
+        entries = {}
+        for key, rows in by_month.items():
+            entries[key] = None
+            if rows:
+                entries[key], written = segments.write_segment(self.segments_dir, key, rows)
+                inc(BYTES_WRITTEN, written, file="segment")
+        return entries
+
+    def _switch_manifest(self, updates):
+        """Replace the manifest; months not in `updates` keep their segment."""
+        entries = dict(self._manifest["segments"]) if self._manifest else {}
+        for key, entry in updates.items():
+            if entry is None:
+                entries.pop(key, None)
+            else:
+                entries[key] = entry
+        self._manifest = segments.write_manifest(self.segments_dir, entries)
+
+    def _dump(self, data):
+        """The snapshot payload for data_file (without payroll when segmented)."""
+        if self.segments_dir:
+            data = {key: value for key, value in data.items() if key != "payroll"}
+        # default=dict: cached payroll rows are PayrollRecord mappings
+        return json.dumps(data, indent=4, ensure_ascii=False, default=dict)
+
+    def _write_document(self, data, months=None):
+        """
+        Write `data` as the new snapshot. With segments, only the payroll
+        months in `months` are rewritten (None: all of them); the manifest
+        is replaced before data_file, so a crash in between leaves the new
+        payroll with the previous admins/employees plus the journal.
+        """
+        if self.segments_dir:
+            by_month = segments.group_by_month(data.get("payroll", []))
+            if months is not None:
+                by_month = {key: by_month.get(key, []) for key in months}
+            elif self._manifest:
+                # months that no longer have rows
+                by_month.update((key, []) for key in self._manifest["segments"] if key not in by_month)
+            self._switch_manifest(self._write_segments(by_month))
+            self._dirty = set() if months is None else self._dirty - set(months)
+
+        self._write_snapshot(self._dump(data))
+
+        if self.segments_dir:
+            segments.sweep(self.segments_dir, self._manifest)
+
+    def _replace(self, data):
+        # retire the journal before the new snapshot lands: a crash in
+        # between leaves the old snapshot on its own (an older consistent
+        # state), never old journal entries replayed over new data
+        retired = self.journal_file + ".retired"
+        if os.path.exists(self.journal_file):
+            os.replace(self.journal_file, retired)
+        self._write_document(data)
+        if os.path.exists(retired):
+            os.remove(retired)
+        return self._current_stamp()
+
+    def _persist(self, data, ops, stamp):
+        if not self.journal_enabled:
+            # legacy mode: rewrite the snapshot (only the touched months)
+            for op in ops:
+                self._apply(data, op)
+            self._write_document(data, set(self._dirty) if self.segments_dir else None)
+            return self._current_stamp()
+
+        snap, cached = stamp
+        start = cached[1] if cached else 0
+        size = sum(len(journal.encode(op).encode("utf-8")) for op in ops)
+        offset = journal.append(self.journal_file, ops)
+        inc(BYTES_WRITTEN, size, file="journal")
+
+        if offset > self.compact_bytes and not self._compacting.is_set():
+            self._compacting.set()
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+        if offset - size != start:
+            # another process appended in between; replay from where we were
+            return None
+
+        for op in ops:
+            self._apply(data, op)
+        return (snap, (self._journal_stamp()[0], offset))
+
+    # -------------------------
+    # COMPACTION
+    # -------------------------
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        finally:
+            self._compacting.clear()
+
+    def _month_rows(self, key):
+        """Cached rows of one segment (call under the lock)."""
+        if key == segments.UNDATED:
+            return [r for r in self._data.get("payroll", []) if r.day is None]
+        year, month = key.split("-")
+        return list(self.indexes.by_month.get((int(year), int(month)), []))
+
+    def compact(self):
+        """
+        Fold the journal into a fresh snapshot. The snapshot is serialized
+        outside the lock; anything appended meanwhile is carried over into
+        the new journal. With segments, only the months the journal touched
+        are written, also outside the lock (new segment files are unused
+        until the manifest is replaced).
+        """
+        with self._lock:
+            data = self.document()
+            if self._stamp is None or self._stamp[1] is None:
+                return False
+            snap, (ino, offset) = self._stamp
+
+            months = set()
+            if self.segments_dir:
+                months, self._dirty = self._dirty, set()
+                by_month = {key: self._month_rows(key) for key in months}
+                data = {key: value for key, value in data.items() if key != "payroll"}
+            data = copy_document(data)
+
+        done = False
+        try:
+            payload = self._dump(data)
+            updates = self._write_segments(by_month) if self.segments_dir else {}
+
+            with self.transaction():
+                if self._stamp[0] != snap or self._stamp[1] is None or self._stamp[1][0] != ino:
+                    # another worker compacted first
+                    return False
+
+                replayed = self._stamp[1][1] - offset
+                tail = b""
+                if os.path.exists(self.journal_file):
+                    with open(self.journal_file, "rb") as f:
+                        f.seek(offset)
+                        tail = f.read()
+
+                if self.segments_dir:
+                    self._switch_manifest(updates)
+                self._write_snapshot(payload)
+                if self.segments_dir:
+                    segments.sweep(self.segments_dir, self._manifest)
+
+                if tail:
+                    atomic_write(self.journal_file, tail)
+                    inc(BYTES_WRITTEN, len(tail), file="journal")
+                elif os.path.exists(self.journal_file):
+                    os.remove(self.journal_file)
+
+                # the in-memory document already includes the replayed part of
+                # the carried-over tail
+                jstamp = self._journal_stamp()
+                if jstamp is not None:
+                    jstamp = (jstamp[0], replayed)
+                self._stamp = (self._snapshot_stamp(), jstamp)
+                done = True
+        finally:
+            if not done:
+                # still to be written by the next compaction
+                with self._lock:
+                    self._dirty |= months
+
+        return True
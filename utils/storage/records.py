@@ -0,0 +1,223 @@
+# utils/storage/records.py
+from collections.abc import Mapping
+from datetime import date, datetime
+
+# -------------------------
+# COMPACT PAYROLL RECORDS
+# -------------------------
+# The cached document holds payroll rows as PayrollRecord objects instead of
+# dicts. A record has one slot per standard field, holding the value exactly
+# as stored, plus typed slots parsed once on load: amounts as integer cents
+# and the date as a day ordinal. Values many rows share (employee ids,
+# names, rates, amounts, dates, the key order) are stored once. The views
+# read the typed slots directly, so they never re-parse dates or amounts.
+#
+# The sharing and parse tables below belong to the document being cached:
+# reset_tables() empties them whenever a whole document is (re)built, and a
+# table that reaches INTERN_LIMIT entries is emptied on the spot, so values
+# from old documents, or an endless stream of distinct amounts, are not kept
+# for the life of the process. Emptying a table only loses sharing with
+# records built earlier; it never changes a value.
+#
+# Records are read-only Mappings: r["gross_pay"], r.get("date") and
+# r.to_dict() give back the original keys, in their original order, with
+# their original values (unknown keys are kept in `_extra`). Being
+# immutable, they can be handed out without copying.
+
+FIELDS = ("employee_id", "employee_name", "days_worked", "rate",
+          "gross_pay", "tax", "net_pay", "date", "id")
+_FIELD_SET = frozenset(FIELDS)
+
+INTERN_LIMIT = 1 << 16
+
+_key_orders = {FIELDS: (FIELDS, ())}   # keys -> (shared tuple, unknown keys)
+_ints = {}
+_floats = {}
+_strs = {}
+_cents_cache = {}     # float amount -> cents
+_days = {}            # date string -> day ordinal (or None)
+_iso = {}             # day ordinal -> "YYYY-MM-DD"
+_months = {}          # day ordinal -> (year, month)
+_TABLES = (_key_orders, _ints, _floats, _strs, _cents_cache, _days, _iso, _months)
+_new = object.__new__
+_MISS = object()
+
+
+def reset_tables():
+    """Forget every shared value and parse result (a new document is built)."""
+    for table in _TABLES:
+        table.clear()
+    _key_orders[FIELDS] = (FIELDS, ())
+
+
+def _store(table, key, value):
+    if len(table) >= INTERN_LIMIT:
+        table.clear()
+        if table is _key_orders:
+            _key_orders[FIELDS] = (FIELDS, ())
+    table[key] = value
+    return value
+
+
+def _intern(table, value):
+    found = table.get(value, _MISS)
+    return _store(table, value, value) if found is _MISS else found
+
+
+def _shared(value):
+    """One object per distinct int/float/str value."""
+    t = type(value)
+    if t is int:
+        return _intern(_ints, value)
+    if t is float:
+        return _intern(_floats, value)
+    if t is str:
+        return _intern(_strs, value)
+    return value
+
+
+def to_cents(value):
+    """Integer cents for an amount (number or numeric string), or None."""
+    if type(value) is float:
+        cents = _cents_cache.get(value)
+        if cents is not None:
+            return cents
+    try:
+        cents = int(round(float(value) * 100))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    cents = _intern(_ints, cents)
+    if type(value) is float:
+        _store(_cents_cache, value, cents)
+    return cents
+
+
+def to_day(value):
+    """Day ordinal for an ISO date/datetime string, or None."""
+    if type(value) is str:
+        day = _days.get(value, _MISS)
+        if day is not _MISS:
+            return day
+    try:
+        day = datetime.fromisoformat(str(value)).toordinal()
+    except (TypeError, ValueError):
+        day = None
+    if day is not None:
+        day = _intern(_ints, day)
+    if type(value) is str:
+        _store(_days, value, day)
+    return day
+
+
+def iso_date(day):
+    text = _iso.get(day)
+    if text is None:
+        text = _store(_iso, day, date.fromordinal(day).isoformat())
+    return text
+
+
+def day_month(day):
+    """(year, month) for a day ordinal."""
+    key = _months.get(day)
+    if key is None:
+        d = date.fromordinal(day)
+        key = _store(_months, day, (d.year, d.month))
+    return key
+
+
+class PayrollRecord(Mapping):
+    __slots__ = FIELDS + ("gross_cents", "tax_cents", "net_cents", "day", "_keys", "_extra")
+
+    @classmethod
+    def from_dict(cls, row):
+        keys = tuple(row)
+        order = _key_orders.get(keys)
+        if order is None:
+            order = _store(_key_orders, keys, (keys, tuple(k for k in keys if k not in _FIELD_SET)))
+        keys, unknown = order
+
+        get = row.get
+        gross, tax, net, when = get("gross_pay"), get("tax"), get("net_pay"), get("date")
+
+        r = _new(cls)
+        r.id = get("id")
+        r.employee_id = _shared(get("employee_id"))
+        r.employee_name = _shared(get("employee_name"))
+        r.days_worked = _shared(get("days_worked"))
+        r.rate = _shared(get("rate"))
+        r.gross_pay = _shared(gross)
+        r.tax = _shared(tax)
+        r.net_pay = _shared(net)
+        r.date = _shared(when)
+        r.gross_cents = to_cents(gross)
+        r.tax_cents = to_cents(tax)
+        r.net_cents = to_cents(net)
+        r.day = to_day(when)
+        r._keys = keys
+        r._extra = {k: row[k] for k in unknown} if unknown else None
+        return r
+
+    @property
+    def month(self):
+        """(year, month) of the record's date, or None."""
+        return day_month(self.day) if self.day is not None else None
+
+    # -------------------------
+    # MAPPING
+    # -------------------------
+    def __getitem__(self, key):
+        if key in _FIELD_SET and key in self._keys:
+            return getattr(self, key)
+        extra = self._extra
+        if extra is not None and key in extra:
+            return extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            # absent standard fields hold None
+            if default is None or key in self._keys:
+                return getattr(self, key)
+            return default
+        extra = self._extra
+        return extra.get(key, default) if extra is not None else default
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def to_dict(self):
+        if self._keys is FIELDS:
+            return {
+                "employee_id": self.employee_id,
+                "employee_name": self.employee_name,
+                "days_worked": self.days_worked,
+                "rate": self.rate,
+                "gross_pay": self.gross_pay,
+                "tax": self.tax,
+                "net_pay": self.net_pay,
+                "date": self.date,
+                "id": self.id,
+            }
+        return {key: self[key] for key in self._keys}
+
+    def __repr__(self):
+        return f"PayrollRecord({self.to_dict()!r})"
+
+    def __reduce__(self):
+        # pickled (e.g. to payslip worker processes) as a plain dict
+        return (PayrollRecord.from_dict, (self.to_dict(),))
+
+
+def plain_row(row):
+    """A plain dict copy of a cached row (PayrollRecord or dict)."""
+    return row.to_dict() if type(row) is PayrollRecord else dict(row)
+
+
+def compact_rows(rows):
+    return [r if type(r) is PayrollRecord else PayrollRecord.from_dict(r) for r in rows]
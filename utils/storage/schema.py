@@ -0,0 +1,227 @@
+# utils/storage/schema.py
+import math
+from datetime import date, datetime
+
+from utils.storage.records import FIELDS as PAYROLL_FIELDS
+
+# -------------------------
+# CANONICAL RECORDS
+# -------------------------
+# Every row is validated and canonicalized once, when it is written
+# (BaseStore.commit_many / replace), so readers can rely on the types:
+#
+#   admins     username str, password str, role one of ROLES
+#   employees  id int, name str, department str, salary float (2 dp)
+#   payroll    id int, employee_id int, employee_name str,
+#              days_worked int (float only if fractional), rate float
+#              (daily rate, 2 dp, as payroll_calc computes it),
+#              gross_pay / tax / net_pay float (2 dp), date "YYYY-MM-DD"
+#
+# Numbers must be finite; days_worked must also be >= 0.
+#
+# Older data used salary strings ("$500", "500 USD", "L$500"), ids as str,
+# "daily_rate" instead of "rate" and assorted date formats; all of those are
+# accepted here and rewritten. Fields in the table layout come first, in
+# this order; unknown keys are kept after them. migrate_data.py rewrites
+# existing data and backups into this form.
+
+ROLES = ("viewer", "admin", "super_admin")
+
+EMPLOYEE_FIELDS = ("name", "department", "salary", "id")
+
+_CURRENCY_MARKS = ("L$", "USD", "usd", "$", ",", " ")
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%d %b %Y", "%d %B %Y",
+                 "%b %d, %Y", "%B %d, %Y")
+
+
+class SchemaError(ValueError):
+    """A record that cannot be brought into canonical form."""
+
+
+# -------------------------
+# FIELD CONVERTERS
+# -------------------------
+def clean_id(value, field="id"):
+    if type(value) is int:
+        return value
+    try:
+        number = float(str(value).strip())
+    except (TypeError, ValueError):
+        raise SchemaError(f"{field}: not an id: {value!r}") from None
+    if not number.is_integer():
+        raise SchemaError(f"{field}: not an id: {value!r}")
+    return int(number)
+
+
+def clean_amount(value, field="amount", default=None, places=2):
+    """Money as a float rounded to `places`; accepts "$1,200", "500 USD", "L$500"."""
+    if value is None or value == "":
+        if default is None:
+            raise SchemaError(f"{field}: missing")
+        return default
+    if type(value) is bool:
+        raise SchemaError(f"{field}: not an amount: {value!r}")
+    if type(value) is not float and type(value) is not int:
+        text = str(value)
+        for mark in _CURRENCY_MARKS:
+            text = text.replace(mark, "")
+        value = text
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise SchemaError(f"{field}: not an amount: {value!r}") from None
+    if not math.isfinite(number):
+        raise SchemaError(f"{field}: not a finite amount: {value!r}")
+    return number if places is None else round(number, places)
+
+
+def clean_days(value):
+    try:
+        days = float(value)
+    except (TypeError, ValueError):
+        raise SchemaError(f"days_worked: not a number: {value!r}") from None
+    if not math.isfinite(days):
+        raise SchemaError(f"days_worked: not a finite number: {value!r}")
+    if days < 0:
+        raise SchemaError(f"days_worked: negative: {value!r}")
+    return int(days) if days.is_integer() else days
+
+
+def clean_date(value):
+    """"YYYY-MM-DD" for a date, datetime or date/datetime string."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+
+    text = str(value or "").strip()
+    if len(text) == 10 and text[4] == "-" and text[7] == "-":
+        try:
+            return date.fromisoformat(text).isoformat()
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date().isoformat()
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            pass
+    raise SchemaError(f"date: not a date: {value!r}")
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def _extras(row, fields):
+    return {k: v for k, v in row.items() if k not in fields}
+
+
+# -------------------------
+# ROWS
+# -------------------------
+def normalize_admin(row):
+    username = _text(row.get("username"))
+    if not username:
+        raise SchemaError("username: missing")
+    role = _text(row.get("role")) or "admin"
+    if role not in ROLES:
+        raise SchemaError(f"role: unknown role: {role!r}")
+
+    out = {"username": username, "password": row.get("password") or "", "role": role}
+    out.update(_extras(row, out))
+    return out
+
+
+def normalize_employee(row):
+    out = {
+        "name": _text(row.get("name")),
+        "department": _text(row.get("department")),
+        "salary": clean_amount(row.get("salary"), "salary", default=0.0),
+        "id": clean_id(row.get("id")),
+    }
+    out.update(_extras(row, EMPLOYEE_FIELDS))
+    return out
+
+
+def normalize_payroll(row):
+    days = clean_days(row.get("days_worked") or 0)
+    gross = clean_amount(row.get("gross_pay"), "gross_pay")
+
+    rate = row.get("rate")
+    if rate is None or rate == "":
+        # older admin-screen records called it daily_rate
+        rate = row.get("daily_rate")
+    if rate is None or rate == "":
+        rate = gross / days if days else 0.0
+
+    out = {
+        "employee_id": clean_id(row.get("employee_id"), "employee_id"),
+        "employee_name": _text(row.get("employee_name")),
+        "days_worked": days,
+        "rate": clean_amount(rate, "rate"),
+        "gross_pay": gross,
+        "tax": clean_amount(row.get("tax"), "tax", default=0.0),
+        "net_pay": clean_amount(row.get("net_pay"), "net_pay"),
+        "date": clean_date(row.get("date")),
+        "id": clean_id(row.get("id")),
+    }
+    out.update(_extras(row, PAYROLL_FIELDS + ("daily_rate",)))
+    return out
+
+
+NORMALIZERS = {
+    "admins": normalize_admin,
+    "employees": normalize_employee,
+    "payroll": normalize_payroll,
+}
+
+
+def normalize_row(table, row):
+    """Canonical copy of one row of `table`. Raises SchemaError."""
+    normalize = NORMALIZERS.get(table)
+    return normalize(row) if normalize else dict(row)
+
+
+def normalize_key(table, key):
+    """Canonical key for a delete op."""
+    return _text(key) if table == "admins" else clean_id(key)
+
+
+def normalize_op(op):
+    if "row" in op:
+        return dict(op, row=normalize_row(op["table"], op["row"]))
+    if "key" in op:
+        return dict(op, key=normalize_key(op["table"], op["key"]))
+    return op
+
+
+def normalize_document(data, max_errors=20):
+    """
+    Canonical copy of a whole document. Every bad row is collected and
+    reported in a single SchemaError.
+    """
+    out = {}
+    errors = []
+    for table, rows in data.items():
+        if not isinstance(rows, list):
+            out[table] = rows
+            continue
+        clean = []
+        for i, row in enumerate(rows):
+            try:
+                clean.append(normalize_row(table, row))
+            except SchemaError as e:
+                ident = row.get("id", row.get("username")) if isinstance(row, dict) else None
+                errors.append(f"{table}[{i}] (key {ident!r}): {e}")
+            except AttributeError:
+                errors.append(f"{table}[{i}]: not a record: {row!r}")
+        out[table] = clean
+
+    if errors:
+        more = f" (+{len(errors) - max_errors} more)" if len(errors) > max_errors else ""
+        raise SchemaError("; ".join(errors[:max_errors]) + more)
+    return out
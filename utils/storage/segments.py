@@ -0,0 +1,171 @@
+# utils/storage/segments.py
+import hashlib
+import json
+import os
+
+from utils.storage import journal
+from utils.storage.locking import atomic_write
+from utils.storage.records import PayrollRecord, day_month, plain_row, to_day
+from utils.storage.views import id_num
+
+# -------------------------
+# MONTH SEGMENTS
+# -------------------------
+# The JSON store keeps payroll rows apart from admins/employees, in one
+# NDJSON file per pay period (the month of the row's date):
+#
+#   data/payroll/
+#     manifest.json                       {"version": 1, "segments": {"2026-10": {...}}}
+#     2026-10.3fa2b1c4d5e6f708.ndjson     one canonical row per line, by (date, id)
+#
+# A segment file is named by the hash of its contents and never modified:
+# a write adds new files, then replaces the manifest, then removes the
+# files the manifest no longer lists. Months nobody touched keep their file
+# byte for byte, so in practice only the current month is rewritten.
+# Manifest entry per month: {"file", "rows", "bytes", "sha256"}.
+
+MANIFEST = "manifest.json"
+UNDATED = "undated"   # rows without a parseable date (pre-schema data)
+VERSION = 1
+
+
+def period_key(year, month):
+    return f"{year:04d}-{month:02d}"
+
+
+def month_key(row):
+    """Segment a payroll row (dict or PayrollRecord) belongs to."""
+    day = row.day if type(row) is PayrollRecord else to_day(row.get("date"))
+    if day is None:
+        return UNDATED
+    return period_key(*day_month(day))
+
+
+def group_by_month(rows):
+    """{segment: [rows]}, keeping the rows' order within each month."""
+    out = {}
+    for r in rows:
+        out.setdefault(month_key(r), []).append(r)
+    return out
+
+
+def touched(op, removed):
+    """Segments a payroll journal entry changed (given the rows it replaced)."""
+    if op["table"] != "payroll":
+        return set()
+    rows = list(removed or ())
+    if "row" in op:
+        rows.append(op["row"])
+    return {month_key(r) for r in rows}
+
+
+# -------------------------
+# READ
+# -------------------------
+def read_manifest(directory):
+    """The manifest dict, or None while payroll still lives in the snapshot."""
+    try:
+        with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != VERSION:
+        raise ValueError(f"Unsupported segment manifest version: {manifest.get('version')}")
+    return manifest
+
+
+def read_segment(directory, entry):
+    """Rows of one segment. Raises ValueError if the file does not match its entry."""
+    with open(os.path.join(directory, entry["file"]), "rb") as f:
+        raw = f.read()
+    # one json.loads over the whole file instead of one per line
+    rows = json.loads(b"[" + b",".join(raw.splitlines()) + b"]")
+    if len(rows) != entry["rows"]:
+        raise ValueError(f"Segment {entry['file']} has {len(rows)} rows, manifest says {entry['rows']}")
+    return rows
+
+
+def verify(directory):
+    """Problems found checking every listed segment against its hash ([] if none)."""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return []
+    errors = []
+    for key, entry in manifest["segments"].items():
+        try:
+            with open(os.path.join(directory, entry["file"]), "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except OSError as e:
+            errors.append(f"{key}: {e}")
+            continue
+        if digest != entry["sha256"]:
+            errors.append(f"{key}: {entry['file']} does not match its hash")
+    return errors
+
+
+def fold_month(rows, ops, key):
+    """
+    Apply the payroll journal entries `ops` to the rows of segment `key`;
+    entries for other months only matter when they move a row out of it.
+    """
+    field = journal.TABLE_KEYS["payroll"]
+    by_key = {str(r.get(field)): r for r in rows}
+    for op in ops:
+        if op["table"] != "payroll":
+            continue
+        if op["op"] == "delete":
+            by_key.pop(str(op["key"]), None)
+            continue
+        row = op["row"]
+        by_key.pop(str(row.get(field)), None)
+        if month_key(row) == key:
+            by_key[str(row.get(field))] = row
+    return list(by_key.values())
+
+
+# -------------------------
+# WRITE
+# -------------------------
+def _encode(rows):
+    rows = sorted(rows, key=lambda r: (str(r.get("date") or ""), id_num(r.get("id"))))
+    return "".join(
+        json.dumps(plain_row(r), separators=(",", ":"), ensure_ascii=False) + "\n"
+        for r in rows
+    ).encode("utf-8")
+
+
+def write_segment(directory, key, rows):
+    """
+    Store the rows of segment `key`. Returns (manifest entry, bytes written);
+    nothing is written when an identical segment file already exists.
+    """
+    payload = _encode(rows)
+    digest = hashlib.sha256(payload).hexdigest()
+    entry = {
+        "file": f"{key}.{digest[:16]}.ndjson",
+        "rows": len(rows),
+        "bytes": len(payload),
+        "sha256": digest,
+    }
+    path = os.path.join(directory, entry["file"])
+    if os.path.exists(path):
+        return entry, 0
+    atomic_write(path, payload)
+    return entry, len(payload)
+
+
+def write_manifest(directory, entries):
+    manifest = {"version": VERSION, "segments": dict(sorted(entries.items()))}
+    atomic_write(os.path.join(directory, MANIFEST), json.dumps(manifest, indent=1))
+    return manifest
+
+
+def sweep(directory, manifest):
+    """Remove segment files the manifest no longer lists (call under the store lock)."""
+    keep = {entry["file"] for entry in manifest["segments"].values()}
+    for name in os.listdir(directory):
+        if name.endswith(".ndjson") and name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
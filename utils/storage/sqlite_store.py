@@ -0,0 +1,266 @@
+# utils/storage/sqlite_store.py
+import json
+import os
+import sqlite3
+import threading
+
+from utils.storage import journal
+from utils.storage.base import BaseStore, month_bounds
+
+# -------------------------
+# SCHEMA
+# -------------------------
+# Commonly queried fields get real columns; anything else a record carries
+# (days_worked, rate, ...) round-trips through the `extra` column.
+# `changes` keeps the ops written at each meta.version (the last
+# CHANGES_KEPT versions), so other workers replay them instead of reloading.
+COLUMNS = {
+    "admins": ["username", "password", "role"],
+    "employees": ["id", "name", "department", "salary"],
+    "payroll": ["id", "employee_id", "employee_name", "date", "gross_pay", "tax", "net_pay"],
+}
+CHANGES_KEPT = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS admins (
+    username TEXT PRIMARY KEY,
+    password TEXT,
+    role TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS employees (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    department TEXT,
+    salary REAL,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS payroll (
+    id INTEGER PRIMARY KEY,
+    employee_id INTEGER,
+    employee_name TEXT,
+    date TEXT,
+    gross_pay REAL,
+    tax REAL,
+    net_pay REAL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_payroll_employee_date ON payroll (employee_id, date);
+CREATE INDEX IF NOT EXISTS idx_payroll_date ON payroll (date);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY,
+    ops TEXT NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+
+def _to_row(table, record):
+    cols = COLUMNS[table]
+    values = [record.get(c) for c in cols]
+    extra = {k: v for k, v in record.items() if k not in cols}
+    values.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+    return values
+
+
+def _from_row(table, row):
+    cols = COLUMNS[table]
+    record = {c: row[i] for i, c in enumerate(cols) if row[i] is not None}
+    if row[len(cols)]:
+        record.update(json.loads(row[len(cols)]))
+    return record
+
+
+class SqliteStore(BaseStore):
+    """
+    SQLite engine (WAL mode). Each mutation is a single indexed statement
+    plus a bump of meta.version, which doubles as the cache stamp, and a
+    row in `changes`. A worker whose cache is behind replays the changes
+    since its version; it only reloads everything after a full rewrite or
+    when it fell more than CHANGES_KEPT versions behind. Point lookups and
+    month filters go straight to the indexes.
+
+    If the database is new and `seed` is given (normally the JSON store),
+    its document is imported once.
+    """
+
+    name = "sqlite"
+    retry_errors = BaseStore.retry_errors + (sqlite3.OperationalError,)
+
+    def __init__(self, path, seed=None):
+        # the file lock only serializes id allocation; SQLite does the rest
+        super().__init__(lock_path=path + ".lock")
+        self.path = path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.executescript(SCHEMA)
+
+        if seed is not None:
+            with self.transaction():
+                if self._is_empty(conn):
+                    data = seed.document()
+                    if any(data.get(t) for t in COLUMNS):
+                        self._replace(data)
+
+    # -------------------------
+    # CONNECTIONS
+    # -------------------------
+    def _conn(self):
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def after_fork(self):
+        super().after_fork()
+        # never use a connection opened before fork(); reconnect on demand
+        self._local = threading.local()
+
+    def _is_empty(self, conn):
+        for table in COLUMNS:
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                return False
+        return True
+
+    # -------------------------
+    # ENGINE HOOKS
+    # -------------------------
+    def _current_stamp(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def _select(self, conn, table, where="", params=()):
+        cols = ", ".join(COLUMNS[table] + ["extra"])
+        order = "" if table == "admins" else " ORDER BY id"
+        sql = f"SELECT {cols} FROM {table} {where}{order}"
+        return [_from_row(table, row) for row in conn.execute(sql, params)]
+
+    def _load(self):
+        conn = self._conn()
+        with conn:
+            stamp = self._current_stamp()
+            data = {table: self._select(conn, table) for table in COLUMNS}
+        return data, stamp
+
+    def _catch_up(self, data, stamp):
+        conn = self._conn()
+        with conn:
+            current = self._current_stamp()
+            rows = conn.execute(
+                "SELECT version, ops FROM changes WHERE version > ? AND version <= ? ORDER BY version",
+                (stamp, current),
+            ).fetchall()
+
+        # every version since ours must still be logged, in sequence
+        if [version for version, _ in rows] != list(range(stamp + 1, current + 1)):
+            return None
+        for _, ops in rows:
+            self._replay(data, json.loads(ops))
+        return current
+
+    def _bump(self, conn, ops=None):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        if ops is None:
+            # full rewrite: nothing to replay, older entries no longer apply
+            conn.execute("DELETE FROM changes")
+        else:
+            conn.execute("INSERT INTO changes (version, ops) VALUES (?, ?)",
+                         (version, json.dumps(ops, separators=(",", ":"), ensure_ascii=False)))
+            conn.execute("DELETE FROM changes WHERE version <= ?", (version - CHANGES_KEPT,))
+        return version
+
+    def _execute_op(self, conn, op):
+        table = op["table"]
+        key_field = journal.TABLE_KEYS[table]
+
+        if op["op"] in ("insert", "update"):
+            cols = COLUMNS[table] + ["extra"]
+            marks = ", ".join("?" for _ in cols)
+            if op["op"] == "update":
+                exists = conn.execute(
+                    f"SELECT 1 FROM {table} WHERE {key_field} = ?", (op["row"].get(key_field),)
+                ).fetchone()
+                if not exists:
+                    return
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(cols)}) VALUES ({marks})",
+                _to_row(table, op["row"]),
+            )
+        elif op["op"] == "delete":
+            conn.execute(f"DELETE FROM {table} WHERE {key_field} = ?", (op["key"],))
+        else:
+            raise ValueError(f"Unknown op: {op['op']}")
+
+    def _persist(self, data, ops, stamp):
+        conn = self._conn()
+        with conn:
+            for op in ops:
+                self._execute_op(conn, op)
+            new_stamp = self._bump(conn, ops)
+
+        if new_stamp != stamp + 1:
+            return None
+
+        for op in ops:
+            self._apply(data, op)
+        return new_stamp
+
+    def _replace(self, data):
+        conn = self._conn()
+        with conn:
+            for table, cols in COLUMNS.items():
+                conn.execute(f"DELETE FROM {table}")
+                marks = ", ".join("?" for _ in range(len(cols) + 1))
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(cols)}, extra) VALUES ({marks})",
+                    [_to_row(table, r) for r in data.get(table, [])],
+                )
+            return self._bump(conn)
+
+    # -------------------------
+    # INDEXED QUERIES
+    # -------------------------
+    def get_employee(self, employee_id):
+        rows = self._select(self._conn(), "employees", "WHERE id = ?", (int(employee_id),))
+        return rows[0] if rows else None
+
+    def payroll_for_employee(self, employee_id):
+        return self._select(self._conn(), "payroll", "WHERE employee_id = ?", (int(employee_id),))
+
+    def payroll_for_month(self, year, month):
+        start, end = month_bounds(year, month)
+        return self._select(self._conn(), "payroll", "WHERE date >= ? AND date < ?", (start, end))
+
+    def paid_employee_ids(self, year, month):
+        start, end = month_bounds(year, month)
+        rows = self._conn().execute(
+            "SELECT DISTINCT employee_id FROM payroll WHERE date >= ? AND date < ?",
+            (start, end),
+        )
+        return {str(row[0]) for row in rows}
+
+    def paid_in_month(self, employee_id, year, month):
+        start, end = month_bounds(year, month)
+        row = self._conn().execute(
+            "SELECT 1 FROM payroll WHERE employee_id = ? AND date >= ? AND date < ? LIMIT 1",
+            (int(employee_id), start, end),
+        ).fetchone()
+        return row is not None
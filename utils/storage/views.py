@@ -0,0 +1,311 @@
+# utils/storage/views.py
+import bisect
+import hashlib
+import heapq
+
+# -------------------------
+# DERIVED VIEWS
+# -------------------------
+# Views are in-memory structures derived from the cached document. The
+# store rebuilds them after a full load and feeds them every mutation it
+# applies afterwards, so they never rescan history on a read.
+#
+#   rebuild(data)        full rebuild from the document
+#   apply(op, removed)   one applied journal op; `removed` holds the rows it
+#                        replaced/deleted ([] for inserts, None for no-ops)
+#
+# Payroll rows are PayrollRecords (see records.py), so the payroll views
+# read typed slots (cents, day ordinals) instead of parsing values.
+
+
+class PayrollAggregates:
+    """
+    Running totals over payroll records: overall and per-month gross/net/tax,
+    payment counts per employee name, and the most recent records.
+    """
+
+    RECENT_SIZE = 10
+
+    def __init__(self):
+        self.rebuild({})
+
+    # -------------------------
+    # MAINTENANCE
+    # -------------------------
+    def rebuild(self, data):
+        self.count = 0
+        self.totals = {"gross": 0, "net": 0, "tax": 0}
+        self.by_month = {}
+        self.by_employee = {}
+        self._recent = []       # sorted by (date desc, seq asc)
+        self._recent_dirty = False
+        self._seq = 0
+        self._data = data
+
+        for r in data.get("payroll", []):
+            self._add(r)
+
+    def apply(self, op, removed):
+        if op["table"] != "payroll" or removed is None:
+            return
+
+        for r in removed:
+            self._remove(r)
+        if op["op"] in ("insert", "update"):
+            self._add(op["row"])
+
+    def _bump(self, r, sign):
+        gross = sign * (r.gross_cents or 0)
+        net = sign * (r.net_cents or 0)
+        tax = sign * (r.tax_cents or 0)
+
+        self.count += sign
+        totals = self.totals
+        totals["gross"] += gross
+        totals["net"] += net
+        totals["tax"] += tax
+
+        key = r.month
+        if key is not None:
+            month = self.by_month.get(key)
+            if month is None:
+                month = self.by_month[key] = {"gross": 0, "net": 0, "tax": 0, "count": 0}
+            month["count"] += sign
+            month["gross"] += gross
+            month["net"] += net
+            month["tax"] += tax
+
+        name = r.get("employee_name", "Unknown")
+        self.by_employee[name] = self.by_employee.get(name, 0) + sign
+        if self.by_employee[name] <= 0:
+            del self.by_employee[name]
+
+    def _add(self, r):
+        self._bump(r, 1)
+
+        self._seq += 1
+        entry = (_DescStr(_date_text(r)), self._seq, r)
+        if len(self._recent) < self.RECENT_SIZE or entry[:2] < self._recent[-1][:2]:
+            bisect.insort(self._recent, entry, key=lambda e: e[:2])
+            del self._recent[self.RECENT_SIZE:]
+
+    def _remove(self, r):
+        self._bump(r, -1)
+        if any(e[2] is r for e in self._recent):
+            # a recent record went away; refill lazily from the document
+            self._recent_dirty = True
+
+    # -------------------------
+    # READS
+    # -------------------------
+    def month(self, year, month):
+        totals = self.by_month.get((year, month), {"gross": 0, "net": 0, "tax": 0, "count": 0})
+        return dict(totals)
+
+    def recent(self, n=RECENT_SIZE):
+        if self._recent_dirty:
+            self._recent = []
+            self._recent_dirty = False
+            records = self._data.get("payroll", [])
+            for seq, r in enumerate(records, 1):
+                entry = (_DescStr(_date_text(r)), seq, r)
+                bisect.insort(self._recent, entry, key=lambda e: e[:2])
+                del self._recent[self.RECENT_SIZE:]
+            self._seq = max(self._seq, len(records))
+        return [e[2] for e in self._recent[:n]]
+
+    def top_employees(self, n=5):
+        return heapq.nlargest(n, self.by_employee.items(), key=lambda x: x[1])
+
+
+def _date_text(r):
+    value = r.date
+    return value if type(value) is str else str(value or "")
+
+
+class _DescStr(str):
+    """String that sorts in reverse, so bisect keeps newest dates first."""
+
+    def __lt__(self, other):
+        return str.__gt__(self, other)
+
+    def __gt__(self, other):
+        return str.__lt__(self, other)
+
+
+def _drop(bucket, row):
+    """Remove `row` (by identity) from a list bucket."""
+    for i in range(len(bucket) - 1, -1, -1):
+        if bucket[i] is row:
+            del bucket[i]
+            return
+
+
+class PayrollIndex:
+    """
+    Secondary indexes: employee id -> employee, employee id -> payroll
+    records, (year, month) -> payroll records, and (year, month) -> ids of
+    the employees paid that month. Keys are ids as str, since stored ids
+    may be int or str.
+    """
+
+    def __init__(self):
+        self.rebuild({})
+
+    def rebuild(self, data):
+        self.employees = {}
+        self.by_employee = {}
+        self.by_month = {}
+        self.paid = {}
+        self.max_id = {"employees": 0, "payroll": 0}
+
+        for e in data.get("employees", []):
+            self._add_employee(e)
+        for r in data.get("payroll", []):
+            self._add(r)
+
+    def apply(self, op, removed):
+        if removed is None:
+            return
+
+        if op["table"] == "employees":
+            for e in removed:
+                self.employees.pop(str(e.get("id")), None)
+            if op["op"] in ("insert", "update"):
+                self._add_employee(op["row"])
+
+        elif op["table"] == "payroll":
+            for r in removed:
+                self._remove(r)
+            if op["op"] in ("insert", "update"):
+                self._add(op["row"])
+
+    def _bump_max(self, table, value):
+        try:
+            self.max_id[table] = max(self.max_id[table], int(value))
+        except (TypeError, ValueError):
+            pass
+
+    def _add_employee(self, e):
+        self.employees[str(e.get("id"))] = e
+        self._bump_max("employees", e.get("id"))
+
+    def _add(self, r):
+        self._bump_max("payroll", r.id)
+        emp = str(r.employee_id)
+        self.by_employee.setdefault(emp, []).append(r)
+
+        key = r.month
+        if key is not None:
+            self.by_month.setdefault(key, []).append(r)
+            paid = self.paid.setdefault(key, {})
+            paid[emp] = paid.get(emp, 0) + 1
+
+    def _remove(self, r):
+        emp = str(r.employee_id)
+        _drop(self.by_employee.get(emp, []), r)
+
+        key = r.month
+        if key is not None:
+            _drop(self.by_month.get(key, []), r)
+            paid = self.paid.get(key, {})
+            paid[emp] = paid.get(emp, 0) - 1
+            if paid[emp] <= 0:
+                del paid[emp]
+
+
+class AdminIndex:
+    """
+    Admins by username, plus `token`: a digest of every (username, role)
+    pair. The token changes whenever an admin is added, deleted or changes
+    role (not on password changes), and is identical in every worker that
+    sees the same admins, so it can be stored in a session and compared.
+    """
+
+    def __init__(self):
+        self.rebuild({})
+
+    def rebuild(self, data):
+        self.by_username = {a.get("username"): a for a in data.get("admins", [])}
+        self._retoken()
+
+    def apply(self, op, removed):
+        if op["table"] != "admins" or removed is None:
+            return
+
+        for a in removed:
+            self.by_username.pop(a.get("username"), None)
+        if op["op"] in ("insert", "update"):
+            self.by_username[op["row"].get("username")] = op["row"]
+        self._retoken()
+
+    def _retoken(self):
+        pairs = sorted((str(u), str(a.get("role", "admin"))) for u, a in self.by_username.items())
+        self.token = hashlib.sha1(repr(pairs).encode("utf-8")).hexdigest()[:16]
+
+
+class PayrollTimeline:
+    """
+    Payroll records kept sorted by (date, id) for keyset pagination.
+    Entries are (date, id, seq, record); seq only breaks ties between
+    records that share a date and id, so records are never compared.
+    """
+
+    def __init__(self):
+        self.rebuild({})
+
+    def rebuild(self, data):
+        self._seq = 0
+        self.entries = sorted(self._entry(r) for r in data.get("payroll", []))
+
+    def _entry(self, r):
+        self._seq += 1
+        return (_date_text(r), id_num(r.id), self._seq, r)
+
+    def apply(self, op, removed):
+        if op["table"] != "payroll" or removed is None:
+            return
+
+        for r in removed:
+            key = (_date_text(r), id_num(r.id))
+            i = bisect.bisect_left(self.entries, key)
+            while i < len(self.entries) and self.entries[i][:2] == key:
+                if self.entries[i][3] is r:
+                    del self.entries[i]
+                    break
+                i += 1
+
+        if op["op"] in ("insert", "update"):
+            # new records usually carry today's date, so this is an append
+            bisect.insort(self.entries, self._entry(op["row"]))
+
+    def page(self, limit, before=None, date_from=None, date_to=None, match=None):
+        """
+        Up to `limit` records, newest first, strictly older than the
+        (date, id) cursor `before`. Dates are inclusive ISO prefixes;
+        `match(record)` is an optional extra filter.
+        """
+        end = len(self.entries)
+        if before is not None:
+            end = bisect.bisect_left(self.entries, (before[0], before[1]))
+        if date_to:
+            end = min(end, bisect.bisect_left(self.entries, (date_to + "\uffff",)))
+
+        out = []
+        for i in range(end - 1, -1, -1):
+            date_value, _, _, r = self.entries[i]
+            if date_from and date_value < date_from:
+                break
+            if match is not None and not match(r):
+                continue
+            out.append(r)
+            if len(out) >= limit:
+                break
+        return out
+
+
+def id_num(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0